@@ -0,0 +1,48 @@
+"""
+One-shot migration of per-user CSV tables (meal history, health report) to Parquet
+
+Usage (from src/api-service):
+    python -m api.migrate_tables [--dry-run] [--keep-csv]
+"""
+
+import argparse
+
+from api.utils.utils import get_storage
+from api.utils.table_utils import migrate_table
+from api.utils.meal_history_utils import meal_history_schema
+from api.utils.health_report_utils import health_report_schema
+
+
+# Define variables
+table_families = [
+    ("data/meal_history/meal_history_", meal_history_schema),
+    ("data/health_report/health_report_", health_report_schema),
+]
+
+
+def find_csv_tables(prefix: str) -> list:
+    """List paths (without extension) of the CSV tables under prefix"""
+    return [b.name.removesuffix(".csv") for b in get_storage().list_blobs(prefix=prefix) if b.name.endswith(".csv")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert CSV tables to Parquet")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the tables that would be converted")
+    parser.add_argument("--keep-csv", action="store_true", help="Keep the CSV objects after conversion")
+    args = parser.parse_args()
+
+    converted = 0
+    for prefix, schema in table_families:
+        for path in find_csv_tables(prefix):
+            if args.dry_run:
+                print(f"Would convert {path}.csv")
+                continue
+            if migrate_table(path, schema, keep_csv=args.keep_csv):
+                print(f"✅ Converted {path}.csv to Parquet")
+                converted += 1
+
+    print(f"Converted {converted} table(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,17 @@
 Chat Assistant API using LLM
 """
 
-import time
+import asyncio
+import os
 from fastapi import APIRouter, HTTPException
 from google.genai import types
 from google.genai.errors import ClientError
 
-from api.utils.utils import get_blob, read_csv_from_gcs
+from api.utils.async_storage_utils import run_storage_io
+from api.utils.table_utils import get_table_blob, read_table
+from api.utils.health_report_utils import get_health_report_path
 from api.utils.chat_assistant_utils import get_gemini_client, create_chat_prompt
+from api.utils.meal_history_utils import read_meal_history
 
 
 # Define router
@@ -17,21 +21,22 @@ router = APIRouter()
 # Initialize Gemini client at startup
 client = get_gemini_client()
 
+# Define variables
+chat_health_report_columns = ["symptom", "ingredient", "odds_ratio", "p_value", "p_value_adj"]
+chat_history_meals = int(os.environ.get("CHAT_HISTORY_MEALS", "200"))
+
 
 @router.get("/{user_id}")
 async def get_recommendations(user_id: str):
     """Generate personalized dietary recommendations for a user based on their meal history and health report"""
 
     try:
-        # Fetch meal history
-        meal_history_pattern = f"data/meal_history/meal_history_{user_id}.csv"
-        meal_history_blob = get_blob(meal_history_pattern)
-        meal_history_df = read_csv_from_gcs(meal_history_blob)
+        # Fetch the latest meals (only the tail of the meal history is downloaded)
+        meal_history_df = await run_storage_io(read_meal_history, user_id, last=chat_history_meals)
 
-        # Fetch health report
-        health_report_pattern = f"data/health_report/health_report_{user_id}.csv"
-        health_report_blob = get_blob(health_report_pattern)
-        health_report_df = read_csv_from_gcs(health_report_blob)
+        # Fetch health report (only the columns used by the prompt)
+        health_report_blob = await run_storage_io(get_table_blob, get_health_report_path(user_id))
+        health_report_df = await run_storage_io(read_table, health_report_blob, columns=chat_health_report_columns)
 
         # Filter health report to show only relevant correlations (p_value < 0.2, odds_ratio > 1 or null)
         filtered_health_report_df = health_report_df[
@@ -77,7 +82,7 @@ async def get_recommendations(user_id: str):
                     if attempt < max_retries - 1:
                         wait_time = retry_delay * (2**attempt)  # Exponential backoff: 2s, 4s, 8s
                         print(f"Waiting {wait_time} seconds before retry...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                     else:
                         print("Max retries exceeded for rate limit.")
                         # All retries exhausted, re-raise the error
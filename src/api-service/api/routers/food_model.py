@@ -2,8 +2,13 @@
 Food image analysis APIs
 """
 
+import asyncio
 import io
+import math
 import os
+import threading
+import time
+from typing import List
 from fastapi import UploadFile, File
 from fastapi.responses import JSONResponse
 from PIL import Image, ImageOps
@@ -14,6 +19,22 @@ from api.utils.food_model_utils import (
     load_ing_to_fodmap_dict,
     load_food_model,
     calculate_fodmap_level,
+    get_model_variant,
+)
+from api.utils.async_storage_utils import run_storage_io
+from api.utils.cache_utils import PredictionCache
+from api.utils.preprocessing_utils import DirectImageClassifier
+from api.utils.utils import get_storage
+from api.utils.readiness_utils import readiness
+from api.utils import readiness_utils
+from api.utils.inference_utils import (
+    BatchingScheduler,
+    InferenceOverloadedError,
+    image_decode_pool,
+    inference_admission,
+    inference_max_batch_size,
+    inference_max_pending,
+    inference_max_wait,
 )
 
 # Try to import HEIC support for iPhone images
@@ -32,20 +53,69 @@ router = APIRouter()
 
 # Define variables
 skip_download = os.getenv("SKIP_DOWNLOAD", "0")
+model_load_attempts = int(os.getenv("MODEL_LOAD_ATTEMPTS", "3"))
+model_load_retry_delay = float(os.getenv("MODEL_LOAD_RETRY_DELAY", "10"))
 
 # Max image size for processing (pixels) - smaller = faster inference
 MAX_IMAGE_SIZE = 512
 
+# Max upload size per image (bytes) and max images per batch request
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+
+def cap_batch_max_files(max_files: int, max_pending: int) -> int:
+    """Limit the images per batch request to the admission limit (a batch holds one slot per image)"""
+    if max_files > max_pending:
+        print(
+            f"⚠️  PREDICT_BATCH_MAX_FILES={max_files} exceeds INFERENCE_MAX_PENDING="
+            f"{max_pending}, limiting batches to {max_pending} images"
+        )
+        return max_pending
+    return max_files
+
+
+predict_batch_max_files = cap_batch_max_files(int(os.getenv("PREDICT_BATCH_MAX_FILES", "32")), inference_max_pending)
+
+# Predictions of recently analyzed image bytes, optionally shared between pods through storage.
+# Pods serving another model variant (e.g. INT8 or ONNX) never read each other's predictions
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", "3600")),
+    shared=get_storage if os.getenv("PREDICTION_CACHE_SHARED", "0") == "1" else None,
+    namespace=get_model_variant(),
+)
+
+
+def check_image_bytes(image_bytes: bytes):
+    """Return why an uploaded image cannot be analyzed, or None if it can"""
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        return "Image too large. Maximum size is 10MB."
+    if len(image_bytes) == 0:
+        return "Empty file received"
+    return None
+
+
+def draft_size(size: tuple, max_size: int) -> tuple:
+    """Smallest size a (width, height) image can be decoded at and still be shrunk to fit max_size"""
+    scale = min(1.0, max_size / max(size))
+    return (math.ceil(size[0] * scale), math.ceil(size[1] * scale))
 
-def safe_load_image(image_bytes: bytes, filename: str = "") -> Image.Image:
+
+def safe_load_image(image_bytes: bytes, filename: str = "", resize: bool = True, min_size: tuple = None) -> Image.Image:
     """
     Safely load and preprocess an image from bytes.
     Handles EXIF orientation, HEIC/HEIF format (iPhone), and resizes large images.
     Converts all images to RGB JPEG-compatible format.
 
+    Large JPEGs are decoded directly at a reduced scale (DCT scaling), and HEIF from an
+    embedded thumbnail when one is big enough, instead of at full resolution.
+
     Args:
         image_bytes: Raw image bytes
         filename: Original filename for format detection
+        resize: Shrink large images and re-encode HEIF for the transformers pipeline
+            (False keeps the decoded image for the fused preprocessing, which resizes once)
+        min_size: (width, height) the decoded image must cover when not resizing
 
     Returns:
         Preprocessed PIL Image in RGB mode (JPEG-compatible)
@@ -72,6 +142,11 @@ def safe_load_image(image_bytes: bytes, filename: str = "") -> Image.Image:
     image = Image.open(io.BytesIO(image_bytes))
     print(f"📐 Original: {image.size}, mode: {image.mode}, format: {image.format}")
 
+    # Decode no larger than needed; a no-op for other formats or when no reduced size is big enough
+    target_size = draft_size(image.size, MAX_IMAGE_SIZE) if resize else min_size
+    if target_size and image.draft(None, target_size) is not None:
+        print(f"🔍 Decoding at reduced size: {image.size}")
+
     # Apply EXIF orientation correction (fixes phone image rotation)
     try:
         transposed = ImageOps.exif_transpose(image)
@@ -94,6 +169,9 @@ def safe_load_image(image_bytes: bytes, filename: str = "") -> Image.Image:
         else:
             image = image.convert("RGB")
 
+    if not resize:
+        return image
+
     # Resize large images for faster processing
     if image.size[0] > MAX_IMAGE_SIZE or image.size[1] > MAX_IMAGE_SIZE:
         original_size = image.size
@@ -112,15 +190,205 @@ def safe_load_image(image_bytes: bytes, filename: str = "") -> Image.Image:
     return image
 
 
-# Load ingredients map and computer vision model once at startup
-if skip_download == "1":
-    dish_to_ing_dict = {}
-    ing_to_fodmap_dict = {}
-    classifier = None
-else:
-    dish_to_ing_dict = load_dish_to_ing_dict()
-    ing_to_fodmap_dict = load_ing_to_fodmap_dict()
-    classifier = load_food_model()
+def prepare_image(image_bytes: bytes, filename: str = ""):
+    """
+    Decode an upload into the classifier input.
+
+    Returns:
+        Pixel values when the classifier uses the fused preprocessing (a single resize from
+        the decoded resolution), otherwise the PIL image for the transformers pipeline
+    """
+    if isinstance(classifier, DirectImageClassifier):
+        preprocessor = classifier.preprocessor
+        return preprocessor(safe_load_image(image_bytes, filename, resize=False, min_size=preprocessor.size))
+    return safe_load_image(image_bytes, filename)
+
+
+# Ingredients maps and computer vision model, loaded in the background at startup (load_resources)
+dish_to_ing_dict = {}
+ing_to_fodmap_dict = {}
+classifier = None
+loaded_model = None
+components = ("dish_to_ingredients", "ingredient_to_fodmap", "food_model", "warm_up")
+readiness.register(*components)
+load_lock = threading.Lock()
+load_thread = None
+
+
+def load_reference(name: str, loader) -> dict:
+    # The loaders log and return an empty mapping on failure, which leaves predictions without ingredients
+    readiness.set(name, readiness_utils.loading)
+    mapping = loader()
+    if mapping:
+        readiness.set(name, readiness_utils.ready)
+    else:
+        readiness.set(name, readiness_utils.degraded, "No mappings loaded")
+    return mapping
+
+
+def load_model_with_retries():
+    readiness.set("food_model", readiness_utils.loading)
+    for attempt in range(1, model_load_attempts + 1):
+        try:
+            model = load_food_model()
+            readiness.set("food_model", readiness_utils.ready)
+            return model
+        except Exception as e:
+            print(f"❌ Failed to load food model (attempt {attempt}/{model_load_attempts}): {e}")
+            if attempt == model_load_attempts:
+                readiness.set("food_model", readiness_utils.failed, str(e))
+                return None
+            time.sleep(model_load_retry_delay * attempt)
+
+
+def warm_up(model):
+    """Run a prediction on a synthetic image so the first request does not pay for lazy initialization"""
+    readiness.set("warm_up", readiness_utils.loading)
+    try:
+        model([Image.new("RGB", (MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), (128, 128, 128))], batch_size=1)
+        readiness.set("warm_up", readiness_utils.ready)
+        print("🔥 Food model warmed up")
+    except Exception as e:
+        print(f"⚠️ Food model warm-up failed: {e}")
+        readiness.set("warm_up", readiness_utils.failed, str(e))
+
+
+def load_resources(warm: bool = True):
+    """
+    Load the ingredients maps and the food model, then warm the model up.
+
+    Each step runs once per process; steps already done (e.g. loading in the gunicorn
+    master of a preloaded app, before the workers fork) are skipped. Readiness of each
+    component is reported by /ready.
+
+    Args:
+        warm: Also run the warm-up inference and start serving the model. The gunicorn
+            master passes False: a torch forward pass before fork leaves the intra-op
+            thread pool of the forked workers deadlocked, so workers warm up themselves.
+    """
+    global dish_to_ing_dict, ing_to_fodmap_dict, classifier, loaded_model
+    with load_lock:
+        if skip_download == "1":
+            for name in components:
+                if readiness.status(name) == readiness_utils.pending:
+                    readiness.set(name, readiness_utils.skipped)
+            return
+
+        started_at = time.perf_counter()
+        if readiness.status("dish_to_ingredients") == readiness_utils.pending:
+            dish_to_ing_dict = load_reference("dish_to_ingredients", load_dish_to_ing_dict)
+        if readiness.status("ingredient_to_fodmap") == readiness_utils.pending:
+            ing_to_fodmap_dict = load_reference("ingredient_to_fodmap", load_ing_to_fodmap_dict)
+        if readiness.status("food_model") == readiness_utils.pending:
+            loaded_model = load_model_with_retries()
+            if loaded_model is None:
+                readiness.set("warm_up", readiness_utils.skipped, "Food model not loaded")
+                return
+
+        if not warm or readiness.status("warm_up") != readiness_utils.pending:
+            return
+        warm_up(loaded_model)
+        # Serve predictions only once the model is warm
+        classifier = loaded_model
+        print(f"✅ Food model resources ready in {time.perf_counter() - started_at:.1f}s")
+
+
+def start_loading():
+    """Load resources on a background thread, so the app serves other routes meanwhile"""
+    global load_thread
+    if load_thread is None and readiness.status("warm_up") == readiness_utils.pending:
+        load_thread = threading.Thread(target=load_resources, name="model-loader", daemon=True)
+        load_thread.start()
+
+
+def is_preloaded() -> bool:
+    """Check if the model was loaded before this process started serving (preloaded gunicorn master)"""
+    return (
+        readiness.status("food_model") == readiness_utils.ready
+        and readiness.status("warm_up") == readiness_utils.pending
+    )
+
+
+def model_unavailable_response() -> JSONResponse:
+    # While the model loads, clients can retry shortly; in CI mode it is never loaded
+    if skip_download == "1":
+        return JSONResponse(content={"error": "Model not loaded (running in CI mode)"}, status_code=503)
+    if readiness.status("food_model") == readiness_utils.failed:
+        return JSONResponse(content={"error": "Model failed to load"}, status_code=503)
+    return JSONResponse(
+        content={"error": "Model is loading, please retry shortly"}, status_code=503, headers={"Retry-After": "10"}
+    )
+
+
+def run_classifier_batch(images: list) -> list:
+    """Classify a batch of images in one forward pass, returning the predictions of each image"""
+    results = classifier(images, batch_size=len(images))
+    # The pipeline returns a flat list of predictions when given a single image
+    if len(images) == 1 and results and isinstance(results[0], dict):
+        results = [results]
+    return results
+
+
+def build_prediction(results: list) -> dict:
+    """
+    Build the prediction response of one image from its classifier results.
+
+    Args:
+        results: Classifier predictions of the image, best first
+
+    Returns:
+        Dict with the predicted dish, its ingredients and their FODMAP levels
+    """
+    predicted_food = results[0]["label"]
+    confidence = results[0]["score"]
+    print(f"✅ Prediction: {predicted_food} (confidence: {confidence:.2%})")
+
+    # Get ingredients for predicted dish
+    ingredients = dish_to_ing_dict.get(predicted_food.lower(), [])
+
+    # Calculate FODMAP level based on actual ingredients
+    fodmap_result = calculate_fodmap_level(ingredients, ing_to_fodmap_dict)
+
+    return {
+        "dish": predicted_food,
+        "dish_confidence": confidence,
+        "dish_fodmap": fodmap_result["level"],  # "high", "moderate", "low", "unknown"
+        "ingredients": ", ".join(ingredients),
+        "ingredients_fodmap_high": ", ".join(fodmap_result["high_fodmap"]),
+        "ingredients_fodmap_low": ", ".join(fodmap_result["low_fodmap"]),
+        "ingredients_fodmap_none": ", ".join(fodmap_result["none_fodmap"]),
+    }
+
+
+# Images of concurrent requests are classified together in micro-batches
+inference_scheduler = BatchingScheduler(run_classifier_batch, inference_max_batch_size, inference_max_wait)
+
+
+async def get_cached_prediction(key: str):
+    # The shared cache is read from storage, so it is accessed off the event loop
+    if prediction_cache.shared is None:
+        return prediction_cache.get(key)
+    return await run_storage_io(prediction_cache.get, key)
+
+
+def reference_maps_degraded() -> bool:
+    """Check if an ingredient or FODMAP map failed to load (predictions then lack ingredients)"""
+    names = ("dish_to_ingredients", "ingredient_to_fodmap")
+    return any(readiness.status(name) == readiness_utils.degraded for name in names)
+
+
+async def cache_prediction(key: str, prediction: dict):
+    # Predictions without ingredients would otherwise be served (also to other pods) for the whole TTL
+    if reference_maps_degraded():
+        return
+    if prediction_cache.shared is None:
+        prediction_cache.put(key, prediction)
+    else:
+        await run_storage_io(prediction_cache.put, key, prediction)
+
+
+def overloaded_headers(error: InferenceOverloadedError) -> dict:
+    return {"Retry-After": str(error.retry_after)}
 
 
 @router.post("/predict")
@@ -128,7 +396,7 @@ async def predict(file: UploadFile = File(...)):
     try:
         # Check if model is loaded
         if classifier is None:
-            return JSONResponse(content={"error": "Model not loaded (running in CI mode)"}, status_code=503)
+            return model_unavailable_response()
 
         # Read uploaded image
         image_bytes = await file.read()
@@ -137,55 +405,141 @@ async def predict(file: UploadFile = File(...)):
         file_size_kb = len(image_bytes) / 1024
         print(f"📸 Received image: {file.filename}, size: {file_size_kb:.1f}KB, content_type: {file.content_type}")
 
-        # Check file size (limit to 10MB)
-        if len(image_bytes) > 10 * 1024 * 1024:
-            return JSONResponse(content={"error": "Image too large. Maximum size is 10MB."}, status_code=400)
+        # Check file size (limit to 10MB) and that the file is not empty
+        upload_error = check_image_bytes(image_bytes)
+        if upload_error:
+            return JSONResponse(content={"error": upload_error}, status_code=400)
 
-        # Check if file is empty
-        if len(image_bytes) == 0:
-            return JSONResponse(content={"error": "Empty file received"}, status_code=400)
+        # Identical image bytes get the previous prediction without decoding or inference
+        cache_key = prediction_cache.key_for(image_bytes)
+        cached = await get_cached_prediction(cache_key)
+        if cached is not None:
+            print(f"⚡ Prediction cache hit: {cached['dish']}")
+            return JSONResponse(content=cached)
 
-        # Use safe_load_image for robust image handling (HEIC, EXIF, resizing)
+        # Decode and classify off the event loop, rejecting the request if too many are pending
         try:
-            image = safe_load_image(image_bytes, file.filename or "")
-        except Exception as img_err:
-            print(f"❌ Failed to load image: {img_err}")
-            return JSONResponse(content={"error": f"Invalid image format: {str(img_err)}"}, status_code=400)
-
-        # Run model inference
-        print("🤖 Running model inference...")
-        results = classifier(image)
+            with inference_admission.admit():
+                # Use safe_load_image for robust image handling (HEIC, EXIF, resizing), via prepare_image
+                try:
+                    image = await image_decode_pool.run(prepare_image, image_bytes, file.filename or "")
+                except Exception as img_err:
+                    print(f"❌ Failed to load image: {img_err}")
+                    return JSONResponse(content={"error": f"Invalid image format: {str(img_err)}"}, status_code=400)
+
+                # Run model inference (batched with concurrent requests)
+                print("🤖 Running model inference...")
+                results = await inference_scheduler.submit(image)
+        except InferenceOverloadedError as e:
+            print(f"⏳ Rejected prediction: {e}")
+            return JSONResponse(
+                content={"error": "Too many images being analyzed, please retry shortly"},
+                status_code=503,
+                headers=overloaded_headers(e),
+            )
 
         # Add FODMAP information based on prediction
         if results and len(results) > 0:
-            predicted_food = results[0]["label"]
-            confidence = results[0]["score"]
-            print(f"✅ Prediction: {predicted_food} (confidence: {confidence:.2%})")
+            prediction = build_prediction(results)
+            await cache_prediction(cache_key, prediction)
+            return JSONResponse(content=prediction)
+        else:
+            print("⚠️ No predictions returned from model")
+            return JSONResponse(content={"error": "No predictions available"}, status_code=500)
+
+    except Exception as e:
+        import traceback
+
+        error_details = traceback.format_exc()
+        print(f"❌ Error in predict endpoint: {e}\n{error_details}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
-            # Get ingredients for predicted dish
-            ingredients = dish_to_ing_dict.get(predicted_food.lower(), [])
 
-            # Calculate FODMAP level based on actual ingredients
-            fodmap_result = calculate_fodmap_level(ingredients, ing_to_fodmap_dict)
+@router.post("/predict-batch")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """
+    Analyze several images in one request (a plate and its sides, or a photo import).
+
+    Images are decoded in parallel and classified in tensor batches. Predictions are
+    returned in input order; an image that cannot be analyzed gets an "error" entry
+    instead of failing the whole request.
+    """
+    try:
+        # Check if model is loaded
+        if classifier is None:
+            return model_unavailable_response()
 
+        if len(files) > predict_batch_max_files:
             return JSONResponse(
-                content={
-                    "dish": predicted_food,
-                    "dish_confidence": confidence,
-                    "dish_fodmap": fodmap_result["level"],  # "high", "moderate", "low", "unknown"
-                    "ingredients": ", ".join(ingredients),
-                    "ingredients_fodmap_high": ", ".join(fodmap_result["high_fodmap"]),
-                    "ingredients_fodmap_low": ", ".join(fodmap_result["low_fodmap"]),
-                    "ingredients_fodmap_none": ", ".join(fodmap_result["none_fodmap"]),
-                }
+                content={"error": f"Too many images. Maximum is {predict_batch_max_files} per request."},
+                status_code=400,
             )
-        else:
-            print("⚠️ No predictions returned from model")
-            return JSONResponse(content={"error": "No predictions available"}, status_code=500)
+
+        # Read uploaded images
+        filenames = [file.filename or "" for file in files]
+        uploads = [await file.read() for file in files]
+        print(f"📸 Received {len(uploads)} images, total size: {sum(map(len, uploads)) / 1024:.1f}KB")
+
+        predictions = [{"filename": filename} for filename in filenames]
+        errors = [check_image_bytes(image_bytes) for image_bytes in uploads]
+        indexes = [i for i, error in enumerate(errors) if error is None]
+
+        # Images analyzed before are answered from the prediction cache
+        cache_keys = {i: prediction_cache.key_for(uploads[i]) for i in indexes}
+        cached = await asyncio.gather(*(get_cached_prediction(cache_keys[i]) for i in indexes))
+        for i, prediction in zip(indexes, cached):
+            if prediction is not None:
+                predictions[i].update(prediction)
+        indexes = [i for i, prediction in zip(indexes, cached) if prediction is None]
+
+        # Decode and classify off the event loop, holding one admission slot per image
+        try:
+            with inference_admission.admit(len(indexes)):
+                # Decode all images in parallel on the decode thread pool
+                images = await asyncio.gather(
+                    *(image_decode_pool.run(prepare_image, uploads[i], filenames[i]) for i in indexes),
+                    return_exceptions=True,
+                )
+                for i, image in zip(indexes, images):
+                    if isinstance(image, Exception):
+                        print(f"❌ Failed to load image {filenames[i]}: {image}")
+                        errors[i] = f"Invalid image format: {str(image)}"
+                indexes = [i for i in indexes if errors[i] is None]
+
+                # Images submitted together are run as tensor batches of up to INFERENCE_MAX_BATCH_SIZE
+                print(f"🤖 Running model inference on {len(indexes)} images...")
+                images = [image for image in images if not isinstance(image, Exception)]
+                batch_results = await asyncio.gather(
+                    *(inference_scheduler.submit(image) for image in images), return_exceptions=True
+                )
+        except InferenceOverloadedError as e:
+            print(f"⏳ Rejected batch prediction: {e}")
+            return JSONResponse(
+                content={"error": "Too many images being analyzed, please retry shortly"},
+                status_code=503,
+                headers=overloaded_headers(e),
+            )
+
+        for i, results in zip(indexes, batch_results):
+            if isinstance(results, Exception):
+                print(f"❌ Inference failed for {filenames[i]}: {results}")
+                errors[i] = str(results)
+            elif not results:
+                errors[i] = "No predictions available"
+            else:
+                prediction = build_prediction(results)
+                await cache_prediction(cache_keys[i], prediction)
+                predictions[i].update(prediction)
+
+        for prediction, error in zip(predictions, errors):
+            if error is not None:
+                prediction["error"] = error
+
+        return JSONResponse(content={"predictions": predictions})
 
     except Exception as e:
         import traceback
 
         error_details = traceback.format_exc()
-        print(f"❌ Error in predict endpoint: {e}\n{error_details}")
+        print(f"❌ Error in predict-batch endpoint: {e}\n{error_details}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -2,12 +2,16 @@
 Health report APIs
 """
 
-import math
 import pandas as pd
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
-from api.utils.utils import get_gcs_bucket, get_blob, read_csv_from_gcs, write_csv_to_gcs
-from api.utils.health_report_utils import convert_onehot, run_fisher
+from api.utils.async_storage_utils import run_storage_io
+from api.utils.json_utils import DataFrameJSONResponse
+from api.utils.http_cache_utils import make_etag, get_validator_headers, is_not_modified, not_modified_response
+from api.utils.storage_utils import PreconditionFailedError
+from api.utils.table_utils import find_table_blob, get_table_blob, read_table, write_table, update_table
+from api.utils.health_report_utils import health_report_schema, get_health_report_path, convert_onehot, run_fisher
+from api.utils.meal_history_utils import read_meal_history
 
 # Define router
 router = APIRouter()
@@ -16,60 +20,56 @@ router = APIRouter()
 @router.post("/{user_id}")
 async def create_health_report(user_id: str):
     """Create empty health report for a new user ID, only if it does not exist"""
-    # Construct the GCS path
-    bucket = get_gcs_bucket()
-    path = f"data/health_report/health_report_{user_id}.csv"
-    blob = bucket.blob(path)
-
-    # Check if the file already exists
-    if blob.exists():
+    # Check if the file already exists (in any format)
+    path = get_health_report_path(user_id)
+    if await run_storage_io(find_table_blob, path) is not None:
         raise HTTPException(status_code=409, detail=f"Health report for user {user_id} already exists.")
 
     # Create empty DataFrame
-    columns = ["metric", "value", "odds_ratio", "p_value", "p_value_adj", "significant"]
-    df = pd.DataFrame(columns=columns)
+    df = pd.DataFrame(columns=health_report_schema.names)
 
-    # Write empty health report CSV to GCS
-    write_csv_to_gcs(blob, df)
+    # Write empty health report to storage (fails if it was created concurrently)
+    try:
+        blob = await run_storage_io(write_table, path, df, health_report_schema, create=True)
+    except PreconditionFailedError:
+        raise HTTPException(status_code=409, detail=f"Health report for user {user_id} already exists.")
 
     return {"status": "success", "user_id": user_id, "file": blob.name}
 
 
-@router.get("/{user_id}")
-async def get_health_report(user_id: str):
-    """Get health report for a specific user ID"""
-    # Read health report CSV from GCS
-    pattern = f"data/health_report/health_report_{user_id}.csv"
-    blob = get_blob(pattern)
-    df = read_csv_from_gcs(blob)
+@router.get("/{user_id}", response_class=DataFrameJSONResponse)
+async def get_health_report(user_id: str, request: Request):
+    """Get health report for a specific user ID (304 if If-None-Match matches its ETag)"""
+    # Answer revalidation requests from object metadata only
+    blob = await run_storage_io(get_table_blob, get_health_report_path(user_id))
+    headers = get_validator_headers(make_etag(blob.name, blob.generation, blob.metageneration), blob.updated)
+    if is_not_modified(request, headers["ETag"], blob.updated):
+        return not_modified_response(headers)
 
-    # Convert to dict and handle NaN/Inf values
-    records = df.to_dict(orient="records")
-    for record in records:
-        for key, value in record.items():
-            if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-                record[key] = None
+    # Read health report from storage
+    df = await run_storage_io(read_table, blob)
 
-    return records
+    # Serialize records with NaN/Inf values as null
+    return DataFrameJSONResponse(df, headers=headers)
 
 
 @router.put("/{user_id}")
 async def update_health_report(user_id: str):
     """Update health report for a specific user ID"""
-    # Read meal history CSV from GCS
-    history_pattern = f"data/meal_history/meal_history_{user_id}.csv"
-    history_blob = get_blob(history_pattern)
-    history_df = read_csv_from_gcs(history_blob)
 
-    # Convert to one-hot encoding
-    history_df = convert_onehot(history_df)
+    def build_report(_):
+        # Read meal history from storage
+        history_df = read_meal_history(user_id)
+
+        # Convert to one-hot encoding
+        history_df = convert_onehot(history_df)
 
-    # Run Fisher's exact test
-    report_df = run_fisher(history_df)
+        # Run Fisher's exact test
+        return run_fisher(history_df)
 
-    # Write health report CSV to GCS
-    report_pattern = f"data/health_report/health_report_{user_id}.csv"
-    report_blob = get_blob(report_pattern)
-    write_csv_to_gcs(report_blob, report_df)
+    # Write health report to storage, rebuilding it from the latest meal history if
+    # another request updated the report in the meantime
+    path = get_health_report_path(user_id)
+    report_blob = await run_storage_io(update_table, path, health_report_schema, build_report, read=False)
 
     return {"status": "success", "user_id": user_id, "file": report_blob.name}
@@ -2,11 +2,36 @@
 Meal history APIs
 """
 
-import math
-import pandas as pd
-from fastapi import APIRouter, HTTPException
+from typing import Optional
 
-from api.utils.utils import get_gcs_bucket, get_blob, read_csv_from_gcs, write_csv_to_gcs
+import pandas as pd
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from api.utils.async_storage_utils import run_storage_io, iterate_storage_io
+from api.utils.json_utils import DataFrameJSONResponse
+from api.utils.http_cache_utils import (
+    make_etag,
+    get_validator_headers,
+    has_conditional_headers,
+    is_not_modified,
+    not_modified_response,
+)
+from api.utils.storage_utils import PreconditionFailedError
+from api.utils.table_utils import find_table_blob, get_table_blob, write_table
+from api.utils.meal_history_utils import (
+    meal_history_columns,
+    meal_history_schema,
+    get_meal_history_path,
+    append_meal,
+    read_meal_history,
+    iter_meal_history_export,
+    export_formats,
+    get_meal_history_version,
+    paginate_meal_history,
+    parse_time_query,
+    compact_meal_history_if_needed,
+)
 
 
 # Define router
@@ -16,60 +41,95 @@ router = APIRouter()
 @router.post("/{user_id}")
 async def create_meal_history(user_id: str):
     """Create empty meal history for a new user ID, only if it does not exist"""
-    # Construct the GCS path
-    bucket = get_gcs_bucket()
-    path = f"data/meal_history/meal_history_{user_id}.csv"
-    blob = bucket.blob(path)
-
-    # Check if the file already exists
-    if blob.exists():
+    # Check if the file already exists (in any format)
+    path = get_meal_history_path(user_id)
+    if await run_storage_io(find_table_blob, path) is not None:
         raise HTTPException(status_code=409, detail=f"Meal history for user {user_id} already exists.")
 
     # Create empty DataFrame with all columns for meal prediction data
-    columns = [
-        "date_time",
-        "dish",
-        "dish_confidence",
-        "dish_fodmap",
-        "ingredients",
-        "ingredients_fodmap_high",
-        "ingredients_fodmap_low",
-        "ingredients_fodmap_none",
-        "symptoms",
-    ]
-    df = pd.DataFrame(columns=columns)
-
-    # Write empty meal history CSV to GCS
-    write_csv_to_gcs(blob, df)
-
-    return {"status": "success", "user_id": user_id, "file": blob.name}
+    df = pd.DataFrame(columns=meal_history_columns)
 
+    # Write empty meal history to storage (fails if it was created concurrently)
+    try:
+        blob = await run_storage_io(write_table, path, df, meal_history_schema, create=True)
+    except PreconditionFailedError:
+        raise HTTPException(status_code=409, detail=f"Meal history for user {user_id} already exists.")
 
-@router.get("/{user_id}")
-async def get_meal_history(user_id: str):
-    """Get meal history for a specific user ID"""
-    # Read meal history CSV from GCS
-    pattern = f"data/meal_history/meal_history_{user_id}.csv"
-    blob = get_blob(pattern)
-    df = read_csv_from_gcs(blob)
+    return {"status": "success", "user_id": user_id, "file": blob.name}
 
-    # Convert to dict and handle NaN/Inf values
-    records = df.to_dict(orient="records")
-    for record in records:
-        for key, value in record.items():
-            if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-                record[key] = None
 
-    return records
+@router.get("/{user_id}", response_class=DataFrameJSONResponse)
+async def get_meal_history(
+    user_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of meals per page"),
+    cursor: Optional[str] = Query(None, description="Cursor of the next page (X-Next-Cursor header)"),
+    since: Optional[str] = Query(None, description="Only return meals logged at or after this ISO 8601 timestamp"),
+    until: Optional[str] = Query(None, description="Only return meals logged before this ISO 8601 timestamp"),
+    last: Optional[int] = Query(None, ge=1, description="Only return the last N meals"),
+):
+    """
+    Get meal history for a specific user ID, ordered by date_time.
+
+    With limit, only one page is returned and the X-Next-Cursor response header holds
+    the cursor of the next page (absent on the last page). Responses carry an ETag, and
+    requests with a matching If-None-Match get an empty 304 after a metadata-only check.
+    """
+    # Compare times as UTC timestamps, not as strings
+    since = parse_time_query("since", since)
+    until = parse_time_query("until", until)
+
+    # Answer revalidation requests from object metadata only
+    if has_conditional_headers(request):
+        version, last_modified = await run_storage_io(get_meal_history_version, user_id)
+        headers = get_validator_headers(make_etag(version, request.url.query), last_modified)
+        if is_not_modified(request, headers["ETag"], last_modified):
+            return not_modified_response(headers)
+
+    # Read meal history (base file + segments) from storage, only the tail when possible
+    df = await run_storage_io(read_meal_history, user_id, last=last, since=since)
+    headers = {}
+    if "version" in df.attrs:
+        version, last_modified = df.attrs["version"]
+        headers = get_validator_headers(make_etag(version, request.url.query), last_modified)
+
+    # Select the page before serializing it
+    df, next_cursor = paginate_meal_history(df, limit=limit, cursor=cursor, until=until)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+
+    # Serialize records with NaN/Inf values as null
+    return DataFrameJSONResponse(df, headers=headers)
+
+
+@router.get("/{user_id}/export")
+async def export_meal_history(
+    user_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+):
+    """Stream the full meal history for a specific user ID as NDJSON or CSV, in log order"""
+    chunks = iter_meal_history_export(user_id, format)
+
+    # Start reading before responding, so a missing history is still a 404
+    first = await run_storage_io(next, chunks, b"")
+
+    async def body():
+        yield first
+        async for chunk in iterate_storage_io(chunks):
+            yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=export_formats[format],
+        headers={"Content-Disposition": f'attachment; filename="meal_history_{user_id}.{format}"'},
+    )
 
 
 @router.put("/{user_id}")
-async def update_meal_history(meal: dict, user_id: str):
+async def update_meal_history(meal: dict, user_id: str, background_tasks: BackgroundTasks):
     """Update meal history for a specific user ID"""
-    # Read meal history CSV from GCS
-    pattern = f"data/meal_history/meal_history_{user_id}.csv"
-    blob = get_blob(pattern)
-    df = read_csv_from_gcs(blob)
+    # Check that the meal history exists (metadata only, the history itself is not read)
+    blob = await run_storage_io(get_table_blob, get_meal_history_path(user_id))
 
     # Prepare new row from meal data
     new_row = {
@@ -84,10 +144,8 @@ async def update_meal_history(meal: dict, user_id: str):
         "symptoms": meal.get("symptoms", ""),
     }
 
-    # Append new row
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-
-    # Write CSV to GCS
-    write_csv_to_gcs(blob, df)
+    # Append new row as a segment, and fold segments into the base file after responding
+    await run_storage_io(append_meal, user_id, new_row)
+    background_tasks.add_task(run_storage_io, compact_meal_history_if_needed, user_id)
 
     return {"status": "success", "user_id": user_id, "file": blob.name}
@@ -4,7 +4,11 @@ User list APIs
 
 from fastapi import APIRouter, HTTPException
 
-from api.utils.utils import get_gcs_bucket
+from api.utils.utils import get_storage
+from api.utils.async_storage_utils import AsyncStorage, run_storage_io
+from api.utils.table_utils import delete_table
+from api.utils.meal_history_utils import get_meal_history_path, get_segment_prefix, meal_write_buffer
+from api.utils.health_report_utils import get_health_report_path
 
 
 # Define router
@@ -13,16 +17,15 @@ router = APIRouter()
 
 @router.get("/")
 async def get_user_list():
-    """Get user list from GCS bucket"""
+    """Get user list from storage"""
     try:
-        bucket = get_gcs_bucket()
+        storage = AsyncStorage(get_storage())
         pattern = "data/reference/user_list.txt"
-        blob = bucket.blob(pattern)
 
-        if not blob.exists():
+        if not await storage.exists(pattern):
             raise HTTPException(status_code=404, detail="User list not found")
 
-        content = blob.download_as_text()
+        content = await storage.download_as_text(pattern)
         user_list = [line.strip() for line in content.split("\n") if line.strip()]
 
         return {"user_list": user_list}
@@ -34,75 +37,71 @@ async def get_user_list():
 async def add_user(user_id: str):
     """Add a new user to the user list"""
     try:
-        bucket = get_gcs_bucket()
+        storage = AsyncStorage(get_storage())
         pattern = "data/reference/user_list.txt"
-        blob = bucket.blob(pattern)
 
-        if not blob.exists():
+        if not await storage.exists(pattern):
             raise HTTPException(status_code=404, detail="User list not found")
 
-        content = blob.download_as_text()
-        user_list = [line.strip() for line in content.split("\n") if line.strip()]
-
-        # Add new user
-        if user_id not in user_list:
+        def add(content):
+            user_list = [line.strip() for line in content.split("\n") if line.strip()]
+            if user_id in user_list:
+                return None, ("exists", user_list)
             user_list.append(user_id)
+            return "\n".join(user_list), ("success", user_list)
+
+        # Add new user, re-reading the list if it was updated concurrently
+        status, user_list = await storage.update_text(pattern, add, content_type="text/plain")
 
-            # Write updated list back to GCS
-            blob.upload_from_string("\n".join(user_list), content_type="text/plain")
+        if status == "success":
             return {"status": "success", "message": f"User {user_id} added", "user_list": user_list}
         else:
             return {"status": "exists", "message": f"User {user_id} already exists", "user_list": user_list}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating user list: {str(e)}")
 
 
 @router.delete("/{user_id}")
 async def delete_user(user_id: str):
-    """Delete a user and all associated data from GCS bucket"""
+    """Delete a user and all associated data from storage"""
     try:
-        bucket = get_gcs_bucket()
+        storage = AsyncStorage(get_storage())
         deleted_items = []
 
         # Remove user from user list
         pattern = "data/reference/user_list.txt"
-        user_list_blob = bucket.blob(pattern)
 
-        if not user_list_blob.exists():
+        if not await storage.exists(pattern):
             raise HTTPException(status_code=404, detail="User list not found")
 
-        content = user_list_blob.download_as_text()
-        user_list = [line.strip() for line in content.split("\n") if line.strip()]
-
-        if user_id in user_list:
+        def remove(content):
+            user_list = [line.strip() for line in content.split("\n") if line.strip()]
+            if user_id not in user_list:
+                raise HTTPException(status_code=404, detail=f"User {user_id} not found in user list")
             user_list.remove(user_id)
-            user_list_blob.upload_from_string("\n".join(user_list), content_type="text/plain")
-            deleted_items.append("user list entry")
-        else:
-            raise HTTPException(status_code=404, detail=f"User {user_id} not found in user list")
+            return "\n".join(user_list), None
+
+        # Remove user, re-reading the list if it was updated concurrently
+        await storage.update_text(pattern, remove, content_type="text/plain")
+        deleted_items.append("user list entry")
 
-        # Delete meal history file
-        meal_history_path = f"data/meal_history/meal_history_{user_id}.csv"
-        meal_history_blob = bucket.blob(meal_history_path)
-        if meal_history_blob.exists():
-            meal_history_blob.delete()
+        # Delete meal history file (in any format), its unmerged segments and buffered meals
+        await run_storage_io(meal_write_buffer.discard, user_id)
+        if await run_storage_io(delete_table, get_meal_history_path(user_id)):
             deleted_items.append("meal history")
 
-        # Delete health report file
-        health_report_path = f"data/health_report/health_report_{user_id}.csv"
-        health_report_blob = bucket.blob(health_report_path)
-        if health_report_blob.exists():
-            health_report_blob.delete()
+        await storage.delete_blobs(await storage.list_blobs(prefix=get_segment_prefix(user_id)))
+
+        # Delete health report file (in any format)
+        if await run_storage_io(delete_table, get_health_report_path(user_id)):
             deleted_items.append("health report")
 
         # Delete all user photos
         photo_prefix = f"data/user_photo/user_photo_{user_id}_"
-        photo_blobs = list(bucket.list_blobs(prefix=photo_prefix))
-
-        photo_count = 0
-        for photo_blob in photo_blobs:
-            photo_blob.delete()
-            photo_count += 1
+        photo_blobs = await storage.list_blobs(prefix=photo_prefix)
+        photo_count = await storage.delete_blobs(photo_blobs)
 
         if photo_count > 0:
             deleted_items.append(f"{photo_count} photo(s)")
@@ -7,7 +7,8 @@ from datetime import datetime
 from fastapi import APIRouter, HTTPException, File, UploadFile
 from fastapi.responses import StreamingResponse
 
-from api.utils.utils import get_gcs_bucket
+from api.utils.utils import get_storage
+from api.utils.async_storage_utils import AsyncStorage
 
 
 # Define router
@@ -28,13 +29,12 @@ async def upload_user_photo(user_id: str, date_time: str, file: UploadFile = Fil
     file_name = f"user_photo_{user_id}_{timestamp}.{file_extension}"
 
     # Construct the GCS path
-    bucket = get_gcs_bucket()
+    storage = AsyncStorage(get_storage())
     path = f"data/user_photo/{file_name}"
-    blob = bucket.blob(path)
 
     # Read file content and upload to GCS
     content = await file.read()
-    blob.upload_from_string(content, content_type=file.content_type)
+    blob = await storage.upload_from_string(path, content, content_type=file.content_type)
 
     return {"status": "success", "user_id": user_id, "date_time": date_time, "file": blob.name}
 
@@ -46,7 +46,7 @@ async def get_user_photo(user_id: str, date_time: str):
     timestamp = datetime.strptime(date_time, "%Y-%m-%dT%H:%M:%S").isoformat().replace("-", "").replace(":", "")
 
     # Try common image extensions
-    bucket = get_gcs_bucket()
+    storage = AsyncStorage(get_storage())
     extensions = ["jpg", "jpeg", "png", "gif", "webp"]
 
     blob = None
@@ -54,9 +54,9 @@ async def get_user_photo(user_id: str, date_time: str):
     for ext in extensions:
         file_name = f"user_photo_{user_id}_{timestamp}.{ext}"
         path = f"data/user_photo/{file_name}"
-        temp_blob = bucket.blob(path)
-        if temp_blob.exists():
-            blob = temp_blob
+        # Load the metadata too, so the photo is served with the content type it was uploaded with
+        blob = await storage.get_blob(path)
+        if blob is not None:
             found_extension = ext
             break
 
@@ -64,7 +64,7 @@ async def get_user_photo(user_id: str, date_time: str):
         raise HTTPException(status_code=404, detail="Photo not found")
 
     # Download photo content
-    photo_bytes = blob.download_as_bytes()
+    photo_bytes = await storage.download_as_bytes(blob.name)
 
     # Return as streaming response
     return StreamingResponse(
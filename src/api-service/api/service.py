@@ -2,17 +2,54 @@
 API service
 """
 
+import asyncio
+import atexit
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from api.routers import user_list, user_photo, food_model, meal_history, health_report, chat_assistant
+from api.utils.utils import csv_cache, write_conflicts
+from api.utils.async_storage_utils import storage_pool, run_storage_io
+from api.utils.csv_tail_utils import get_tail_stats
+from api.utils.gcs_client_utils import get_client_stats
+from api.utils.meal_history_utils import meal_write_buffer
+from api.utils.inference_utils import image_decode_pool, inference_admission
+from api.utils.readiness_utils import readiness
 
 # Set root_path based on environment
 ROOT_PATH = os.getenv("ROOT_PATH", "")
 
-# Setup FastAPI app
-api_app = FastAPI(title="TummyAI App API Server", description="API Server for TummyAI App", version="v1")
+# Write buffered meals on any interpreter exit, even if the lifespan shutdown did not run
+atexit.register(meal_write_buffer.flush_all)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if food_model.is_preloaded():
+        # Only the warm-up is left; finish it before accepting connections, so every worker
+        # of a preloaded app is ready as soon as it serves
+        await asyncio.to_thread(food_model.load_resources)
+    else:
+        # Load the model in the background so the app serves non-inference routes right away
+        food_model.start_loading()
+    yield
+    # Write buffered meals before the worker exits
+    written = await run_storage_io(meal_write_buffer.flush_all)
+    if written:
+        print(f"💾 Flushed {written} buffered meal(s) on shutdown")
+    food_model.inference_scheduler.shutdown()
+
+
+# Setup FastAPI app (lifespan events only run on the top-level app, not on mounted apps)
+api_app = FastAPI(
+    title="TummyAI App API Server",
+    description="API Server for TummyAI App",
+    version="v1",
+    lifespan=None if ROOT_PATH else lifespan,
+)
 
 # Enable CORSMiddleware
 api_app.add_middleware(
@@ -21,6 +58,7 @@ api_app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor", "Retry-After"],
 )
 
 
@@ -32,9 +70,42 @@ async def get_index():
 
 @api_app.get("/health")
 async def health_check():
+    # A component that failed to load never recovers in this process: fail liveness so it is restarted
+    failed = readiness.failed()
+    if failed:
+        return JSONResponse(content={"status": "unhealthy", "failed": failed}, status_code=503)
     return {"status": "healthy"}
 
 
+@api_app.get("/ready")
+async def readiness_check():
+    """
+    Readiness of the background-loaded components (503 until they are all ready).
+
+    Readiness is per process: only reliable when every worker is ready as soon as it serves,
+    i.e. the preloaded gunicorn mode (PRELOAD_APP=1). With `uvicorn --workers`, the answer
+    is that of whichever worker handles the probe.
+    """
+    report = readiness.report()
+    return JSONResponse(content=report, status_code=200 if report["ready"] else 503)
+
+
+@api_app.get("/metrics")
+async def get_metrics():
+    return {
+        "csv_cache": csv_cache.stats(),
+        "storage_pool": storage_pool.stats(),
+        "write_conflicts": dict(write_conflicts),
+        "gcs_client": get_client_stats(),
+        "meal_write_buffer": meal_write_buffer.stats(),
+        "csv_tail": get_tail_stats(),
+        "inference": food_model.inference_scheduler.stats(),
+        "inference_admission": inference_admission.stats(),
+        "image_decode_pool": image_decode_pool.stats(),
+        "prediction_cache": food_model.prediction_cache.stats(),
+    }
+
+
 api_app.include_router(user_list.router, prefix="/user-list")
 api_app.include_router(user_photo.router, prefix="/user-photo")
 api_app.include_router(food_model.router, prefix="/food-model")
@@ -44,7 +115,7 @@ api_app.include_router(chat_assistant.router, prefix="/chat-assistant")
 
 # Mount your API under ROOT-PATH to match the Ingress rule (only if ROOT_PATH is set)
 if ROOT_PATH:
-    app = FastAPI(title="API Server", description="API Server", version="v1")
+    app = FastAPI(title="API Server", description="API Server", version="v1", lifespan=lifespan)
     app.mount(ROOT_PATH, api_app)
 else:
     app = api_app
@@ -0,0 +1,201 @@
+"""
+Non-blocking storage access for async route handlers
+
+The storage clients (google-cloud-storage, local disk) are synchronous. Calling them from
+an `async def` handler blocks the uvicorn event loop, so one slow request stalls every
+other request on the worker, including /health. Route handlers instead await storage
+calls through run_storage_io or AsyncStorage, which run them on a bounded thread pool
+that records how saturated it is.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.utils.utils import update_blob
+
+
+# Define variables
+storage_io_threads = int(os.environ.get("STORAGE_IO_THREADS", "32"))
+
+
+class InstrumentedThreadPool:
+    """
+    Thread pool with a fixed number of workers that tracks its saturation.
+
+    Calls beyond max_workers wait in the executor queue; the time spent waiting is
+    reported separately from the time spent running.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset counters"""
+        with self.lock:
+            self.active = 0
+            self.queued = 0
+            self.peak_active = 0
+            self.peak_queued = 0
+            self.submitted = 0
+            self.completed = 0
+            self.failed = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.run_seconds = 0.0
+
+    def call(self, submitted_at: float, func, args, kwargs):
+        # Runs on a worker thread
+        started_at = time.perf_counter()
+        wait = started_at - submitted_at
+        with self.lock:
+            self.queued -= 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+                self.failed += failed
+                self.run_seconds += time.perf_counter() - started_at
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function on the pool and await its result"""
+        with self.lock:
+            self.submitted += 1
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.call, time.perf_counter(), func, args, kwargs)
+        return await loop.run_in_executor(self.executor, call)
+
+    def stats(self) -> dict:
+        """Get pool counters"""
+        with self.lock:
+            completed = self.completed
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "saturation": self.active / self.max_workers,
+                "peak_active": self.peak_active,
+                "peak_queued": self.peak_queued,
+                "submitted": self.submitted,
+                "completed": completed,
+                "failed": self.failed,
+                "avg_wait_ms": self.wait_seconds / completed * 1000 if completed else 0.0,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+                "avg_run_ms": self.run_seconds / completed * 1000 if completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads"""
+        self.executor.shutdown(wait=wait)
+
+
+storage_pool = InstrumentedThreadPool("storage-io", storage_io_threads)
+
+
+async def run_storage_io(func, *args, **kwargs):
+    """Run a blocking storage function on the storage thread pool"""
+    return await storage_pool.run(func, *args, **kwargs)
+
+
+async def iterate_storage_io(iterator):
+    """Iterate over a blocking iterator (e.g. a generator reading storage), advancing it on the storage thread pool"""
+    done = object()
+    # Held while the iterator runs on a pool thread, so close() never runs during next()
+    lock = threading.Lock()
+
+    def advance():
+        with lock:
+            return next(iterator, done)
+
+    def close():
+        with lock:
+            iterator.close()
+
+    try:
+        while (item := await run_storage_io(advance)) is not done:
+            yield item
+    finally:
+        # Release the iterator's resources (open objects) if the client disconnects early.
+        # A cancelled next() may still be running on a pool thread: close there once it returns
+        if hasattr(iterator, "close"):
+            if lock.acquire(blocking=False):
+                try:
+                    iterator.close()
+                finally:
+                    lock.release()
+            else:
+                storage_pool.executor.submit(close)
+
+
+class AsyncStorage:
+    """
+    Async facade over a storage backend (or GCS bucket).
+
+    Every method runs the corresponding blob call on the storage thread pool, so route
+    handlers can await it without blocking the event loop.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def blob(self, name: str):
+        """Get handle to object (no request is made, so this does not block)"""
+        return self.storage.blob(name)
+
+    async def exists(self, name: str) -> bool:
+        return await run_storage_io(lambda: self.storage.blob(name).exists())
+
+    async def get_blob(self, name: str):
+        return await run_storage_io(self.storage.get_blob, name)
+
+    async def download_as_bytes(self, name: str) -> bytes:
+        return await run_storage_io(lambda: self.storage.blob(name).download_as_bytes())
+
+    async def download_as_text(self, name: str) -> str:
+        return await run_storage_io(lambda: self.storage.blob(name).download_as_text())
+
+    async def upload_from_string(self, name: str, data, content_type: str = None):
+        """Upload data and return the blob that was written"""
+
+        def upload():
+            blob = self.storage.blob(name)
+            blob.upload_from_string(data, content_type=content_type)
+            return blob
+
+        return await run_storage_io(upload)
+
+    async def update_text(self, name: str, update, content_type: str = "text/plain"):
+        """Update a text object with optimistic concurrency (see update_blob)"""
+        return await run_storage_io(update_blob, self.storage.blob(name), update, content_type=content_type)
+
+    async def list_blobs(self, prefix: str = "") -> list:
+        return await run_storage_io(lambda: list(self.storage.list_blobs(prefix=prefix)))
+
+    async def delete(self, name: str):
+        await run_storage_io(lambda: self.storage.blob(name).delete())
+
+    async def delete_blobs(self, blobs: list) -> int:
+        """Delete blobs concurrently, returning how many were deleted"""
+        await asyncio.gather(*(run_storage_io(blob.delete) for blob in blobs))
+        return len(blobs)
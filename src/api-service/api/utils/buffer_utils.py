@@ -0,0 +1,127 @@
+"""
+Write-behind buffer used by API service
+"""
+
+import threading
+import time
+
+
+class WriteBuffer:
+    """
+    Coalesce items appended under the same key into a single write.
+
+    The first item added for a key opens a window; every item added for that key before
+    the window closes is written together by one call to write(key, items), made from a
+    background thread. flush(key) writes a key's pending items immediately (readers call
+    it so they always see buffered items), and flush_all() writes everything (called on
+    shutdown). Items are only lost if the process dies without shutting down.
+    """
+
+    def __init__(self, window: float, write, lock_stripes: int = 64):
+        self.window = window
+        self.write = write
+        self.pending = {}
+        self.lock = threading.Condition()
+        # Striped by key so the number of locks stays fixed however many keys are seen
+        self.key_locks = [threading.Lock() for _ in range(lock_stripes)]
+        self.thread = None
+        self.items_buffered = 0
+        self.items_written = 0
+        self.writes = 0
+        self.write_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def add(self, key: str, item):
+        """Buffer item for key"""
+        with self.lock:
+            if key not in self.pending:
+                self.pending[key] = (time.monotonic() + self.window, [])
+            self.pending[key][1].append(item)
+            self.items_buffered += 1
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="write-buffer", daemon=True)
+                self.thread.start()
+            self.lock.notify()
+
+    def key_lock(self, key: str) -> threading.Lock:
+        return self.key_locks[hash(key) % len(self.key_locks)]
+
+    def flush(self, key: str) -> int:
+        """Write the pending items of key now, returning how many were written"""
+        # Writes for the same key happen one at a time and in order
+        with self.key_lock(key):
+            with self.lock:
+                _, items = self.pending.pop(key, (None, []))
+            if not items:
+                return 0
+
+            try:
+                self.write(key, items)
+            except Exception:
+                # Put the items back in front of anything added since, and retry next window
+                with self.lock:
+                    _, newer = self.pending.get(key, (None, []))
+                    self.pending[key] = (time.monotonic() + self.window, items + newer)
+                    self.write_errors += 1
+                    self.lock.notify()
+                raise
+
+            with self.lock:
+                self.writes += 1
+                self.items_written += len(items)
+            return len(items)
+
+    def flush_all(self) -> int:
+        """Write all pending items, returning how many were written"""
+        with self.lock:
+            keys = list(self.pending)
+
+        written = 0
+        for key in keys:
+            try:
+                written += self.flush(key)
+            except Exception as e:
+                print(f"❌ Write-behind flush failed for {key}: {e}")
+        return written
+
+    def discard(self, key: str):
+        """Drop the pending items of key"""
+        with self.key_lock(key):
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def run(self):
+        # Background thread: flush every key whose window has closed
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                due = [key for key, (deadline, _) in self.pending.items() if deadline <= now]
+                if not due:
+                    next_deadline = min((deadline for deadline, _ in self.pending.values()), default=None)
+                    self.lock.wait(timeout=None if next_deadline is None else next_deadline - now)
+                    continue
+
+            for key in due:
+                try:
+                    self.flush(key)
+                except Exception as e:
+                    print(f"⚠️  Write-behind flush failed for {key}, retrying: {e}")
+
+    def stats(self) -> dict:
+        """Get buffer counters"""
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window * 1000,
+                "pending_keys": len(self.pending),
+                "pending_items": sum(len(items) for _, items in self.pending.values()),
+                "items_buffered": self.items_buffered,
+                "items_written": self.items_written,
+                "writes": self.writes,
+                "items_per_write": self.items_written / self.writes if self.writes else 0.0,
+                "write_errors": self.write_errors,
+            }
@@ -0,0 +1,239 @@
+"""
+In-process caches used by API service
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from api.utils.storage_utils import ObjectNotFoundError
+
+
+class DataFrameCache:
+    """
+    LRU cache of parsed DataFrames keyed by object path.
+
+    Every entry remembers the object generation/metageneration it was parsed from, so a
+    lookup only hits when the caller's (cheap) metadata matches. The cache is bounded by
+    the in-memory size of the DataFrames rather than by the number of entries.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, generation, metageneration=None):
+        """Get a copy of the cached DataFrame if it matches generation, otherwise None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            cached_generation, cached_metageneration, df, size = entry
+            if (cached_generation, cached_metageneration) != (generation, metageneration):
+                # Object was overwritten since it was cached
+                self.remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        # Callers are free to modify the returned DataFrame
+        return df.copy()
+
+    def put(self, key: str, generation, metageneration, df: pd.DataFrame):
+        """Cache a copy of df for the given object generation"""
+        if generation is None:
+            return
+
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self.lock:
+            self.remove(key)
+            if size > self.max_bytes:
+                return
+
+            while self.total_bytes + size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+                self.evictions += 1
+
+            self.entries[key] = (generation, metageneration, df.copy(), size)
+            self.total_bytes += size
+
+    def invalidate(self, key: str):
+        """Drop the entry for key, if any"""
+        with self.lock:
+            if self.remove(key):
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def remove(self, key: str) -> bool:
+        # Caller must hold the lock
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.total_bytes -= entry[3]
+        return True
+
+    def stats(self) -> dict:
+        """Get cache counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of prediction payloads keyed by a hash of the uploaded image bytes.
+
+    The same photo is often sent more than once (analysis then save, or a retry after a
+    failed save), so a hit returns the previous prediction without decoding the image or
+    running the model. Keys include a namespace (the model version), so a new model never
+    serves predictions of the old one.
+
+    If a shared storage backend is given (a callable returning it, so it is created on first
+    use), misses fall back to it and new entries are written through, letting pods reuse
+    each other's predictions. Shared entries carry their expiry time; stale ones are
+    ignored, and a bucket lifecycle rule can delete them. Shared reads and writes are best
+    effort: errors count as misses.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, shared=None, prefix: str = "cache/predictions", namespace=""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.prefix = prefix
+        self.namespace = namespace
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.clear()
+
+    def key_for(self, data: bytes) -> str:
+        """Get the cache key of raw upload bytes"""
+        # BLAKE2 is much faster than SHA-256 and, unlike a non-cryptographic hash, collisions
+        # cannot be crafted to serve another user's prediction
+        return f"{self.namespace}/{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+
+    def get(self, key: str):
+        """Get a copy of the cached payload for key, or None"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(payload)
+                del self.entries[key]
+                self.expirations += 1
+
+        payload = self.get_shared(key)
+        with self.lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self.put_local(key, payload)
+        return dict(payload)
+
+    def put(self, key: str, payload: dict):
+        """Cache a copy of payload for key (and in the shared cache, if any)"""
+        self.put_local(key, payload)
+        self.put_shared(key, payload)
+
+    def put_local(self, key: str, payload: dict):
+        with self.lock:
+            self.entries.pop(key, None)
+            if self.max_entries <= 0:
+                return
+            while len(self.entries) >= self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = (time.monotonic() + self.ttl, dict(payload))
+
+    def shared_path(self, key: str) -> str:
+        return f"{self.prefix}/{key}.json"
+
+    def get_shared(self, key: str):
+        # Read an entry from the shared cache, or None if there is none or it expired
+        if self.shared is None:
+            return None
+        try:
+            entry = json.loads(self.shared().blob(self.shared_path(key)).download_as_bytes())
+        except ObjectNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Shared prediction cache read failed: {e}")
+            with self.lock:
+                self.shared_errors += 1
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            return None
+        return entry.get("payload")
+
+    def put_shared(self, key: str, payload: dict):
+        if self.shared is None:
+            return
+        entry = {"expires_at": time.time() + self.ttl, "payload": payload}
+        try:
+            self.shared().blob(self.shared_path(key)).upload_from_string(
+                json.dumps(entry), content_type="application/json"
+            )
+        except Exception as e:
+            print(f"⚠️ Shared prediction cache write failed: {e}")
+            with self.lock:
+                self.shared_errors += 1
+
+    def clear(self):
+        """Drop all local entries and reset counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+            self.evictions = self.expirations = self.shared_errors = 0
+
+    def stats(self) -> dict:
+        """Get cache counters"""
+        with self.lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "shared": self.shared is not None,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared_errors": self.shared_errors,
+            }
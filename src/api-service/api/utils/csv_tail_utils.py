@@ -0,0 +1,190 @@
+"""
+Tail reads of CSV objects
+
+Long-time users have thousands of meals, but the Recent Meals view and the chat prompt
+only need the latest ones. read_csv_tail fetches the end of a CSV object with ranged
+reads, extending the range backward (doubling it each time) until it holds enough
+complete rows, and parses them with the header line, which is cached separately per
+object generation. Objects that cannot be read by offset (compressed objects) and small
+objects are read in full through the CSV cache.
+
+Rows must not contain line breaks inside quoted fields, and "since" assumes rows are
+appended in date_time order (as meals are logged). Timestamps are compared as UTC times,
+not as strings, so "2025-01-01 08:00:00", "2025-01-01T08:00:00Z" and
+"2025-01-01T10:00:00+02:00" are the same time.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from api.utils.storage_utils import PreconditionFailedError, gzip_magic, zstd_magic
+from api.utils.utils import csv_cache, parse_csv, read_csv_from_gcs
+
+
+# Define variables
+tail_chunk_size = int(os.environ.get("CSV_TAIL_CHUNK_SIZE", 64 * 1024))
+header_range_size = 4096
+header_cache_size = 4096
+iso_date_pattern = re.compile(r"\d{4}-\d{2}-\d{2}")
+_header_cache = OrderedDict()
+_lock = threading.Lock()
+tail_stats = {"tail_reads": 0, "full_reads": 0, "range_requests": 0, "bytes_read": 0, "header_hits": 0}
+
+
+def count(**increments):
+    with _lock:
+        for key, value in increments.items():
+            tail_stats[key] += value
+
+
+def parse_timestamp(value) -> pd.Timestamp:
+    """
+    Parse an ISO 8601 timestamp as UTC (timestamps without an offset, like logged meal times, are UTC).
+
+    Raises:
+        ValueError: If the value is not an ISO 8601 timestamp
+    """
+    if isinstance(value, pd.Timestamp):
+        return value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+    if not isinstance(value, str) or not iso_date_pattern.match(value):
+        raise ValueError(f"Not an ISO 8601 timestamp: {value!r}")
+    return pd.to_datetime(value, format="ISO8601", utc=True)
+
+
+def to_timestamps(values: pd.Series) -> pd.Series:
+    """Parse a column of ISO 8601 timestamps as UTC (NaT where a value does not parse)"""
+    return pd.to_datetime(values, format="ISO8601", utc=True, errors="coerce")
+
+
+def select_tail(df: pd.DataFrame, last: int = None, since: str = None, column: str = "date_time") -> pd.DataFrame:
+    """
+    Select the latest rows of a DataFrame.
+
+    Args:
+        df: Rows in append order
+        last: Keep only the last N rows
+        since: Keep only rows whose column is at or after this ISO 8601 timestamp
+
+    Returns:
+        Selected rows, with a fresh index
+    """
+    if since is not None and column in df.columns:
+        df = df[to_timestamps(df[column]) >= parse_timestamp(since)]
+    if last is not None:
+        df = df.tail(last)
+    return df.reset_index(drop=True)
+
+
+def get_csv_header(blob):
+    """Get the header line of a CSV object, or None if it cannot be read by offset"""
+    key = (blob.name, blob.generation)
+    with _lock:
+        header = _header_cache.get(key)
+        if header is not None:
+            _header_cache.move_to_end(key)
+            tail_stats["header_hits"] += 1
+            return header
+
+    data = blob.download_range(0, header_range_size - 1)
+    count(range_requests=1, bytes_read=len(data))
+    if data.startswith(gzip_magic) or data.startswith(zstd_magic) or b"\n" not in data:
+        return None
+
+    header = data[: data.index(b"\n") + 1]
+    with _lock:
+        _header_cache[key] = header
+        while len(_header_cache) > header_cache_size:
+            _header_cache.popitem(last=False)
+    return header
+
+
+def read_csv_tail(blob, last: int = None, since: str = None, column: str = "date_time") -> pd.DataFrame:
+    """
+    Read the latest rows of a CSV object.
+
+    Args:
+        blob: CSV blob
+        last: Number of rows to read from the end
+        since: Read rows whose column is at or after this ISO 8601 timestamp
+
+    Returns:
+        Selected rows (see select_tail)
+    """
+    if blob.generation is None:
+        blob.reload()
+
+    if (last is None and since is None) or (blob.size or 0) <= tail_chunk_size or blob.content_encoding:
+        count(full_reads=1)
+        return select_tail(read_csv_from_gcs(blob), last, since, column)
+
+    # A full copy may already be cached by an earlier read
+    df = csv_cache.get(blob.name, blob.generation, blob.metageneration)
+    if df is not None:
+        return select_tail(df, last, since, column)
+
+    try:
+        df = read_tail_rows(blob, last, since, column)
+    except PreconditionFailedError:
+        # The object was rewritten between two ranged reads
+        blob.reload()
+        df = None
+
+    if df is None:
+        count(full_reads=1)
+        return select_tail(read_csv_from_gcs(blob), last, since, column)
+
+    count(tail_reads=1)
+    return select_tail(df, last, since, column)
+
+
+def read_tail_rows(blob, last, since, column):
+    # Returns complete rows covering the selection, or None if the object must be read in full
+    header = get_csv_header(blob)
+    if header is None:
+        return None
+
+    data = b""
+    start = blob.size
+    chunk = tail_chunk_size
+    while True:
+        end = start - 1
+        start = max(len(header), start - chunk)
+        data = blob.download_range(start, end) + data
+        count(range_requests=1, bytes_read=end - start + 1)
+        chunk *= 2
+
+        # Drop the (possibly partial) first row unless the range reaches the header
+        complete = start == len(header)
+        if not complete:
+            newline = data.find(b"\n")
+            if newline < 0:
+                continue
+            body = data[newline + 1 :]
+        else:
+            body = data
+
+        df = parse_csv((header + body).decode("utf-8"))
+        if complete or has_enough_rows(df, last, since, column):
+            return df
+
+
+def has_enough_rows(df, last, since, column):
+    if (
+        since is not None
+        and len(df)
+        and column in df.columns
+        and to_timestamps(df[column].head(1)).iloc[0] < parse_timestamp(since)
+    ):
+        # Every later row is already in the range
+        return True
+    return last is not None and len(select_tail(df, None, since, column)) >= last
+
+
+def get_tail_stats() -> dict:
+    """Get tail read counters"""
+    with _lock:
+        return dict(tail_stats, header_cache_entries=len(_header_cache))
@@ -8,10 +8,9 @@ import ast
 import csv
 from io import StringIO
 from pathlib import Path
-from google.cloud import storage
 from transformers import pipeline
 
-from api.utils.utils import get_gcs_bucket
+from api.utils.utils import get_storage
 
 
 # Define variables
@@ -20,6 +19,10 @@ dish_to_ing_gcs_path = "data/reference/dish_to_ingredients.csv"
 ing_to_fodmap_gcs_path = "data/reference/ingredient_to_fodmap.csv"
 model_gcs_path = "models/v2"
 model_local_path = "/tmp/models"
+model_backend = os.getenv("MODEL_BACKEND", "pytorch").lower()
+model_quantization = os.getenv("MODEL_QUANTIZATION", "none").lower()
+model_mmap = os.getenv("MODEL_MMAP", "0") == "1"
+fused_preprocessing = os.getenv("FUSED_PREPROCESSING", "0") == "1"
 
 
 def load_dish_to_ing_dict() -> dict:
@@ -32,10 +35,8 @@ def load_dish_to_ing_dict() -> dict:
     try:
         print("⬇️  Downloading dish-to-ingredient mappings from GCS...")
 
-        # Initialize GCS client
-        client = storage.Client()
-        bucket = client.bucket(gcs_bucket_name)
-        blob = bucket.blob(dish_to_ing_gcs_path)
+        # Use the shared storage client
+        blob = get_storage().blob(dish_to_ing_gcs_path)
 
         # Download CSV as text
         csv_content = blob.download_as_text()
@@ -74,10 +75,8 @@ def load_ing_to_fodmap_dict() -> dict:
     try:
         print("⬇️  Downloading ingredient-to-FODMAP mappings from GCS...")
 
-        # Initialize GCS client
-        client = storage.Client()
-        bucket = client.bucket(gcs_bucket_name)
-        blob = bucket.blob(ing_to_fodmap_gcs_path)
+        # Use the shared storage client
+        blob = get_storage().blob(ing_to_fodmap_gcs_path)
 
         # Download CSV as text
         csv_content = blob.download_as_text()
@@ -100,6 +99,12 @@ def load_ing_to_fodmap_dict() -> dict:
         return {}
 
 
+def get_model_variant() -> str:
+    """Get the model variant this process serves (checkpoint, backend, quantization, preprocessing)"""
+    preprocessing = "fused" if fused_preprocessing else "pipeline"
+    return f"{model_gcs_path}/{model_backend}-{model_quantization}-{preprocessing}"
+
+
 def load_food_model():
     """
     Load model that maps food image to dish name.
@@ -118,11 +123,70 @@ def load_food_model():
             f"TummyAI fine-tuned model not found at {model_local_path}. Model download may have failed."
         )
 
+    if model_quantization not in ("none", "int8"):
+        raise ValueError(f"Unknown MODEL_QUANTIZATION: {model_quantization} (expected 'none' or 'int8')")
+    if model_quantization == "int8" and model_backend != "pytorch":
+        raise ValueError("MODEL_QUANTIZATION=int8 is only supported with MODEL_BACKEND=pytorch")
+    if model_mmap and (model_backend != "pytorch" or model_quantization != "none"):
+        raise ValueError("MODEL_MMAP=1 is only supported with the fp32 PyTorch model")
+
+    # ONNX Runtime backend (MODEL_BACKEND=onnx) returns the same label/score lists as the pipeline
+    if model_backend == "onnx":
+        from api.utils.onnx_utils import load_onnx_classifier
+
+        return load_onnx_classifier(model_local_path)
+    if model_backend != "pytorch":
+        raise ValueError(f"Unknown MODEL_BACKEND: {model_backend} (expected 'pytorch' or 'onnx')")
+
+    # Fused NumPy preprocessing, running the model without the transformers pipeline
+    if fused_preprocessing:
+        return load_fused_classifier()
+
+    # Dynamically quantized INT8 variant (validate its accuracy with validate_model.py --quantize first)
+    if model_quantization == "int8":
+        from api.utils.quantization_utils import load_quantized_classifier
+
+        print(f"✅ Loading INT8 quantized TummyAI model from {model_local_path}")
+        return load_quantized_classifier(model_local_path)
+
+    # Weights used in place from the page cache, shared by all uvicorn workers on the pod
+    if model_mmap:
+        from api.utils.safetensors_utils import load_mmap_classifier
+
+        print(f"✅ Loading memory-mapped TummyAI model from {model_local_path}")
+        return load_mmap_classifier(model_local_path)
+
     print(f"✅ Loading TummyAI fine-tuned model from {model_local_path}")
     classifier = pipeline("image-classification", model=model_local_path)
     return classifier
 
 
+def load_fused_classifier():
+    """
+    Load the PyTorch model (fp32, INT8 or memory-mapped, as configured) behind the fused preprocessing.
+
+    Returns:
+        TorchImageClassifier
+    """
+    from api.utils.preprocessing_utils import TorchImageClassifier
+
+    if model_quantization == "int8":
+        from api.utils.quantization_utils import build_quantized_model
+
+        model = build_quantized_model(model_local_path)
+    elif model_mmap:
+        from api.utils.safetensors_utils import load_mmap_model
+
+        model = load_mmap_model(model_local_path)
+    else:
+        from transformers import AutoModelForImageClassification
+
+        model = AutoModelForImageClassification.from_pretrained(model_local_path)
+
+    print(f"✅ Loading TummyAI model with fused preprocessing from {model_local_path}")
+    return TorchImageClassifier(model_local_path, model)
+
+
 def normalize_ingredient_list(ingredient_str: str) -> list:
     """
     Parse ingredient string into clean list of ingredients.
@@ -184,7 +248,7 @@ def download_model_from_gcs(gcs_bucket_name: str, model_gcs_path: str, model_loc
 
     try:
         # Download each file
-        bucket = get_gcs_bucket()
+        bucket = get_storage()
         for filename in model_files:
             gcs_path = f"{model_gcs_path}/{filename}"
             local_path = model_local_path / filename
@@ -0,0 +1,122 @@
+"""
+Process-wide Google Cloud Storage client used by API service
+
+Every storage.Client has its own credentials, token refresh and HTTP connection pool, so
+the service creates a single client and shares it between the storage backend, the
+reference data loaders and the model downloader. Its connection pool is sized to the
+storage thread pool, connections are kept alive between requests, and calls use one
+timeout/retry policy.
+"""
+
+import os
+import socket
+import threading
+
+from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+
+# Define variables
+http_pool_size = int(os.environ.get("GCS_HTTP_POOL_SIZE", os.environ.get("STORAGE_IO_THREADS", "32")))
+http_timeout = float(os.environ.get("GCS_HTTP_TIMEOUT", "60"))
+http_keepalive = int(os.environ.get("GCS_HTTP_KEEPALIVE", "60"))
+connect_retries = int(os.environ.get("GCS_CONNECT_RETRIES", "3"))
+retry_timeout = float(os.environ.get("GCS_RETRY_TIMEOUT", "120"))
+_client = None
+_adapter = None
+_client_lock = threading.Lock()
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that enables TCP keep-alive on pooled connections"""
+
+    def __init__(self, keepalive: int, **kwargs):
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        options = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        # Start probing idle connections before load balancers drop them (Linux only)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive))
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, self.keepalive // 4)))
+        kwargs["socket_options"] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def create_http_adapter() -> HTTPAdapter:
+    """Create the pooled HTTP adapter mounted on the shared client"""
+    return KeepAliveHTTPAdapter(
+        keepalive=http_keepalive,
+        pool_connections=4,
+        pool_maxsize=http_pool_size,
+        # Only retry connection failures here; request retries follow get_retry_policy
+        max_retries=Retry(total=connect_retries, connect=connect_retries, read=0, status=0, backoff_factor=0.1),
+    )
+
+
+def get_gcs_client():
+    """Get the process-wide GCS client"""
+    global _client, _adapter
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = storage.Client()
+                adapter = create_http_adapter()
+                client._http.mount("https://", adapter)
+                client._http.mount("http://", adapter)
+                _client, _adapter = client, adapter
+                print(f"🔌 Created GCS client (HTTP pool size {http_pool_size})")
+    return _client
+
+
+def get_retry_policy():
+    """Get the retry policy for idempotent GCS calls"""
+    return DEFAULT_RETRY.with_timeout(retry_timeout)
+
+
+def reset_gcs_client():
+    """Drop the shared client (its connections are closed)"""
+    global _client, _adapter
+    with _client_lock:
+        if _adapter is not None:
+            _adapter.close()
+        _client = _adapter = None
+
+
+def get_client_stats() -> dict:
+    """
+    Get connection reuse counters of the shared client.
+
+    Every request that does not open a new connection reuses a pooled one, so a low
+    reuse rate under load means the pool is smaller than the number of concurrent
+    storage calls.
+    """
+    stats = {
+        "initialized": _client is not None,
+        "pool_size": http_pool_size,
+        "timeout": http_timeout,
+        "retry_timeout": retry_timeout,
+        "hosts": 0,
+        "connections_opened": 0,
+        "requests": 0,
+        "idle_connections": 0,
+    }
+    adapter = _adapter
+    if adapter is not None:
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["hosts"] += 1
+            stats["connections_opened"] += pool.num_connections
+            stats["requests"] += pool.num_requests
+            stats["idle_connections"] += pool.pool.qsize() if pool.pool is not None else 0
+
+    stats["reused"] = max(0, stats["requests"] - stats["connections_opened"])
+    stats["reuse_rate"] = stats["reused"] / stats["requests"] if stats["requests"] else 0.0
+    return stats
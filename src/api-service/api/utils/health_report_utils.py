@@ -3,10 +3,29 @@ Utility functions used by health report APIs
 """
 
 import pandas as pd
+import pyarrow as pa
 from scipy.stats import fisher_exact
 from statsmodels.stats.multitest import multipletests
 
 
+# Define variables
+health_report_schema = pa.schema(
+    [
+        ("symptom", pa.string()),
+        ("ingredient", pa.string()),
+        ("odds_ratio", pa.float64()),
+        ("p_value", pa.float64()),
+        ("p_value_adj", pa.float64()),
+        ("significant", pa.bool_()),
+    ]
+)
+
+
+def get_health_report_path(user_id: str) -> str:
+    """Get path of the health report table (without file extension)"""
+    return f"data/health_report/health_report_{user_id}"
+
+
 def convert_onehot(history: pd.DataFrame) -> pd.DataFrame:
     """
     One-hot encode ingredients and symptoms in the meal history DataFrame.
@@ -0,0 +1,61 @@
+"""
+Conditional GET helpers (ETag / Last-Modified) used by API service
+
+Tabular endpoints tag every response with an ETag derived from the generations of the
+objects it was read from, so clients polling an unchanged resource send If-None-Match
+and get an empty 304 response after a metadata-only check instead of a full download.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Make a strong ETag from the parts that identify a representation"""
+    digest = hashlib.sha256("\n".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def get_validator_headers(etag: str, last_modified=None) -> dict:
+    """Get ETag, Last-Modified and Cache-Control headers (clients must revalidate before reuse)"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if isinstance(last_modified, datetime):
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified=None) -> bool:
+    """
+    Check the request's conditional headers against the current version.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or not isinstance(last_modified, datetime):
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a resolution of one second
+    return last_modified.replace(microsecond=0) <= since
+
+
+def has_conditional_headers(request: Request) -> bool:
+    """Check if the request carries If-None-Match or If-Modified-Since"""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    """Empty 304 response carrying the current validators"""
+    return Response(status_code=304, headers=headers)
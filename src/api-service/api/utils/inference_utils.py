@@ -0,0 +1,244 @@
+"""
+Dynamic micro-batching for model inference
+
+A forward pass over a batch of images costs far less than the same number of forward
+passes at batch size 1, but every request arrives with a single image. The
+BatchingScheduler collects images submitted by concurrent requests: the first image
+opens a batch, which is run as soon as it holds max_batch_size images or max_wait
+seconds have passed, whichever comes first. The forward pass runs on a dedicated thread,
+so the event loop keeps serving other requests, and each request awaits the result for
+its own image.
+
+Image decoding runs on its own thread pool, and an AdmissionGate bounds how many
+predictions may be decoding or waiting for inference at once. Beyond that, requests are
+rejected immediately with a Retry-After hint instead of queueing with unbounded latency.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from api.utils.async_storage_utils import InstrumentedThreadPool
+
+
+# Define variables
+inference_max_batch_size = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "16"))
+inference_max_wait = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "10")) / 1000
+inference_max_pending = int(os.environ.get("INFERENCE_MAX_PENDING", "64"))
+image_decode_threads = int(os.environ.get("IMAGE_DECODE_THREADS", str(min(4, os.cpu_count() or 1))))
+
+
+class InferenceOverloadedError(Exception):
+    """Raised when too many predictions are already pending"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many pending predictions, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Bound the number of requests in flight, rejecting the rest instead of queueing them.
+
+    admit() wraps the decode + inference of one request. The Retry-After
+    hint is the recent average time a request spent in flight: with the gate full, that is
+    about how long the pending requests take to drain.
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset counters"""
+        with self.lock:
+            self.in_flight = 0
+            self.peak_in_flight = 0
+            self.admitted = 0
+            self.rejected = 0
+            self.avg_latency = 0.0
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying"""
+        return max(1, math.ceil(self.avg_latency))
+
+    @contextmanager
+    def admit(self, count: int = 1):
+        """Hold count in-flight slots (one per image) for the block, or raise InferenceOverloadedError"""
+        with self.lock:
+            if self.in_flight + count > self.max_in_flight:
+                self.rejected += count
+                raise InferenceOverloadedError(self.retry_after())
+            self.in_flight += count
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.admitted += count
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            latency = time.perf_counter() - started_at
+            with self.lock:
+                self.in_flight -= count
+                # Exponentially weighted, so the hint follows the current load
+                self.avg_latency = latency if self.avg_latency == 0 else 0.8 * self.avg_latency + 0.2 * latency
+
+    def stats(self) -> dict:
+        """Get admission counters"""
+        with self.lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_latency_ms": self.avg_latency * 1000,
+            }
+
+
+class BatchingScheduler:
+    """
+    Run single-item requests through a batch function in dynamically sized batches.
+
+    run_batch(items) must return one result per item, in order. It runs on a single
+    inference thread, one batch at a time; items submitted while a batch runs form the
+    next batch.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int, max_wait: float, name: str = "inference"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.name = name
+        self.executor = None
+        self.loop = None
+        self.queue = None
+        self.worker = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset counters"""
+        with self.lock:
+            self.batches = 0
+            self.items = 0
+            self.failed_batches = 0
+            self.peak_queue_depth = 0
+            self.batch_sizes = {}
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.compute_seconds = 0.0
+
+    def ensure_worker(self):
+        # The worker belongs to the event loop it was started on (tests run one loop per request)
+        loop = asyncio.get_running_loop()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        if self.loop is not loop or self.worker is None or self.worker.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self.run())
+
+    async def submit(self, item):
+        """Submit one item and await its result"""
+        self.ensure_worker()
+        future = self.loop.create_future()
+        self.queue.put_nowait((time.perf_counter(), item, future))
+        with self.lock:
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queue.qsize())
+        return await future
+
+    async def collect_batch(self) -> list:
+        # Wait for the first item, then for more until the batch is full or max_wait has passed
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        # Worker task: form batches and run them one at a time on the inference thread
+        while True:
+            batch = await self.collect_batch()
+            # Requests that were cancelled (client disconnected) are not computed
+            batch = [entry for entry in batch if not entry[2].done()]
+            if not batch:
+                continue
+
+            started_at = time.perf_counter()
+            items = [item for _, item, _ in batch]
+            try:
+                results = await self.loop.run_in_executor(self.executor, self.run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                with self.lock:
+                    self.failed_batches += 1
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.record_batch(batch, started_at)
+
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def record_batch(self, batch: list, started_at: float):
+        compute = time.perf_counter() - started_at
+        with self.lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            self.compute_seconds += compute
+            for submitted_at, _, _ in batch:
+                wait = started_at - submitted_at
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def stats(self) -> dict:
+        """Get batching counters"""
+        with self.lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+                "peak_queue_depth": self.peak_queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "failed_batches": self.failed_batches,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "avg_queue_wait_ms": self.wait_seconds / self.items * 1000 if self.items else 0.0,
+                "max_queue_wait_ms": self.max_wait_seconds * 1000,
+                "avg_batch_compute_ms": self.compute_seconds / self.batches * 1000 if self.batches else 0.0,
+            }
+
+    def shutdown(self):
+        """Stop the worker and the inference thread (they restart on the next submit)"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+# Requests admitted to decode + inference, and the threads that decode their images
+inference_admission = AdmissionGate(inference_max_pending)
+image_decode_pool = InstrumentedThreadPool("image-decode", image_decode_threads)
@@ -0,0 +1,89 @@
+"""
+JSON serialization of tables used by API service
+
+Tabular endpoints return DataFrames as a list of records. Converting them with
+df.to_dict(orient="records"), scrubbing NaN/Inf cell by cell in Python and re-encoding
+the dicts with FastAPI's jsonable_encoder costs far more than reading the table. Instead,
+each column is converted to Python values in one call, with non-finite floats and
+missing values replaced by None using NumPy masks, and the records are encoded to bytes
+by orjson.
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import Response
+
+
+# Define variables
+orjson_options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def column_values(series: pd.Series) -> list:
+    """Get the values of a column as a list of JSON-compatible Python values (NaN/Inf become None)"""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        values = series.to_numpy()
+        finite = np.isfinite(values)
+        if finite.all():
+            return values.tolist()
+        values = values.astype(object)
+        values[~finite] = None
+        return values.tolist()
+
+    if isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return series.to_numpy().tolist()
+
+    if isinstance(dtype, np.dtype) and dtype.kind == "M":
+        values = series.dt.strftime("%Y-%m-%dT%H:%M:%S.%f").to_numpy(dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+
+    # Object and extension columns: None, NaN, NaT and pd.NA all become None
+    missing = pd.isna(values)
+    if missing.any():
+        values = values.copy()
+        values[missing] = None
+    return values.tolist()
+
+
+def dataframe_to_records(df: pd.DataFrame) -> list:
+    """Convert a DataFrame to a list of records with NaN/Inf values replaced by None"""
+    columns = [str(column) for column in df.columns]
+    if not columns:
+        return [{} for _ in range(len(df))]
+    values = [column_values(df.iloc[:, i]) for i in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def json_default(value):
+    # Types orjson does not encode natively
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content) -> bytes:
+    """Encode content to JSON bytes (DataFrames as a list of records)"""
+    if isinstance(content, pd.DataFrame):
+        content = dataframe_to_records(content)
+    # orjson also encodes non-finite floats left in object columns as null
+    return orjson.dumps(content, default=json_default, option=orjson_options)
+
+
+def dumps_lines(df: pd.DataFrame) -> bytes:
+    """Encode a DataFrame as newline-delimited JSON records (NDJSON)"""
+    return b"".join(
+        orjson.dumps(record, default=json_default, option=orjson_options) + b"\n" for record in dataframe_to_records(df)
+    )
+
+
+class DataFrameJSONResponse(Response):
+    """JSON response rendered by orjson, taking a DataFrame (sent as a list of records) or plain content"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
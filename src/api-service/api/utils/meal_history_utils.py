@@ -0,0 +1,369 @@
+"""
+Utility functions used by meal history APIs
+
+Meal history is stored as an append-only log:
+    data/meal_history/meal_history_{user_id}.parquet         base file (compacted rows, or .csv)
+    data/meal_history/segments/{user_id}/{segment_id}.csv    one small segment per logged meal
+
+Logging a meal writes a new segment without reading the history, so its cost does not
+depend on the history size and concurrent writes cannot overwrite each other. Readers
+merge the base file with the segments, and compaction periodically folds the segments
+into the base file. Every base row remembers the segment it came from (segment_id), so
+segments that were merged but not yet deleted are never counted twice. The base file is
+only rewritten if it did not change since it was read, so concurrent compactions (e.g. in
+different workers) cannot drop each other's segments.
+
+With MEAL_WRITE_BUFFER_MS set, meals logged by the same user within that window (e.g. a
+meal followed by its symptoms) are buffered and written as one segment. Reads flush the
+user's buffer first; other workers see buffered meals once the window closes.
+
+Reads that only need the latest meals (last N / since a timestamp) fetch just the tail of
+a CSV base file with ranged reads (see csv_tail_utils); Parquet base files are read in
+full through the table cache. While segments are pending, the segment_id column of the
+whole base file is read as well, to tell merged segments from new ones.
+"""
+
+import base64
+import binascii
+import json
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException
+
+from api.utils.buffer_utils import WriteBuffer
+from api.utils.csv_tail_utils import parse_timestamp, read_csv_tail, select_tail, to_timestamps
+from api.utils.http_cache_utils import make_etag
+from api.utils.json_utils import dumps_lines
+from api.utils.storage_utils import ObjectNotFoundError
+from api.utils.utils import get_storage, read_csv_from_gcs, write_csv_to_gcs, retry_on_conflict
+from api.utils.table_utils import get_table_blob, iter_table, read_table, write_table
+
+
+# Define variables
+meal_history_columns = [
+    "date_time",
+    "dish",
+    "dish_confidence",
+    "dish_fodmap",
+    "ingredients",
+    "ingredients_fodmap_high",
+    "ingredients_fodmap_low",
+    "ingredients_fodmap_none",
+    "symptoms",
+]
+meal_history_schema = pa.schema(
+    [
+        ("date_time", pa.string()),
+        ("dish", pa.string()),
+        ("dish_confidence", pa.float64()),
+        ("dish_fodmap", pa.string()),
+        ("ingredients", pa.string()),
+        ("ingredients_fodmap_high", pa.string()),
+        ("ingredients_fodmap_low", pa.string()),
+        ("ingredients_fodmap_none", pa.string()),
+        ("symptoms", pa.string()),
+        ("segment_id", pa.string()),
+    ]
+)
+compaction_threshold = int(os.environ.get("MEAL_SEGMENT_COMPACTION_THRESHOLD", "20"))
+write_buffer_window = float(os.environ.get("MEAL_WRITE_BUFFER_MS", "0")) / 1000
+export_chunk_rows = int(os.environ.get("MEAL_HISTORY_EXPORT_CHUNK_ROWS", "5000"))
+export_formats = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+compaction_lock_stripes = int(os.environ.get("MEAL_COMPACTION_LOCK_STRIPES", "64"))
+# Striped by user ID so the number of locks stays fixed however many users compact
+_compaction_locks = [threading.Lock() for _ in range(compaction_lock_stripes)]
+
+
+def get_meal_history_path(user_id: str) -> str:
+    """Get path of the base meal history table (without file extension)"""
+    return f"data/meal_history/meal_history_{user_id}"
+
+
+def get_segment_prefix(user_id: str) -> str:
+    """Get path prefix of the meal history segments"""
+    return f"data/meal_history/segments/{user_id}/"
+
+
+def get_segment_id(name: str) -> str:
+    """Get segment ID from segment path"""
+    return name.rsplit("/", 1)[-1].removesuffix(".csv")
+
+
+def list_segments(user_id: str) -> list:
+    """List meal history segments in append order"""
+    blobs = get_storage().list_blobs(prefix=get_segment_prefix(user_id))
+    return sorted(blobs, key=lambda b: b.name)
+
+
+def write_segment(user_id: str, rows: list) -> str:
+    """
+    Write meals to the user's meal history as a new segment.
+
+    Args:
+        user_id: User ID
+        rows: Meal records with the meal history columns
+
+    Returns:
+        Path of the new segment
+    """
+    # Time-ordered name, with a random suffix so concurrent writes never collide
+    segment_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    blob = get_storage().blob(f"{get_segment_prefix(user_id)}{segment_id}.csv")
+    write_csv_to_gcs(blob, pd.DataFrame(rows, columns=meal_history_columns), if_generation_match=0)
+    return blob.name
+
+
+meal_write_buffer = WriteBuffer(write_buffer_window, write_segment)
+
+
+def append_meal(user_id: str, row: dict):
+    """
+    Append one meal to the user's meal history.
+
+    Returns:
+        Path of the new segment, or None if the meal was buffered
+    """
+    if meal_write_buffer.enabled:
+        meal_write_buffer.add(user_id, row)
+        return None
+    return write_segment(user_id, [row])
+
+
+def read_base_tail(blob, last: int = None, since: str = None) -> pd.DataFrame:
+    """Read the latest rows of the base file (only the tail of CSV files is downloaded)"""
+    if blob.name.endswith(".csv"):
+        return read_csv_tail(blob, last=last, since=since)
+    return select_tail(read_table(blob), last, since)
+
+
+def load_meal_log(user_id: str, last: int = None, since: str = None):
+    """
+    Load base file and segments of the user's meal history.
+
+    Args:
+        user_id: User ID
+        last: Only load the last N rows of the base file
+        since: Only load base rows logged at or after this timestamp
+
+    Returns:
+        Tuple of (base blob, merged DataFrame including segment_id, all segment blobs)
+    """
+    # Buffered meals must be visible to the reader
+    meal_write_buffer.flush(user_id)
+
+    base_blob = get_table_blob(get_meal_history_path(user_id))
+    if last is None and since is None:
+        base_df = read_table(base_blob)
+    else:
+        base_df = read_base_tail(base_blob, last, since)
+    segment_blobs = list_segments(user_id)
+
+    merged_ids = set(base_df["segment_id"].dropna()) if "segment_id" in base_df.columns else set()
+    if (last is not None or since is not None) and any(
+        get_segment_id(blob.name) not in merged_ids for blob in segment_blobs
+    ):
+        # The tail only names the segments of its own rows; a segment merged into an earlier
+        # row (compacted but not yet deleted) must not be appended again
+        merged_ids = set(read_table(base_blob, columns=["segment_id"]).get("segment_id", pd.Series()).dropna())
+    frames = [base_df]
+    for blob in segment_blobs:
+        segment_id = get_segment_id(blob.name)
+        if segment_id not in merged_ids:
+            frames.append(read_csv_from_gcs(blob).assign(segment_id=segment_id))
+
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return base_blob, base_df, segment_blobs
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df.where(pd.notna(df), None)
+    return base_blob, df, segment_blobs
+
+
+def read_meal_history(user_id: str, last: int = None, since: str = None) -> pd.DataFrame:
+    """
+    Read the user's meal history (base file + segments).
+
+    Args:
+        user_id: User ID
+        last: Only read the last N meals
+        since: Only read meals logged at or after this ISO 8601 timestamp
+
+    Returns:
+        Meals in the order they were logged, with the (ETag, last modified time) of the
+        version that was read in df.attrs["version"]
+    """
+    base_blob, df, segment_blobs = load_meal_log(user_id, last, since)
+    if last is not None or since is not None:
+        df = select_tail(df, last, since)
+    df = df.drop(columns=["segment_id"], errors="ignore")
+    df.attrs["version"] = get_meal_log_version(base_blob, segment_blobs)
+    return df
+
+
+def get_meal_log_version(base_blob, segment_blobs: list) -> tuple:
+    """Get (ETag, last modified time) of a meal history from the generations of its objects"""
+    blobs = [base_blob] + list(segment_blobs)
+    etag = make_etag(*(f"{blob.name}:{blob.generation}:{blob.metageneration}" for blob in blobs))
+    last_modified = max((blob.updated for blob in blobs if blob.updated is not None), default=None)
+    return etag, last_modified
+
+
+def get_meal_history_version(user_id: str) -> tuple:
+    """Get (ETag, last modified time) of the user's meal history without reading it"""
+    # Buffered meals are part of the current version
+    meal_write_buffer.flush(user_id)
+    base_blob = get_table_blob(get_meal_history_path(user_id))
+    return get_meal_log_version(base_blob, list_segments(user_id))
+
+
+def encode_export_chunk(df: pd.DataFrame, export_format: str) -> bytes:
+    """Encode meals as NDJSON lines or CSV rows (without header)"""
+    df = df.reindex(columns=meal_history_columns)
+    if export_format == "csv":
+        return df.to_csv(index=False, header=False).encode("utf-8")
+    return dumps_lines(df)
+
+
+def iter_meal_history_export(user_id: str, export_format: str = "ndjson"):
+    """
+    Export the user's meal history in log order, in chunks of encoded rows.
+
+    The base file is read in chunks of export_chunk_rows rows, so memory use does not
+    grow with the history size; segments (few, and small) are read up front so they
+    match the base file generation being exported.
+
+    Args:
+        user_id: User ID
+        export_format: "ndjson" or "csv"
+
+    Yields:
+        Encoded rows (CSV output starts with the header line)
+    """
+    # Buffered meals must be visible to the export
+    meal_write_buffer.flush(user_id)
+
+    base_blob = get_table_blob(get_meal_history_path(user_id))
+    segments = {get_segment_id(blob.name): read_csv_from_gcs(blob) for blob in list_segments(user_id)}
+
+    if export_format == "csv":
+        yield (",".join(meal_history_columns) + "\n").encode("utf-8")
+
+    merged_ids = set()
+    for chunk in iter_table(base_blob, export_chunk_rows):
+        if "segment_id" in chunk.columns:
+            # Only track the segments that are still pending, so memory stays constant
+            merged_ids.update(segment_id for segment_id in chunk["segment_id"].dropna() if segment_id in segments)
+        if not chunk.empty:
+            yield encode_export_chunk(chunk, export_format)
+
+    for segment_id, df in segments.items():
+        if segment_id not in merged_ids and not df.empty:
+            yield encode_export_chunk(df, export_format)
+
+
+def compact_meal_history(user_id: str) -> int:
+    """
+    Merge the user's segments into the base file and delete them.
+
+    Returns:
+        Number of segments removed
+    """
+
+    def attempt():
+        base_blob, df, segment_blobs = load_meal_log(user_id)
+        if not segment_blobs:
+            return 0
+
+        # Fails if another worker rewrote the base file since it was read
+        write_table(get_meal_history_path(user_id), df, meal_history_schema, previous_blob=base_blob)
+
+        # Every listed segment is now part of the base file
+        for blob in segment_blobs:
+            try:
+                blob.delete()
+            except ObjectNotFoundError:
+                pass
+
+        print(f"🗜️  Compacted {len(segment_blobs)} meal history segment(s) for user {user_id}")
+        return len(segment_blobs)
+
+    with _compaction_locks[hash(user_id) % len(_compaction_locks)]:
+        return retry_on_conflict(attempt)
+
+
+def compact_meal_history_if_needed(user_id: str) -> int:
+    """Compact the user's meal history once enough segments have accumulated"""
+    if len(list_segments(user_id)) < compaction_threshold:
+        return 0
+    return compact_meal_history(user_id)
+
+
+def encode_cursor(date_time: str, offset: int) -> str:
+    """Encode the position after the offset-th meal logged at date_time as an opaque cursor"""
+    payload = json.dumps({"t": date_time, "n": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor into (date_time, offset)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(payload["t"]), int(payload["n"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+
+def parse_time_query(name: str, value: str):
+    """Parse an ISO 8601 timestamp query parameter as UTC (None if it is not set)"""
+    if value is None:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value} (expected an ISO 8601 timestamp)")
+
+
+def paginate_meal_history(df: pd.DataFrame, limit: int = None, cursor: str = None, until: str = None):
+    """
+    Order meals by date_time and select one page.
+
+    Meals logged at the same date_time keep the order they were logged in, so a cursor
+    (date_time of the last meal returned + how many meals at that date_time were returned)
+    stays valid while new meals are logged.
+
+    Args:
+        df: Meal history
+        limit: Maximum number of meals on the page (all meals if None)
+        cursor: Cursor returned with the previous page
+        until: Only include meals logged before this ISO 8601 timestamp
+
+    Returns:
+        Tuple of (page DataFrame, cursor of the next page or None)
+    """
+    if "date_time" not in df.columns:
+        return (df.head(limit) if limit is not None else df), None
+
+    date_time = df["date_time"].fillna("").astype(str)
+    order = date_time.reset_index(drop=True).sort_values(kind="stable").index
+    df = df.iloc[order].reset_index(drop=True)
+    date_time = date_time.iloc[order].reset_index(drop=True)
+    rank = date_time.groupby(date_time).cumcount()
+
+    keep = pd.Series(True, index=df.index)
+    if until is not None:
+        keep &= to_timestamps(date_time) < parse_timestamp(until)
+    if cursor is not None:
+        after, offset = decode_cursor(cursor)
+        keep &= (date_time > after) | ((date_time == after) & (rank >= offset))
+    df, date_time, rank = df[keep], date_time[keep], rank[keep]
+
+    if limit is None or len(df) <= limit:
+        return df.reset_index(drop=True), None
+    next_cursor = encode_cursor(date_time.iloc[limit - 1], int(rank.iloc[limit - 1]) + 1)
+    return df.head(limit).reset_index(drop=True), next_cursor
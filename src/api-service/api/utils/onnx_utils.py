@@ -0,0 +1,118 @@
+"""
+ONNX Runtime backend for the food classifier
+
+The transformers pipeline runs the fine-tuned ViT eagerly on PyTorch. On CPU-only nodes,
+ONNX Runtime with full graph optimizations (fused attention/GELU/LayerNorm kernels) runs
+the same network faster and with less memory. export_onnx converts the safetensors
+checkpoint to model.onnx next to it once; OnnxImageClassifier is a drop-in replacement
+for the pipeline that returns the same label/score lists (with the fused preprocessing of
+preprocessing_utils).
+
+Export ahead of time (e.g. at image build) with:
+    python -m api.utils.onnx_utils /tmp/models [--force]
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from api.utils.preprocessing_utils import DirectImageClassifier
+
+
+# Define variables
+onnx_file_name = "model.onnx"
+onnx_opset_version = 17
+onnx_intra_op_threads = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))
+
+
+def export_onnx(model_local_path: str, force: bool = False) -> str:
+    """
+    Export the image classification checkpoint in model_local_path to ONNX.
+
+    The export is cached as model.onnx in the same directory and redone only if the
+    checkpoint is newer.
+
+    Args:
+        model_local_path: Directory with config.json and model.safetensors
+        force: Export even if an up-to-date model.onnx exists
+
+    Returns:
+        Path to the ONNX model
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForImageClassification
+
+    model_dir = Path(model_local_path)
+    onnx_path = model_dir / onnx_file_name
+    checkpoint_path = model_dir / "model.safetensors"
+    if not force and onnx_path.exists() and onnx_path.stat().st_mtime >= checkpoint_path.stat().st_mtime:
+        print(f"✓ ONNX model already exported at {onnx_path}")
+        return str(onnx_path)
+
+    print(f"🔧 Exporting {checkpoint_path} to ONNX...")
+    config = AutoConfig.from_pretrained(model_dir)
+    model = AutoModelForImageClassification.from_pretrained(model_dir).eval()
+    size = config.image_size
+    dummy = torch.zeros(1, config.num_channels, size, size)
+
+    # Write to a temporary file of our own first, so a crash never leaves a truncated model
+    # behind and workers exporting at the same time never write into each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix=".tmp-", suffix=".onnx")
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy,),
+                tmp_path,
+                input_names=["pixel_values"],
+                output_names=["logits"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=onnx_opset_version,
+                dynamo=False,
+            )
+        os.replace(tmp_path, onnx_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    print(f"✅ Exported ONNX model to {onnx_path}")
+    return str(onnx_path)
+
+
+class OnnxImageClassifier(DirectImageClassifier):
+    """
+    Image classifier running an exported model on ONNX Runtime.
+
+    Called like the transformers image-classification pipeline: a single image gives a
+    list of {"label", "score"} dicts (best first), a list of images gives one such list
+    per image.
+    """
+
+    def __init__(self, model_local_path: str, top_k: int = 5):
+        import onnxruntime as ort
+
+        super().__init__(model_local_path, top_k=top_k)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = onnx_intra_op_threads
+        self.session = ort.InferenceSession(
+            str(Path(model_local_path) / onnx_file_name), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+
+    def forward(self, pixel_values: np.ndarray) -> np.ndarray:
+        return self.session.run(["logits"], {"pixel_values": pixel_values})[0]
+
+
+def load_onnx_classifier(model_local_path: str) -> OnnxImageClassifier:
+    """Export the model to ONNX if needed and load it on ONNX Runtime"""
+    export_onnx(model_local_path)
+    print(f"✅ Loading ONNX Runtime model from {model_local_path}")
+    return OnnxImageClassifier(model_local_path)
+
+
+if __name__ == "__main__":
+    paths = [arg for arg in sys.argv[1:] if arg != "--force"]
+    export_onnx(paths[0] if paths else "/tmp/models", force="--force" in sys.argv)
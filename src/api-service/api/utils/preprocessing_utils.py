@@ -0,0 +1,143 @@
+"""
+Fused image preprocessing for the food classifier
+
+With the transformers pipeline, an upload is resampled twice: safe_load_image shrinks it
+to 512px (LANCZOS), then the pipeline's image processor resizes it again to the model
+input size before rescaling and normalizing in separate passes. ImagePreprocessor reads
+the same settings from preprocessor_config.json and goes from the decoded image to the
+normalized float32 pixel values with a single resize and one fused multiply-add per
+channel. TorchImageClassifier runs the model on those pixel values directly, without the
+pipeline's per-call overhead, and returns the same label/score lists.
+
+Enable with FUSED_PREPROCESSING=1.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+# Define variables (ViTImageProcessor defaults, used when the config leaves a setting out)
+default_size = {"height": 224, "width": 224}
+default_resample = Image.Resampling.BILINEAR
+default_rescale_factor = 1 / 255
+default_image_mean = [0.5, 0.5, 0.5]
+default_image_std = [0.5, 0.5, 0.5]
+
+
+class ImagePreprocessor:
+    """
+    Convert images to the model's pixel values like the checkpoint's image processor.
+
+    Supports processors that resize to a fixed height/width, then rescale and normalize
+    (ViTImageProcessor); other configurations raise ValueError.
+    """
+
+    def __init__(self, model_local_path: str):
+        config = json.loads((Path(model_local_path) / "preprocessor_config.json").read_text())
+        if config.get("do_center_crop") or config.get("do_pad"):
+            raise ValueError("Fused preprocessing does not support center crop or padding")
+
+        self.size = None
+        if config.get("do_resize", True):
+            size = config.get("size") or default_size
+            if "height" not in size or "width" not in size:
+                raise ValueError(f"Fused preprocessing needs a fixed height and width, got size {size}")
+            self.size = (size["width"], size["height"])
+        self.resample = Image.Resampling(config.get("resample", default_resample))
+
+        rescale_factor = config.get("rescale_factor", default_rescale_factor) if config.get("do_rescale", True) else 1
+        if config.get("do_normalize", True):
+            mean = np.array(config.get("image_mean", default_image_mean), dtype=np.float64)
+            std = np.array(config.get("image_std", default_image_std), dtype=np.float64)
+        else:
+            mean, std = np.zeros(3), np.ones(3)
+        # (pixel * rescale_factor - mean) / std as one multiply-add per channel
+        self.scale = (rescale_factor / std).astype(np.float32).reshape(3, 1, 1)
+        self.offset = (-mean / std).astype(np.float32).reshape(3, 1, 1)
+
+    def __call__(self, image: Image.Image) -> np.ndarray:
+        """
+        Preprocess one image.
+
+        Args:
+            image: Decoded PIL image, at any resolution
+
+        Returns:
+            Pixel values as a float32 array of shape (3, height, width)
+        """
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if self.size is not None and image.size != self.size:
+            image = image.resize(self.size, resample=self.resample)
+        # Channels first while still uint8, so the float pass writes the output layout directly
+        pixels = np.asarray(image).transpose(2, 0, 1)
+        pixel_values = np.multiply(pixels, self.scale, dtype=np.float32)
+        pixel_values += self.offset
+        return pixel_values
+
+    def batch(self, images: list) -> np.ndarray:
+        """Preprocess images (or stack already preprocessed pixel values) into a (N, 3, H, W) batch"""
+        return np.stack([image if isinstance(image, np.ndarray) else self(image) for image in images])
+
+
+class DirectImageClassifier:
+    """
+    Image classifier that runs the model on fused-preprocessed pixel values.
+
+    Called like the transformers image-classification pipeline: a single image gives a
+    list of {"label", "score"} dicts (best first), a list of images gives one such list
+    per image. Images are PIL images or pixel values already made by self.preprocessor.
+    Subclasses implement forward for their runtime.
+    """
+
+    def __init__(self, model_local_path: str, top_k: int = 5):
+        model_dir = Path(model_local_path)
+        config = json.loads((model_dir / "config.json").read_text())
+        self.id2label = {int(i): label for i, label in config["id2label"].items()}
+        self.top_k = min(top_k, len(self.id2label))
+        # Same rule as the pipeline: sigmoid for multi-label or single-logit models
+        self.multi_label = config.get("problem_type") == "multi_label_classification" or len(self.id2label) == 1
+        self.preprocessor = ImagePreprocessor(model_dir)
+
+    def forward(self, pixel_values: np.ndarray) -> np.ndarray:
+        """Compute the logits of a (N, 3, H, W) float32 batch"""
+        raise NotImplementedError
+
+    def __call__(self, images, batch_size: int = None, top_k: int = None):
+        single = not isinstance(images, list)
+        batch = [images] if single else images
+        top_k = self.top_k if top_k is None else min(top_k, len(self.id2label))
+
+        results = []
+        batch_size = batch_size or len(batch)
+        for start in range(0, len(batch), batch_size):
+            logits = self.forward(self.preprocessor.batch(batch[start : start + batch_size]))
+            results.extend(self.postprocess(row, top_k) for row in logits)
+        return results[0] if single else results
+
+    def postprocess(self, logits: np.ndarray, top_k: int) -> list:
+        logits = logits.astype(np.float64)
+        if self.multi_label:
+            scores = 1 / (1 + np.exp(-logits))
+        else:
+            scores = np.exp(logits - logits.max())
+            scores /= scores.sum()
+        best = np.argsort(-scores, kind="stable")[:top_k]
+        return [{"label": self.id2label[int(i)], "score": float(scores[i])} for i in best]
+
+
+class TorchImageClassifier(DirectImageClassifier):
+    """Fused-preprocessing classifier around a PyTorch image classification model"""
+
+    def __init__(self, model_local_path: str, model, top_k: int = 5):
+        super().__init__(model_local_path, top_k=top_k)
+        self.model = model.eval()
+
+    def forward(self, pixel_values: np.ndarray) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            return self.model(pixel_values=torch.from_numpy(pixel_values)).logits.float().numpy()
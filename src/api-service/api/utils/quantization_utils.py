@@ -0,0 +1,75 @@
+"""
+Dynamic INT8 quantization of the food classifier
+
+Most of the ViT forward pass is spent in its Linear layers (attention projections and
+MLP). Dynamic quantization stores their weights as INT8 and quantizes activations on the
+fly, which makes CPU inference faster and the weights 4x smaller, usually at a small
+accuracy cost. Check that cost with validate_model.py --quantize before enabling
+MODEL_QUANTIZATION=int8.
+
+The quantized weights are cached as model.int8.pt next to the fp32 checkpoint and
+rebuilt only when the checkpoint is newer.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import torch
+from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification, pipeline
+
+
+# Define variables
+quantized_file_name = "model.int8.pt"
+
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """Dynamically quantize the Linear layers of a model to INT8"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def build_quantized_model(model_local_path: str, force: bool = False) -> torch.nn.Module:
+    """
+    Load the INT8 model, quantizing the fp32 checkpoint in model_local_path if needed.
+
+    Args:
+        model_local_path: Directory with config.json and model.safetensors
+        force: Quantize even if an up-to-date cached model exists
+
+    Returns:
+        Quantized model in eval mode
+    """
+    model_dir = Path(model_local_path)
+    quantized_path = model_dir / quantized_file_name
+    checkpoint_path = model_dir / "model.safetensors"
+
+    if not force and quantized_path.exists() and quantized_path.stat().st_mtime >= checkpoint_path.stat().st_mtime:
+        print(f"✓ Loading cached INT8 model from {quantized_path}")
+        # Quantize the freshly initialized architecture so its modules match the cached weights
+        config = AutoConfig.from_pretrained(model_dir)
+        model = quantize_model(AutoModelForImageClassification.from_config(config).eval())
+        model.load_state_dict(torch.load(quantized_path, weights_only=True))
+        return model
+
+    print(f"🔧 Quantizing {checkpoint_path} to INT8...")
+    model = quantize_model(AutoModelForImageClassification.from_pretrained(model_dir).eval())
+
+    # Write to a temporary file of our own first, so a crash never leaves a truncated model
+    # behind and workers quantizing at the same time never write into each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix=".tmp-", suffix=".pt")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(model.state_dict(), f)
+        os.replace(tmp_path, quantized_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    print(f"✅ Cached INT8 model at {quantized_path}")
+    return model
+
+
+def load_quantized_classifier(model_local_path: str):
+    """Load an image-classification pipeline around the INT8 model"""
+    model = build_quantized_model(model_local_path)
+    image_processor = AutoImageProcessor.from_pretrained(model_local_path)
+    return pipeline("image-classification", model=model, image_processor=image_processor)
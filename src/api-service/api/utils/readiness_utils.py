@@ -0,0 +1,82 @@
+"""
+Readiness of components loaded in the background
+
+Liveness (/health) only says the process is serving. Components that take a while to
+load (reference tables, the food model and its warm-up) report their status here, and
+/ready answers 200 only once all of them are ready, so Kubernetes routes traffic to a
+pod only when it can serve predictions. A failed component also fails /health, so the
+pod is restarted instead of staying unready.
+
+Statuses are tracked per process. With a preloaded gunicorn app (PRELOAD_APP=1) the master
+loads the model and each worker finishes its warm-up before serving, so any worker's
+answer holds for the pod; with `uvicorn --workers` each worker loads on its own, and /ready
+only describes the worker that answered.
+"""
+
+import threading
+import time
+
+
+# Component statuses; "degraded" (loaded with problems) and "skipped" (not loaded, e.g. in
+# CI mode) components count as ready
+pending = "pending"
+loading = "loading"
+ready = "ready"
+degraded = "degraded"
+skipped = "skipped"
+failed = "failed"
+ready_statuses = (ready, degraded, skipped)
+
+
+class Readiness:
+    """Status of named startup components"""
+
+    def __init__(self):
+        self.components = {}
+        self.lock = threading.Lock()
+
+    def register(self, *names: str):
+        """Register components as pending (keeps the status of already registered ones)"""
+        with self.lock:
+            for name in names:
+                self.components.setdefault(name, {"status": pending, "error": None, "started": None, "seconds": None})
+
+    def set(self, name: str, status: str, error: str = None):
+        """Set the status of a component, timing how long it spent loading"""
+        now = time.monotonic()
+        with self.lock:
+            component = self.components.setdefault(name, {"status": pending, "error": None, "started": None})
+            if status == loading:
+                component["started"] = now
+                component["seconds"] = None
+            elif component.get("started") is not None:
+                component["seconds"] = round(now - component["started"], 3)
+            component["status"] = status
+            component["error"] = error
+
+    def status(self, name: str) -> str:
+        with self.lock:
+            component = self.components.get(name)
+            return component["status"] if component else pending
+
+    def is_ready(self) -> bool:
+        """Check if every component is ready (or degraded or skipped)"""
+        with self.lock:
+            return all(c["status"] in ready_statuses for c in self.components.values())
+
+    def failed(self) -> list:
+        """Get the names of the components that failed to load"""
+        with self.lock:
+            return [name for name, c in self.components.items() if c["status"] == failed]
+
+    def report(self) -> dict:
+        """Get overall readiness and the status of each component"""
+        with self.lock:
+            components = {
+                name: {"status": c["status"], "error": c["error"], "seconds": c.get("seconds")}
+                for name, c in self.components.items()
+            }
+        return {"ready": all(c["status"] in ready_statuses for c in components.values()), "components": components}
+
+
+readiness = Readiness()
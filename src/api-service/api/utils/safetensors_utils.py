@@ -0,0 +1,111 @@
+"""
+Memory-mapped model weights shared across uvicorn workers
+
+Every uvicorn worker imports the food model router and loads its own copy of the model,
+so a pod with 4 workers holds 4 copies of the weights in private memory. With
+MODEL_MMAP=1, the weights are instead used in place from a read-only memory map of
+model.safetensors: the tensors point into the file's page cache, which the kernel shares
+between every process that maps the same file, so the weights take physical memory once
+per pod whatever the number of workers.
+
+The model skeleton is built on the meta device (no memory for weights) and the mapped
+tensors are assigned to it with load_state_dict(assign=True), so the weights are never
+copied.
+"""
+
+import json
+import mmap
+import struct
+from pathlib import Path
+
+import torch
+from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification, pipeline
+
+
+# Define variables
+safetensors_dtypes = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def mmap_safetensors(path: str) -> dict:
+    """
+    Map a safetensors file and return its tensors as views of the mapping (no copy).
+
+    The mapping is private copy-on-write: pages stay shared with other processes mapping
+    the file as long as nobody writes to the tensors.
+
+    Args:
+        path: Path to a .safetensors file
+
+    Returns:
+        Dict mapping tensor name to tensor
+    """
+    with open(path, "rb") as f:
+        # The mapping stays valid after the file is closed
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    # Layout: 8-byte little-endian header size, JSON header, then the tensor data
+    (header_size,) = struct.unpack("<Q", buffer[:8])
+    header = json.loads(buffer[8 : 8 + header_size])
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = safetensors_dtypes.get(info["dtype"])
+        if dtype is None:
+            raise ValueError(f"Unsupported safetensors dtype {info['dtype']} for {name}")
+        start, end = info["data_offsets"]
+        if end == start:
+            tensor = torch.empty(0, dtype=dtype)
+        else:
+            tensor = torch.frombuffer(
+                buffer, dtype=dtype, count=(end - start) // dtype.itemsize, offset=data_start + start
+            )
+        tensors[name] = tensor.reshape(info["shape"])
+    return tensors
+
+
+def load_mmap_model(model_local_path: str) -> torch.nn.Module:
+    """
+    Load the image classification model with its weights memory-mapped from model.safetensors.
+
+    Args:
+        model_local_path: Directory with config.json and model.safetensors
+
+    Returns:
+        Model in eval mode whose parameters are views of the mapped file
+    """
+    model_dir = Path(model_local_path)
+    config = AutoConfig.from_pretrained(model_dir)
+    with torch.device("meta"):
+        model = AutoModelForImageClassification.from_config(config)
+
+    state_dict = mmap_safetensors(str(model_dir / "model.safetensors"))
+    model.load_state_dict(state_dict, assign=True)
+    model.eval().requires_grad_(False)
+
+    # Buffers that are not saved in the checkpoint would still be on the meta device
+    tensors = list(model.named_parameters()) + list(model.named_buffers())
+    missing = [name for name, tensor in tensors if tensor.is_meta]
+    if missing:
+        raise ValueError(f"Tensors missing from {model_dir / 'model.safetensors'}: {missing}")
+    return model
+
+
+def load_mmap_classifier(model_local_path: str):
+    """Load an image-classification pipeline around the memory-mapped model"""
+    model = load_mmap_model(model_local_path)
+    image_processor = AutoImageProcessor.from_pretrained(model_local_path)
+    return pipeline("image-classification", model=model, image_processor=image_processor)
@@ -0,0 +1,568 @@
+"""
+Storage backends used by API service
+"""
+
+import gzip
+import io
+import itertools
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Define variables
+default_chunk_size = 256 * 1024
+content_encodings = ("gzip", "zstd")
+gzip_magic = b"\x1f\x8b"
+zstd_magic = b"\x28\xb5\x2f\xfd"
+
+
+class ObjectNotFoundError(FileNotFoundError):
+    """Raised when an object does not exist in the storage backend"""
+
+
+class PreconditionFailedError(Exception):
+    """Raised when a conditional write finds the object at another generation"""
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress data with a content encoding (gzip, or zstd if zstandard is installed)"""
+    if encoding == "gzip":
+        # Fixed mtime so identical content produces identical objects
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd content encoding requires the zstandard package")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress gzip or zstd data, detected from its magic bytes; other data is returned unchanged"""
+    if data[:2] == gzip_magic:
+        return gzip.decompress(data)
+    if data[:4] == zstd_magic:
+        if zstandard is None:
+            raise ValueError("Object is zstd compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    """Object metadata shared by all storage backends"""
+
+    name: str
+    size: int = 0
+    generation: Optional[int] = None
+    metageneration: Optional[int] = None
+    etag: Optional[str] = None
+    content_type: Optional[str] = None
+    updated: Optional[datetime] = None
+    content_encoding: Optional[str] = None
+
+
+class StorageBackend:
+    """
+    Base class for storage backends.
+
+    Backends implement the object primitives (stat/get/put/list/delete/stream). The
+    blob/get_blob/list_blobs helpers expose them through the subset of the
+    google.cloud.storage Bucket interface used by the routers.
+
+    Writes accept an if_generation_match precondition with GCS semantics: the write only
+    succeeds if the object is currently at that generation (0 means it must not exist),
+    otherwise PreconditionFailedError is raised.
+
+    put stores data as given; content_encoding only records how it was compressed (see
+    StorageBlob, which compresses on upload and decompresses on download).
+    """
+
+    def stat(self, name: str) -> Optional[ObjectInfo]:
+        """Get object metadata, or None if the object does not exist"""
+        raise NotImplementedError
+
+    def get(self, name: str) -> bytes:
+        """Get object content"""
+        raise NotImplementedError
+
+    def get_range(self, name: str, start: int, end: int, if_generation_match: Optional[int] = None) -> bytes:
+        """Get bytes start to end (inclusive, like an HTTP Range) of the object content as stored"""
+        raise NotImplementedError
+
+    def put(
+        self,
+        name: str,
+        data: bytes,
+        content_type: Optional[str] = None,
+        if_generation_match: Optional[int] = None,
+        content_encoding: Optional[str] = None,
+    ) -> ObjectInfo:
+        """Create or overwrite object, returning its new metadata"""
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> list:
+        """List metadata of all objects whose name starts with prefix, sorted by name"""
+        raise NotImplementedError
+
+    def delete(self, name: str) -> None:
+        """Delete object"""
+        raise NotImplementedError
+
+    def exists(self, name: str) -> bool:
+        """Check if object exists"""
+        return self.stat(name) is not None
+
+    def open(self, name: str, if_generation_match: Optional[int] = None) -> BinaryIO:
+        """Open object content as stored, as a seekable binary file that reads it in chunks"""
+        raise NotImplementedError
+
+    def stream(self, name: str, chunk_size: int = default_chunk_size) -> Iterator[bytes]:
+        """Iterate over object content as stored, in chunks"""
+        data = self.get(name)
+        for start in range(0, len(data), chunk_size):
+            yield data[start : start + chunk_size]
+
+    def download_to_filename(self, name: str, filename: str) -> None:
+        """Download object content to a local file"""
+        with open(filename, "wb") as f:
+            for chunk in self.stream(name):
+                f.write(chunk)
+
+    def blob(self, name: str) -> "StorageBlob":
+        """Get handle to object (no request is made)"""
+        return StorageBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional["StorageBlob"]:
+        """Get handle to object with its metadata loaded, or None if it does not exist"""
+        info = self.stat(name)
+        return StorageBlob(self, name, info) if info is not None else None
+
+    def list_blobs(self, prefix: str = "") -> list:
+        """List handles to all objects whose name starts with prefix"""
+        return [StorageBlob(self, info.name, info) for info in self.list(prefix)]
+
+
+class StorageBlob:
+    """
+    Handle to a single object, mirroring the subset of google.cloud.storage.Blob used by the API.
+
+    Uploads with a content_encoding are compressed before they are stored, and downloads
+    are decompressed transparently. The content is checked for a compression header rather
+    than trusting the metadata alone, because GCS already decompresses gzip objects for
+    clients and the local backend has no metadata to record the encoding in.
+    """
+
+    def __init__(self, backend: StorageBackend, name: str, info: Optional[ObjectInfo] = None):
+        self.backend = backend
+        self.name = name
+        self.info = info
+
+    def __repr__(self):
+        return f"<StorageBlob {self.name} generation={self.generation}>"
+
+    @property
+    def size(self):
+        return self.info.size if self.info else None
+
+    @property
+    def generation(self):
+        return self.info.generation if self.info else None
+
+    @property
+    def metageneration(self):
+        return self.info.metageneration if self.info else None
+
+    @property
+    def etag(self):
+        return self.info.etag if self.info else None
+
+    @property
+    def content_type(self):
+        return self.info.content_type if self.info else None
+
+    @property
+    def updated(self):
+        return self.info.updated if self.info else None
+
+    @property
+    def content_encoding(self):
+        return self.info.content_encoding if self.info else None
+
+    def is_compressible(self) -> bool:
+        # Only objects that declare an encoding, or text objects (which never start with a
+        # compression header), are decompressed; binary objects are returned as stored
+        if self.info is None or self.info.content_encoding in content_encodings:
+            return True
+        return (self.info.content_type or "").startswith("text/")
+
+    def reload(self):
+        """Refresh object metadata"""
+        info = self.backend.stat(self.name)
+        if info is None:
+            raise ObjectNotFoundError(self.name)
+        self.info = info
+
+    def exists(self) -> bool:
+        return self.backend.exists(self.name)
+
+    def download_as_bytes(self) -> bytes:
+        data = self.backend.get(self.name)
+        return decompress(data) if self.is_compressible() else data
+
+    def download_as_text(self, encoding: str = "utf-8") -> str:
+        return self.download_as_bytes().decode(encoding)
+
+    def download_range(self, start: int, end: int) -> bytes:
+        """
+        Download bytes start to end (inclusive) of the stored content, without decompressing.
+
+        The range is read from the generation the handle was loaded at, so ranges read one
+        after another come from the same object version (PreconditionFailedError otherwise).
+        """
+        return self.backend.get_range(self.name, start, end, if_generation_match=self.generation)
+
+    def download_to_filename(self, filename: str) -> None:
+        self.backend.download_to_filename(self.name, filename)
+
+    def open(self, mode: str = "rb") -> BinaryIO:
+        """
+        Open the object for reading in chunks, decompressing it on the fly.
+
+        The file reads the generation the handle was loaded at, if any.
+        """
+        if mode != "rb":
+            raise ValueError(f"Unsupported mode: {mode}")
+        f = self.backend.open(self.name, if_generation_match=self.generation)
+        if not self.is_compressible():
+            return f
+
+        magic = f.read(4)
+        f.seek(0)
+        if magic.startswith(gzip_magic):
+            return gzip.GzipFile(fileobj=f, mode="rb")
+        if magic.startswith(zstd_magic):
+            if zstandard is None:
+                raise ValueError("Object is zstd compressed but the zstandard package is not installed")
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=True))
+        return f
+
+    def upload_from_string(
+        self,
+        data,
+        content_type: Optional[str] = None,
+        if_generation_match: Optional[int] = None,
+        content_encoding: Optional[str] = None,
+    ) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if content_encoding:
+            data = compress(data, content_encoding)
+        self.info = self.backend.put(
+            self.name,
+            data,
+            content_type=content_type,
+            if_generation_match=if_generation_match,
+            content_encoding=content_encoding,
+        )
+
+    def delete(self) -> None:
+        self.backend.delete(self.name)
+        self.info = None
+
+    def stream(self, chunk_size: int = default_chunk_size) -> Iterator[bytes]:
+        """Iterate over the object content in chunks, decompressed like download_as_bytes"""
+        with self.open() as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+
+class GCSBackend(StorageBackend):
+    """
+    Storage backend for a Google Cloud Storage bucket.
+
+    timeout and retry, when given, are passed to every request (uploads keep the
+    library's retry policy, which only retries writes with a generation precondition).
+    """
+
+    def __init__(self, bucket, timeout: Optional[float] = None, retry=None):
+        self.bucket = bucket
+        self.write_options = {"timeout": timeout} if timeout is not None else {}
+        self.read_options = dict(self.write_options, **({"retry": retry} if retry is not None else {}))
+
+    @staticmethod
+    def to_info(blob) -> ObjectInfo:
+        return ObjectInfo(
+            name=blob.name,
+            size=blob.size or 0,
+            generation=blob.generation,
+            metageneration=blob.metageneration,
+            etag=blob.etag,
+            content_type=blob.content_type,
+            updated=blob.updated,
+            content_encoding=blob.content_encoding,
+        )
+
+    def stat(self, name):
+        blob = self.bucket.get_blob(name, **self.read_options)
+        return self.to_info(blob) if blob is not None else None
+
+    def get(self, name):
+        try:
+            return self.bucket.blob(name).download_as_bytes(**self.read_options)
+        except NotFound:
+            raise ObjectNotFoundError(name)
+
+    def get_range(self, name, start, end, if_generation_match=None):
+        preconditions = {"if_generation_match": if_generation_match} if if_generation_match is not None else {}
+        try:
+            # raw_download keeps gzip objects compressed so offsets refer to the stored bytes
+            return self.bucket.blob(name).download_as_bytes(
+                start=start, end=end, raw_download=True, **preconditions, **self.read_options
+            )
+        except NotFound:
+            raise ObjectNotFoundError(name)
+        except PreconditionFailed:
+            raise PreconditionFailedError(name)
+
+    def put(self, name, data, content_type=None, if_generation_match=None, content_encoding=None):
+        blob = self.bucket.blob(name)
+        # gzip objects are served decompressed to clients that do not accept gzip (GCS transcoding)
+        blob.content_encoding = content_encoding
+        preconditions = {"if_generation_match": if_generation_match} if if_generation_match is not None else {}
+        try:
+            blob.upload_from_string(data, content_type=content_type, **preconditions, **self.write_options)
+        except PreconditionFailed:
+            raise PreconditionFailedError(name)
+        return self.to_info(blob)
+
+    def list(self, prefix=""):
+        return [self.to_info(blob) for blob in self.bucket.list_blobs(prefix=prefix, **self.read_options)]
+
+    def delete(self, name):
+        try:
+            self.bucket.blob(name).delete(**self.read_options)
+        except NotFound:
+            raise ObjectNotFoundError(name)
+
+    def open(self, name, if_generation_match=None):
+        preconditions = {"if_generation_match": if_generation_match} if if_generation_match is not None else {}
+        try:
+            # Seekable reader that fetches default_chunk_size ranges of the stored (raw) bytes
+            return self.bucket.blob(name).open(
+                "rb", chunk_size=default_chunk_size, raw_download=True, **preconditions, **self.read_options
+            )
+        except NotFound:
+            raise ObjectNotFoundError(name)
+        except PreconditionFailed:
+            raise PreconditionFailedError(name)
+
+    def stream(self, name, chunk_size=default_chunk_size):
+        try:
+            blob = self.bucket.blob(name)
+            with blob.open("rb", chunk_size=chunk_size, raw_download=True, **self.read_options) as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+        except NotFound:
+            raise ObjectNotFoundError(name)
+
+    def download_to_filename(self, name, filename):
+        try:
+            self.bucket.blob(name).download_to_filename(filename, **self.read_options)
+        except NotFound:
+            raise ObjectNotFoundError(name)
+
+
+class LocalBackend(StorageBackend):
+    """
+    Storage backend for a local directory (e.g. a fast local SSD).
+
+    Object names map to relative file paths. The file modification time in nanoseconds
+    is used as the object generation, and writes are atomic (write to temp file + rename).
+    Write preconditions are only enforced between threads of the same process.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        path = (self.root / name).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid object name: {name}")
+        return path
+
+    def to_info(self, name: str, st: os.stat_result) -> ObjectInfo:
+        return ObjectInfo(
+            name=name,
+            size=st.st_size,
+            generation=st.st_mtime_ns,
+            metageneration=1,
+            etag=f"{st.st_mtime_ns:x}-{st.st_size:x}",
+            content_type=mimetypes.guess_type(name)[0],
+            updated=datetime.fromtimestamp(st.st_mtime_ns / 1e9, tz=timezone.utc),
+        )
+
+    def stat(self, name):
+        path = self.path(name)
+        if not path.is_file():
+            return None
+        return self.to_info(name, path.stat())
+
+    def get(self, name):
+        try:
+            return self.path(name).read_bytes()
+        except FileNotFoundError:
+            raise ObjectNotFoundError(name)
+
+    def get_range(self, name, start, end, if_generation_match=None):
+        try:
+            with open(self.path(name), "rb") as f:
+                if if_generation_match is not None and os.fstat(f.fileno()).st_mtime_ns != if_generation_match:
+                    raise PreconditionFailedError(name)
+                f.seek(start)
+                return f.read(max(0, end - start + 1))
+        except FileNotFoundError:
+            raise ObjectNotFoundError(name)
+
+    def put(self, name, data, content_type=None, if_generation_match=None, content_encoding=None):
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            previous = path.stat().st_mtime_ns if path.exists() else None
+            if if_generation_match is not None and (previous or 0) != if_generation_match:
+                raise PreconditionFailedError(name)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            # Make sure every write produces a new generation, even within the clock resolution
+            st = path.stat()
+            if previous is not None and st.st_mtime_ns <= previous:
+                os.utime(path, ns=(st.st_atime_ns, previous + 1))
+                st = path.stat()
+        return self.to_info(name, st)
+
+    def list(self, prefix=""):
+        # Only walk the directory that can contain matching names
+        base = self.path(prefix.rsplit("/", 1)[0]) if "/" in prefix else self.root
+        if not base.is_dir():
+            return []
+        infos = []
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                if filename.startswith(".tmp-"):
+                    continue
+                path = Path(dirpath) / filename
+                name = path.relative_to(self.root).as_posix()
+                if name.startswith(prefix):
+                    infos.append(self.to_info(name, path.stat()))
+        return sorted(infos, key=lambda info: info.name)
+
+    def delete(self, name):
+        try:
+            self.path(name).unlink()
+        except FileNotFoundError:
+            raise ObjectNotFoundError(name)
+
+    def open(self, name, if_generation_match=None):
+        try:
+            f = open(self.path(name), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFoundError(name)
+        if if_generation_match is not None and os.fstat(f.fileno()).st_mtime_ns != if_generation_match:
+            f.close()
+            raise PreconditionFailedError(name)
+        return f
+
+    def stream(self, name, chunk_size=default_chunk_size):
+        try:
+            with open(self.path(name), "rb") as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+        except FileNotFoundError:
+            raise ObjectNotFoundError(name)
+
+    def download_to_filename(self, name, filename):
+        try:
+            shutil.copyfile(self.path(name), filename)
+        except FileNotFoundError:
+            raise ObjectNotFoundError(name)
+
+
+class MemoryBackend(StorageBackend):
+    """Storage backend that keeps all objects in process memory (for tests and benchmarks)"""
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.generations = itertools.count(1)
+
+    def stat(self, name):
+        entry = self.objects.get(name)
+        return entry[1] if entry is not None else None
+
+    def get(self, name):
+        entry = self.objects.get(name)
+        if entry is None:
+            raise ObjectNotFoundError(name)
+        return entry[0]
+
+    def get_entry(self, name, if_generation_match=None):
+        entry = self.objects.get(name)
+        if entry is None:
+            raise ObjectNotFoundError(name)
+        if if_generation_match is not None and entry[1].generation != if_generation_match:
+            raise PreconditionFailedError(name)
+        return entry
+
+    def get_range(self, name, start, end, if_generation_match=None):
+        return self.get_entry(name, if_generation_match)[0][start : end + 1]
+
+    def open(self, name, if_generation_match=None):
+        return io.BytesIO(self.get_entry(name, if_generation_match)[0])
+
+    def put(self, name, data, content_type=None, if_generation_match=None, content_encoding=None):
+        with self.lock:
+            if if_generation_match is not None:
+                entry = self.objects.get(name)
+                if (entry[1].generation if entry is not None else 0) != if_generation_match:
+                    raise PreconditionFailedError(name)
+            generation = next(self.generations)
+            info = ObjectInfo(
+                name=name,
+                size=len(data),
+                generation=generation,
+                metageneration=1,
+                etag=f"{generation:x}-{len(data):x}",
+                content_type=content_type or mimetypes.guess_type(name)[0],
+                updated=datetime.now(timezone.utc),
+                content_encoding=content_encoding,
+            )
+            self.objects[name] = (bytes(data), info)
+        return info
+
+    def list(self, prefix=""):
+        with self.lock:
+            infos = [info for name, (_, info) in self.objects.items() if name.startswith(prefix)]
+        return sorted(infos, key=lambda info: info.name)
+
+    def delete(self, name):
+        with self.lock:
+            if self.objects.pop(name, None) is None:
+                raise ObjectNotFoundError(name)
@@ -0,0 +1,250 @@
+"""
+Utility functions for per-user tables (meal history, health report) stored as Parquet or CSV
+
+Tables are addressed by their path without file extension. New writes use the format
+selected by the TABLE_FORMAT environment variable ("parquet" by default, or "csv").
+Readers prefer the Parquet object and fall back to CSV for tables not migrated yet.
+"""
+
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from api.utils.storage_utils import ObjectNotFoundError, PreconditionFailedError
+from api.utils.utils import get_blob, get_storage, csv_cache, read_csv_from_gcs, write_csv_to_gcs, retry_on_conflict
+
+
+# Define variables
+table_format = os.environ.get("TABLE_FORMAT", "parquet").lower()
+table_extensions = {"parquet": ".parquet", "csv": ".csv"}
+# Row groups are the unit iter_table reads Parquet tables in
+parquet_row_group_size = 10_000
+
+
+def get_table_path(path: str, fmt: str = None) -> str:
+    """Get object path of a table in the given format (defaults to TABLE_FORMAT)"""
+    return path + table_extensions[fmt or table_format]
+
+
+def find_table_blob(path: str):
+    """Get blob of a table stored as Parquet or CSV, or None if it does not exist"""
+    # Exact-path lookups: one metadata request for migrated tables, two for CSV ones
+    for fmt in ("parquet", "csv"):
+        try:
+            return get_blob(get_table_path(path, fmt))
+        except HTTPException:
+            pass
+    return None
+
+
+def get_table_blob(path: str):
+    """Get blob of a table stored as Parquet or CSV"""
+    blob = find_table_blob(path)
+    if blob is None:
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    return blob
+
+
+def read_table(blob, columns: list = None) -> pd.DataFrame:
+    """
+    Read table from storage, dispatching on the object format.
+
+    Args:
+        blob: Parquet or CSV blob
+        columns: Optional list of columns to read (Parquet only reads these columns)
+
+    Returns:
+        DataFrame with NaN/Inf values replaced by None
+    """
+    if not blob.name.endswith(".parquet"):
+        df = read_csv_from_gcs(blob)
+        return df[[c for c in columns if c in df.columns]] if columns else df
+
+    if blob.generation is None:
+        blob.reload()
+
+    key = f"{blob.name}#{','.join(columns)}" if columns else blob.name
+    df = csv_cache.get(key, blob.generation, blob.metageneration)
+    if df is not None:
+        return df
+
+    df = parse_parquet(blob.download_as_bytes(), columns)
+    csv_cache.put(key, blob.generation, blob.metageneration, df)
+    return df
+
+
+def iter_table(blob, chunk_rows: int):
+    """
+    Iterate over a table in DataFrames of at most chunk_rows rows, reading the object in chunks.
+
+    Unlike read_table, values are returned as parsed (NaN is not replaced by None) and the
+    CSV cache is bypassed, so memory use does not grow with the table size.
+    """
+    with blob.open("rb") as f:
+        if blob.name.endswith(".parquet"):
+            for batch in pq.ParquetFile(f).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+            return
+
+        try:
+            yield from pd.read_csv(io.TextIOWrapper(f, encoding="utf-8"), chunksize=chunk_rows)
+        except pd.errors.EmptyDataError:
+            return
+
+
+def parse_parquet(content: bytes, columns: list = None) -> pd.DataFrame:
+    """Parse Parquet bytes into a DataFrame with NaN/Inf values replaced by None"""
+    source = io.BytesIO(content)
+    if columns:
+        # Only decode the requested columns
+        names = pq.read_schema(source).names
+        columns = [c for c in columns if c in names]
+
+    df = pq.read_table(source, columns=columns).to_pandas()
+    df = df.replace([float("inf"), float("-inf")], None)
+    df = df.where(pd.notna(df), None)
+    return df
+
+
+def to_arrow_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Convert DataFrame to an Arrow table with a fixed schema (missing columns become null)"""
+    arrays = []
+    for field in schema:
+        values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), dtype=object)
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            values = pd.to_numeric(values, errors="coerce")
+        elif pa.types.is_boolean(field.type):
+            values = values.map(lambda v: None if pd.isna(v) else str(v).lower() in ("true", "1", "1.0"))
+        else:
+            values = values.map(lambda v: None if pd.isna(v) else str(v))
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet_to_gcs(blob, df: pd.DataFrame, schema: pa.Schema, if_generation_match: int = None):
+    """Write table to storage as Parquet (only if the object is at generation if_generation_match, when given)"""
+    buffer = io.BytesIO()
+    pq.write_table(to_arrow_table(df, schema), buffer, compression="zstd", row_group_size=parquet_row_group_size)
+    content = buffer.getvalue()
+    blob.upload_from_string(
+        content, content_type="application/vnd.apache.parquet", if_generation_match=if_generation_match
+    )
+
+    # Cache exactly what a reader would parse from the new object generation
+    csv_cache.put(blob.name, blob.generation, blob.metageneration, parse_parquet(content))
+
+
+def write_table(path: str, df: pd.DataFrame, schema: pa.Schema, previous_blob=None, create: bool = False):
+    """
+    Write table in the TABLE_FORMAT format.
+
+    If the table was previously stored in the other format, that object is deleted, so
+    tables migrate transparently the next time they are written.
+
+    Writes are conditional: with previous_blob, the write fails with
+    PreconditionFailedError if the table changed since previous_blob was read; with
+    create, it fails if the table already exists.
+
+    Args:
+        path: Table path without file extension
+        df: Table content
+        schema: Arrow schema of the table
+        previous_blob: Blob the table was read from, if known
+        create: Only create the table, never overwrite it
+
+    Returns:
+        Blob that was written
+    """
+    blob = get_storage().blob(get_table_path(path))
+    if previous_blob is not None:
+        # A table read in the other format must not have been migrated by someone else since
+        if_generation_match = previous_blob.generation if previous_blob.name == blob.name else 0
+    else:
+        if_generation_match = 0 if create else None
+
+    if table_format == "parquet":
+        write_parquet_to_gcs(blob, df, schema, if_generation_match=if_generation_match)
+    else:
+        write_csv_to_gcs(blob, df.reindex(columns=schema.names), if_generation_match=if_generation_match)
+
+    if previous_blob is not None and previous_blob.name != blob.name:
+        try:
+            previous_blob.delete()
+        except ObjectNotFoundError:
+            pass
+        csv_cache.invalidate(previous_blob.name)
+    return blob
+
+
+def update_table(path: str, schema: pa.Schema, update, read: bool = True, retries: int = None):
+    """
+    Update an existing table with optimistic concurrency.
+
+    The table is re-read and update is called again whenever a concurrent write gets in
+    first, so updates are merged instead of lost.
+
+    Args:
+        path: Table path without file extension
+        schema: Arrow schema of the table
+        update: Function taking the current table (None if read is False) and returning
+            the new table
+        read: Whether update needs the current table content
+        retries: Number of retries after a write conflict
+
+    Returns:
+        Blob that was written
+    """
+
+    def attempt():
+        blob = get_table_blob(path)
+        return write_table(path, update(read_table(blob) if read else None), schema, previous_blob=blob)
+
+    return retry_on_conflict(attempt, retries)
+
+
+def delete_table(path: str) -> bool:
+    """Delete a table in all formats, returning True if anything was deleted"""
+    deleted = False
+    for blob in list(get_storage().list_blobs(prefix=f"{path}.")):
+        if blob.name in (get_table_path(path, "parquet"), get_table_path(path, "csv")):
+            blob.delete()
+            csv_cache.invalidate(blob.name)
+            deleted = True
+    return deleted
+
+
+def migrate_table(path: str, schema: pa.Schema, keep_csv: bool = False) -> bool:
+    """
+    Convert a CSV table to Parquet.
+
+    The Parquet object is read back and its row count compared with the CSV before the
+    CSV is deleted, so a failed conversion never loses data.
+
+    Returns:
+        True if the table was converted, False if it was already Parquet or missing
+    """
+    blob = find_table_blob(path)
+    if blob is None or blob.name.endswith(".parquet"):
+        return False
+
+    df = read_csv_from_gcs(blob)
+    parquet_blob = get_storage().blob(get_table_path(path, "parquet"))
+    try:
+        write_parquet_to_gcs(parquet_blob, df, schema, if_generation_match=0)
+    except PreconditionFailedError:
+        # Converted concurrently (e.g. by a write through the API)
+        return False
+
+    converted = parse_parquet(parquet_blob.download_as_bytes())
+    if len(converted) != len(df):
+        parquet_blob.delete()
+        raise ValueError(f"Row count mismatch migrating {blob.name}: {len(df)} != {len(converted)}")
+
+    if not keep_csv:
+        blob.delete()
+        csv_cache.invalidate(blob.name)
+    return True
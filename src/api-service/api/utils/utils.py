@@ -4,14 +4,65 @@ Utility functions used by API service
 
 import io
 import os
+import random
 import re
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
-from google.cloud import storage
 from fastapi import HTTPException
 
+from api.utils.cache_utils import DataFrameCache
+from api.utils.gcs_client_utils import get_gcs_client, get_retry_policy, http_timeout, reset_gcs_client
+from api.utils import storage_utils
+from api.utils.storage_utils import GCSBackend, LocalBackend, MemoryBackend, PreconditionFailedError
+
 
 # Define variables
 _bucket = None
+_storage = None
+_name_index = OrderedDict()
+_name_index_lock = threading.Lock()
+name_index_ttl = float(os.environ.get("BLOB_NAME_INDEX_TTL", "30"))
+name_index_size = int(os.environ.get("BLOB_NAME_INDEX_SIZE", "1024"))
+regex_chars = set("^$*+?{}[]\\|()")
+csv_cache = DataFrameCache(max_bytes=int(os.environ.get("CSV_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+max_write_retries = int(os.environ.get("STORAGE_WRITE_RETRIES", "5"))
+write_retry_delay = 0.02
+write_conflicts = {"conflicts": 0, "retries_exhausted": 0}
+_write_conflicts_lock = threading.Lock()
+
+
+def parse_csv_compression(config: str) -> dict:
+    """
+    Parse the CSV_COMPRESSION setting into {object name prefix: content encoding}.
+
+    The setting is a comma-separated list of prefix=encoding pairs, e.g.
+    "data/meal_history/=zstd,data/health_report/=gzip"; a bare encoding applies to every
+    CSV object. zstd falls back to gzip when the zstandard package is not installed.
+    """
+    compression = {}
+    for entry in filter(None, (part.strip() for part in config.split(","))):
+        prefix, _, encoding = entry.rpartition("=")
+        encoding = encoding.strip().lower()
+        if encoding in ("", "none", "identity"):
+            encoding = None
+        elif encoding not in storage_utils.content_encodings:
+            raise ValueError(f"Unknown CSV compression: {encoding}")
+        elif encoding == "zstd" and storage_utils.zstandard is None:
+            print("⚠️  zstandard is not installed, compressing CSV objects with gzip instead")
+            encoding = "gzip"
+        compression[prefix.strip()] = encoding
+    return compression
+
+
+csv_compression = parse_csv_compression(os.environ.get("CSV_COMPRESSION", ""))
+
+
+def get_csv_encoding(name: str):
+    """Get the content encoding for a CSV object (longest matching prefix), or None"""
+    prefixes = [prefix for prefix in csv_compression if name.startswith(prefix)]
+    return csv_compression[max(prefixes, key=len)] if prefixes else None
 
 
 def get_gcs_bucket():
@@ -19,26 +70,127 @@ def get_gcs_bucket():
     global _bucket
     if _bucket is None:
         bucket_name = os.environ.get("GCS_BUCKET_NAME")
-        client = storage.Client()
-        _bucket = client.bucket(bucket_name)
+        _bucket = get_gcs_client().bucket(bucket_name)
     return _bucket
 
 
+def get_storage():
+    """
+    Get storage backend selected by the STORAGE_BACKEND environment variable:
+    "gcs" (default), "local" (directory given by STORAGE_LOCAL_ROOT) or "memory".
+    """
+    global _storage
+    if _storage is None:
+        backend = os.environ.get("STORAGE_BACKEND", "gcs").lower()
+        if backend == "gcs":
+            _storage = GCSBackend(get_gcs_bucket(), timeout=http_timeout, retry=get_retry_policy())
+        elif backend == "local":
+            _storage = LocalBackend(os.environ.get("STORAGE_LOCAL_ROOT", "/tmp/tummyai-storage"))
+        elif backend == "memory":
+            _storage = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown storage backend: {backend}")
+        print(f"🗄️  Using {backend} storage backend")
+    return _storage
+
+
+def reset_storage():
+    """Drop the storage backend and GCS client, e.g. in a worker forked from a preloading parent"""
+    global _bucket, _storage
+    _bucket = None
+    _storage = None
+    _name_index.clear()
+    reset_gcs_client()
+
+
 def get_blob(pattern):
-    """Get blob that matches pattern"""
-    try:
-        bucket = get_gcs_bucket()
-        blobs = list(bucket.list_blobs())
-        blob = [b for b in blobs if re.compile(pattern).search(b.name)][0]
-        return blob
-    except IndexError:
+    """
+    Get blob that matches pattern.
+
+    Plain object paths are resolved with a single metadata lookup. Regex patterns are
+    matched from the start of the object name, and only the objects under the literal
+    prefix of the pattern are listed (cached in a small name index for a few seconds).
+    """
+    bucket = get_storage()
+    if is_literal_pattern(pattern):
+        blob = bucket.get_blob(pattern)
+    else:
+        blob = match_blob(bucket, pattern)
+
+    if blob is None:
         raise HTTPException(status_code=404, detail=f"File not found: {pattern}")
+    return blob
+
+
+def is_literal_pattern(pattern):
+    """Check if pattern is a plain object path (dots are treated as literal characters)"""
+    return not any(c in regex_chars for c in pattern)
+
+
+def get_literal_prefix(pattern):
+    """Get the longest literal prefix of a regex pattern"""
+    prefix = []
+    for c in pattern:
+        if c in regex_chars or c == ".":
+            break
+        prefix.append(c)
+    return "".join(prefix)
+
+
+def list_blob_names(bucket, prefix, refresh=False):
+    """List object names under prefix, using the TTL name index when possible"""
+    now = time.monotonic()
+    with _name_index_lock:
+        entry = _name_index.get(prefix)
+        if entry is not None:
+            _name_index.move_to_end(prefix)
+    if entry is None or refresh or entry[0] <= now:
+        names = [b.name for b in bucket.list_blobs(prefix=prefix)]
+        entry = (now + name_index_ttl, names)
+        # Least recently used prefixes are evicted so the index stays bounded
+        with _name_index_lock:
+            _name_index[prefix] = entry
+            _name_index.move_to_end(prefix)
+            while len(_name_index) > name_index_size:
+                _name_index.popitem(last=False)
+    return entry[1]
+
+
+def match_blob(bucket, pattern):
+    """Get first blob under the pattern's literal prefix whose name matches the pattern"""
+    regex = re.compile(pattern)
+    prefix = get_literal_prefix(pattern)
+
+    # Retry with a fresh listing if the index is stale (object created or deleted since)
+    for refresh in (False, True):
+        name = next((n for n in list_blob_names(bucket, prefix, refresh) if regex.match(n)), None)
+        blob = bucket.get_blob(name) if name is not None else None
+        if blob is not None:
+            return blob
+    return None
 
 
 def read_csv_from_gcs(blob):
-    """Read CSV from GCS"""
-    content = blob.download_as_text()
+    """
+    Read CSV from GCS.
+
+    Parsed DataFrames are cached per object and validated against the object generation,
+    so repeated reads of an unchanged object only cost a metadata lookup.
+    """
+    if blob.generation is None:
+        blob.reload()
+
+    df = csv_cache.get(blob.name, blob.generation, blob.metageneration)
+    if df is not None:
+        return df
 
+    df = parse_csv(blob.download_as_text())
+    csv_cache.put(blob.name, blob.generation, blob.metageneration, df)
+    return df
+
+
+def parse_csv(content):
+    """Parse CSV text into a DataFrame with NaN/Inf values replaced by None"""
     # Handle empty files
     if not content.strip():
         return pd.DataFrame()
@@ -49,8 +201,73 @@ def read_csv_from_gcs(blob):
     return df
 
 
-def write_csv_to_gcs(blob, df):
-    """Write CSV to GCS"""
+def write_csv_to_gcs(blob, df, if_generation_match=None):
+    """
+    Write CSV to GCS (only if the object is at generation if_generation_match, when given).
+
+    Objects matching CSV_COMPRESSION are stored compressed; reads decompress them transparently.
+    """
     csv_buffer = io.StringIO()
     df.to_csv(csv_buffer, index=False)
-    blob.upload_from_string(csv_buffer.getvalue(), content_type="text/csv")
+    content = csv_buffer.getvalue()
+    options = {}
+    if if_generation_match is not None:
+        options["if_generation_match"] = if_generation_match
+    encoding = get_csv_encoding(blob.name)
+    if encoding:
+        options["content_encoding"] = encoding
+    blob.upload_from_string(content, content_type="text/csv", **options)
+
+    # Cache exactly what a reader would parse from the new object generation
+    csv_cache.put(blob.name, blob.generation, blob.metageneration, parse_csv(content))
+
+
+def retry_on_conflict(attempt, retries: int = None):
+    """
+    Run a read-modify-write function until it completes without a write conflict.
+
+    attempt() must re-read the object(s) it modifies on every call and write them with a
+    generation precondition, so a concurrent update makes it fail with
+    PreconditionFailedError instead of being silently overwritten. Conflicting attempts
+    are retried with jittered exponential backoff; once retries are exhausted the caller
+    gets a 409 error.
+    """
+    retries = max_write_retries if retries is None else retries
+    for i in range(retries + 1):
+        try:
+            return attempt()
+        except PreconditionFailedError as e:
+            with _write_conflicts_lock:
+                write_conflicts["conflicts"] += 1
+                if i == retries:
+                    write_conflicts["retries_exhausted"] += 1
+            if i == retries:
+                raise HTTPException(status_code=409, detail=f"Concurrent update conflict: {e}, please retry")
+            time.sleep(random.uniform(0, write_retry_delay * 2**i))
+
+
+def update_blob(blob, update, content_type: str = "text/plain", retries: int = None):
+    """
+    Update a text object with optimistic concurrency.
+
+    Args:
+        blob: Blob to update
+        update: Function taking the current text and returning (new text, result);
+            if the new text is None nothing is written
+        content_type: Content type of the written object
+        retries: Number of retries after a write conflict
+
+    Returns:
+        Result of the last call to update
+    """
+
+    def attempt():
+        blob.reload()
+        generation = blob.generation
+        content, result = update(blob.download_as_text())
+        if content is not None:
+            # Fails if the object was overwritten since it was read
+            blob.upload_from_string(content, content_type=content_type, if_generation_match=generation)
+        return result
+
+    return retry_on_conflict(attempt, retries)
@@ -0,0 +1,126 @@
+"""
+Benchmark stored bytes and GET latency of compressed CSV meal histories
+
+Writes realistic meal histories as CSV with each content encoding (none, gzip, and zstd
+when the zstandard package is installed) to an in-memory backend that simulates GCS
+request latency and network bandwidth, then reads them back cold (cache cleared) the way
+the meal history endpoint does. Parquet is shown for reference; it is already compressed
+internally.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_csv_compression
+"""
+
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+import pandas as pd  # noqa: E402
+
+from api.utils import storage_utils, utils  # noqa: E402
+from api.utils.meal_history_utils import meal_history_columns, meal_history_schema  # noqa: E402
+from api.utils.storage_utils import MemoryBackend  # noqa: E402
+from api.utils.table_utils import get_table_blob, read_table, write_table  # noqa: E402
+
+
+# Define variables
+request_latency = 0.02
+bandwidth = 10 * 1024 * 1024
+repeats = 5
+dishes = ["pad thai", "caesar salad", "chicken curry", "margherita pizza", "ramen", "burrito", "pho", "falafel"]
+ingredients = ["garlic", "onion", "wheat", "rice", "chicken", "tomato", "milk", "egg", "beans", "apple"]
+symptoms = ["bloating", "gas", "cramps", "nausea", "diarrhea"]
+
+
+class NetworkMemoryBackend(MemoryBackend):
+    """In-memory backend that charges request latency plus transfer time on every read"""
+
+    def stat(self, name):
+        time.sleep(request_latency)
+        return super().stat(name)
+
+    def get(self, name):
+        data = super().get(name)
+        time.sleep(request_latency + len(data) / bandwidth)
+        self.bytes_transferred += len(data)
+        return data
+
+
+def make_history(meals: int) -> pd.DataFrame:
+    """Generate a meal history with the value distribution of real logs"""
+    rng = random.Random(meals)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(meals):
+        picked = rng.sample(ingredients, rng.randint(2, 6))
+        rows.append(
+            {
+                "date_time": (start + timedelta(hours=6 * i)).isoformat(),
+                "dish": rng.choice(dishes),
+                "dish_confidence": round(rng.uniform(0.3, 1.0), 4),
+                "dish_fodmap": rng.choice(["high", "low", "none"]),
+                "ingredients": ", ".join(picked),
+                "ingredients_fodmap_high": ", ".join(picked[:1]),
+                "ingredients_fodmap_low": ", ".join(picked[1:2]),
+                "ingredients_fodmap_none": ", ".join(picked[2:]),
+                "symptoms": ", ".join(rng.sample(symptoms, rng.randint(0, 2))),
+            }
+        )
+    return pd.DataFrame(rows, columns=meal_history_columns)
+
+
+def measure(backend, path: str, df: pd.DataFrame, table_format: str, encoding):
+    """Return (stored bytes, bytes transferred per GET, median GET latency in ms)"""
+    with (
+        patch("api.utils.table_utils.table_format", table_format),
+        patch("api.utils.utils.csv_compression", {"": encoding}),
+    ):
+        stored = write_table(path, df, meal_history_schema).size
+
+    latencies = []
+    backend.bytes_transferred = 0
+    for _ in range(repeats):
+        utils.csv_cache.clear()
+        start = time.perf_counter()
+        result = read_table(get_table_blob(path))
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert len(result) == len(df)
+
+    return stored, backend.bytes_transferred // repeats, statistics.median(latencies)
+
+
+def main():
+    backend = NetworkMemoryBackend()
+    utils._storage = backend
+
+    variants = [("csv", None), ("csv", "gzip")]
+    if storage_utils.zstandard is not None:
+        variants.append(("csv", "zstd"))
+    else:
+        print("zstandard is not installed, skipping zstd")
+    variants.append(("parquet", None))
+
+    print(f"Simulated storage: {request_latency * 1000:.0f} ms per request, {bandwidth / 1024 / 1024:.0f} MB/s")
+    print(f"{'meals':>6} {'format':>12} {'stored (KB)':>12} {'GET (KB)':>10} {'ratio':>6} {'GET (ms)':>9}")
+    for meals in (100, 1_000, 10_000, 50_000):
+        df = make_history(meals)
+        baseline = None
+        for table_format, encoding in variants:
+            path = f"data/meal_history/meal_history_bench_{meals}_{table_format}_{encoding}"
+            stored, transferred, latency = measure(backend, path, df, table_format, encoding)
+            baseline = baseline or stored
+            label = f"{table_format}+{encoding}" if encoding else table_format
+            print(
+                f"{meals:>6} {label:>12} {stored / 1024:>12.1f} {transferred / 1024:>10.1f} "
+                f"{baseline / stored:>6.1f} {latency:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark get_blob lookup latency against bucket size
+
+Compares the previous whole-bucket listing + regex scan with the exact-path resolver,
+using a local fake bucket that holds 1k to 1M objects.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_get_blob
+"""
+
+import bisect
+import re
+import statistics
+import time
+from unittest.mock import patch
+
+from api.utils import utils
+
+
+class FakeBlob:
+    """Minimal stand-in for google.cloud.storage.Blob"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeBucket:
+    """In-memory bucket with GCS-like get_blob and prefix listing"""
+
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.name_set = set(self.names)
+        self.list_calls = 0
+
+    def get_blob(self, name):
+        return FakeBlob(name) if name in self.name_set else None
+
+    def list_blobs(self, prefix=""):
+        self.list_calls += 1
+        start = bisect.bisect_left(self.names, prefix)
+        for name in self.names[start:]:
+            if not name.startswith(prefix):
+                break
+            yield FakeBlob(name)
+
+
+def make_names(total):
+    """Build a realistic object layout: models, reference data, per-user CSVs and photos"""
+    names = ["models/v2/config.json", "models/v2/model.safetensors", "data/reference/user_list.txt"]
+    users = max(1, total // 20)
+    for i in range(users):
+        names.append(f"data/meal_history/meal_history_user{i}.csv")
+        names.append(f"data/health_report/health_report_user{i}.csv")
+    i = 0
+    while len(names) < total:
+        names.append(f"data/user_photo/user_photo_user{i % users}_{i:08d}.jpg")
+        i += 1
+    return names, users
+
+
+def legacy_get_blob(bucket, pattern):
+    """Previous implementation: list the entire bucket and regex-search every name"""
+    blobs = list(bucket.list_blobs())
+    return [b for b in blobs if re.compile(pattern).search(b.name)][0]
+
+
+def time_lookups(lookup, paths, repeat):
+    """Return median lookup latency in microseconds"""
+    samples = []
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            lookup(path)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    print(f"{'objects':>10} {'exact (us)':>12} {'pattern (us)':>13} {'legacy (us)':>13}")
+    for total in (1_000, 10_000, 100_000, 1_000_000):
+        names, users = make_names(total)
+        bucket = FakeBucket(names)
+        paths = [f"data/meal_history/meal_history_user{i}.csv" for i in range(0, users, max(1, users // 50))]
+        patterns = [rf"data/health_report/health_report_user{i}\.csv" for i in range(0, users, max(1, users // 50))]
+
+        with patch("api.utils.utils.get_storage", return_value=bucket):
+            utils._name_index.clear()
+            exact = time_lookups(utils.get_blob, paths, repeat=20)
+            pattern = time_lookups(utils.get_blob, patterns, repeat=20)
+
+        # The legacy scan is O(objects) per lookup, so sample it sparingly
+        legacy = time_lookups(lambda p: legacy_get_blob(bucket, p), paths[:3], repeat=1)
+
+        print(f"{total:>10,} {exact:>12.1f} {pattern:>13.1f} {legacy:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
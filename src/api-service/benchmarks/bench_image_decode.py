@@ -0,0 +1,147 @@
+"""
+Benchmark reduced-resolution decoding of large phone photos
+
+Times safe_load_image on large JPEG and HEIC uploads, and measures the peak memory of one
+decode, in three modes:
+- full: decoded at native resolution, then shrunk to 512px (no decoder downscaling)
+- draft: JPEG DCT scaling / HEIF embedded thumbnail down to the 512px box, then shrunk
+- draft-fused: decoded just above the 224x224 model input for the fused preprocessing
+
+Each sample and mode runs in a fresh process. Peak memory is the growth of the peak RSS
+(VmHWM, reset through /proc/self/clear_refs, so Linux only) during one decode. The
+"diff" column is the mean absolute pixel difference of the draft output to the full
+decode (0-255).
+
+By default the corpus is generated from validate_model/test_images, upscaled to 12 MP and
+48 MP phone-size JPEGs and a 12 MP HEIC with an iPhone-like 320px thumbnail. Pass a
+directory of real .jpg/.jpeg/.heic photos to use them instead.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_image_decode [corpus dir]
+"""
+
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+
+# Define variables
+repeats = 5
+modes = ("full", "draft", "draft-fused")
+test_images_path = Path(__file__).parents[2] / "validate_model" / "test_images"
+corpus_extensions = (".jpg", ".jpeg", ".heic", ".heif")
+
+
+def make_corpus(corpus_path: Path):
+    """Write phone-size JPEG and HEIC samples upscaled from a validation image"""
+    source = Image.open(sorted(test_images_path.glob("*.jpg"))[0]).convert("RGB")
+    for width, height in [(4032, 3024), (8000, 6000)]:
+        image = source.resize((width, height), Image.Resampling.BICUBIC)
+        image.save(corpus_path / f"photo_{width * height // 1_000_000}mp.jpg", format="JPEG", quality=90)
+
+    import pillow_heif
+
+    pillow_heif.register_heif_opener()
+    image = source.resize((4032, 3024), Image.Resampling.BICUBIC)
+    image.save(corpus_path / "photo_12mp.heic", format="HEIF", quality=80, thumbnails=[320])
+
+
+def peak_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM"))
+
+
+def reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def run(mode: str, sample: str):
+    """Decode one sample in this process and print its median time, peak memory growth and size"""
+    from api.routers import food_model
+
+    if mode == "full":
+        # Without a draft size, safe_load_image decodes at native resolution as before
+        food_model.draft_size = lambda size, max_size: None
+
+    def decode():
+        if mode == "draft-fused":
+            return food_model.safe_load_image(data, sample, resize=False, min_size=(224, 224))
+        return food_model.safe_load_image(data, sample)
+
+    data = Path(sample).read_bytes()
+    with contextlib.redirect_stdout(io.StringIO()):
+        reset_peak_rss()
+        before = peak_rss_kb()
+        image = decode()
+        peak_mb = (peak_rss_kb() - before) / 1024
+
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            decode()
+            times.append((time.perf_counter() - start) * 1000)
+
+    print(f"{statistics.median(times):.1f} {peak_mb:.1f} {image.size[0]}x{image.size[1]}")
+
+
+def pixel_difference(sample: Path) -> float:
+    """Mean absolute difference between the 512px images decoded with and without draft"""
+    from api.routers import food_model
+
+    data = sample.read_bytes()
+    with contextlib.redirect_stdout(io.StringIO()):
+        draft = food_model.safe_load_image(data, sample.name)
+        draft_size = food_model.draft_size
+        food_model.draft_size = lambda size, max_size: None
+        try:
+            full = food_model.safe_load_image(data, sample.name)
+        finally:
+            food_model.draft_size = draft_size
+    if draft.size != full.size:
+        draft = draft.resize(full.size, Image.Resampling.LANCZOS)
+    return float(np.abs(np.asarray(draft, dtype=np.int16) - np.asarray(full, dtype=np.int16)).mean())
+
+
+def main(corpus: str = None):
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = Path(corpus) if corpus else Path(tmp)
+        if not corpus:
+            print("Generating the sample corpus (HEIC encoding takes a while)...")
+            make_corpus(corpus_path)
+        samples = sorted(path for path in corpus_path.iterdir() if path.suffix.lower() in corpus_extensions)
+
+        print(f"safe_load_image, median of {repeats} runs, {os.cpu_count()} CPU(s)")
+        header = "".join(f"{f'{mode} ms':>16}{f'{mode} MB':>16}" for mode in modes)
+        print(f"{'sample':>20}{'MB':>6}{header}{'diff':>7}")
+        for sample in samples:
+            row = f"{sample.name:>20}{sample.stat().st_size / 1e6:>6.1f}"
+            for mode in modes:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_image_decode", "run", mode, str(sample)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                decode_ms, peak_mb, _ = output.strip().splitlines()[-1].split()
+                row += f"{float(decode_ms):>16.1f}{float(peak_mb):>16.1f}"
+            print(f"{row}{pixel_difference(sample):>7.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "run":
+        run(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,100 @@
+"""
+Benchmark dynamic micro-batching of food model inference
+
+Drives the BatchingScheduler behind POST /food-model/predict with closed-loop clients
+(each sends its next image as soon as the previous one is answered) and compares
+batch size 1 (one forward pass per request, as before) with micro-batches, reporting
+throughput and p50/p99 latency per concurrency level. The classifier is the real
+transformers image-classification pipeline around a small randomly initialized ViT, so
+the numbers reflect preprocessing plus forward-pass cost without downloading the model.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_inference_batching
+"""
+
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from api.utils.inference_utils import BatchingScheduler  # noqa: E402
+
+
+# Define variables
+duration = 5.0
+concurrency_levels = (1, 4, 16, 32)
+configs = (("no batching", 1, 0.0), ("batch 8 / 5 ms", 8, 0.005), ("batch 16 / 10 ms", 16, 0.010))
+
+
+def make_classifier():
+    """Build an image-classification pipeline around a small random ViT"""
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor, pipeline
+
+    torch.manual_seed(0)
+    config = ViTConfig(
+        image_size=224,
+        patch_size=16,
+        hidden_size=192,
+        num_hidden_layers=6,
+        num_attention_heads=3,
+        intermediate_size=768,
+        num_labels=101,
+    )
+    model = ViTForImageClassification(config).eval()
+    return pipeline("image-classification", model=model, image_processor=ViTImageProcessor())
+
+
+def make_images(n: int) -> list:
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 255, (384, 512, 3), dtype=np.uint8)) for _ in range(n)]
+
+
+async def client(scheduler: BatchingScheduler, image, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await scheduler.submit(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_load(scheduler: BatchingScheduler, images: list, concurrency: int) -> tuple:
+    """Run closed-loop clients for the benchmark duration, returning (requests/s, p50 ms, p99 ms)"""
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(scheduler, images[i % len(images)], deadline, latencies) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100)
+    return len(latencies) / elapsed, statistics.median(latencies), quantiles[98]
+
+
+def main():
+    classifier = make_classifier()
+    images = make_images(8)
+
+    def run_batch(batch: list) -> list:
+        results = classifier(batch, batch_size=len(batch))
+        return [results] if len(batch) == 1 and isinstance(results[0], dict) else results
+
+    # Warm up the model and the allocator
+    run_batch(images)
+
+    print(f"small random ViT (224px, 6 layers), closed-loop clients, {duration:.0f}s per run")
+    print(f"{'config':>18} {'clients':>8} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'avg batch':>10}")
+    for label, max_batch_size, max_wait in configs:
+        for concurrency in concurrency_levels:
+            scheduler = BatchingScheduler(run_batch, max_batch_size, max_wait)
+            throughput, p50, p99 = asyncio.run(run_load(scheduler, images, concurrency))
+            avg_batch = scheduler.stats()["avg_batch_size"]
+            scheduler.shutdown()
+            print(f"{label:>18} {concurrency:>8} {throughput:>8.1f} {p50:>9.1f} {p99:>9.1f} {avg_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
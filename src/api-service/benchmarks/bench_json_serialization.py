@@ -0,0 +1,92 @@
+"""
+Benchmark JSON serialization of tabular responses
+
+Compares the previous path of the meal history and health report endpoints
+(df.to_dict + per-cell NaN/Inf scrub + FastAPI's jsonable_encoder + JSONResponse) with
+the column-wise NumPy scrub + orjson path of DataFrameJSONResponse, on 10k-row frames
+parsed the way the storage layer parses them.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_json_serialization
+"""
+
+import json
+import math
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.utils.json_utils import DataFrameJSONResponse
+from api.utils.utils import parse_csv
+from benchmarks.bench_csv_compression import make_history
+
+
+# Define variables
+rows = 10_000
+repeats = 20
+
+
+def make_report(n: int) -> pd.DataFrame:
+    """Generate a health report with infinite odds ratios and missing p-values"""
+    rng = np.random.default_rng(0)
+    odds_ratio = rng.lognormal(size=n)
+    odds_ratio[rng.random(n) < 0.1] = np.inf
+    p_value = rng.random(n)
+    p_value[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame(
+        {
+            "symptom": rng.choice(["bloating", "gas", "cramps", "nausea"], n),
+            "ingredient": [f"ingredient{i}" for i in range(n)],
+            "odds_ratio": odds_ratio,
+            "p_value": p_value,
+            "p_value_adj": np.minimum(p_value * 3, 1),
+            "significant": p_value < 0.05,
+        }
+    )
+
+
+def previous_response(df: pd.DataFrame) -> bytes:
+    records = df.to_dict(orient="records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+                record[key] = None
+    return JSONResponse(jsonable_encoder(records)).body
+
+
+def orjson_response(df: pd.DataFrame) -> bytes:
+    return DataFrameJSONResponse(df).body
+
+
+def measure(func, df) -> float:
+    """Return the median time of func(df) in ms"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(df)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    frames = {
+        "meal history": parse_csv(make_history(rows).to_csv(index=False)),
+        "health report": parse_csv(make_report(rows).to_csv(index=False)),
+        "health report (float64)": make_report(rows),
+    }
+
+    print(f"{rows} rows, median of {repeats} runs")
+    print(f"{'frame':>24} {'previous (ms)':>14} {'orjson (ms)':>12} {'speedup':>8}")
+    for name, df in frames.items():
+        assert json.loads(previous_response(df)) == json.loads(orjson_response(df))
+        previous = measure(previous_response, df)
+        fast = measure(orjson_response, df)
+        print(f"{name:>24} {previous:>14.1f} {fast:>12.1f} {previous / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
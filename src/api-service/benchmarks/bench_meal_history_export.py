@@ -0,0 +1,88 @@
+"""
+Benchmark worker memory of exporting a long meal history
+
+Writes a 100k-meal history to a local storage directory, then, in a fresh process per
+mode, either builds the full GET /meal-history response in memory or consumes the
+streaming NDJSON/CSV export, and reports how much the peak RSS of the process grew.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_meal_history_export
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+
+# Define variables
+meals = 100_000
+user_id = "export_bench"
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def setup():
+    """Write the meal history to the local storage directory"""
+    from api.utils.meal_history_utils import meal_history_schema, get_meal_history_path
+    from api.utils.table_utils import write_table
+    from benchmarks.bench_csv_compression import make_history
+
+    write_table(get_meal_history_path(user_id), make_history(meals), meal_history_schema)
+
+
+def run(mode: str):
+    """Run one mode in this process and print '<peak RSS growth MB> <bytes> <seconds>'"""
+    from api.utils.json_utils import DataFrameJSONResponse
+    from api.utils.meal_history_utils import iter_meal_history_export, read_meal_history
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "get":
+        size = len(DataFrameJSONResponse(read_meal_history(user_id)).body)
+    else:
+        size = sum(len(chunk) for chunk in iter_meal_history_export(user_id, mode))
+    elapsed = time.perf_counter() - start
+    print(f"{peak_rss_mb() - baseline:.1f} {size} {elapsed:.2f}")
+
+
+def run_subprocess(mode: str, env: dict) -> str:
+    # Every mode runs in a fresh process: the peak RSS is kept across fork/exec, so this
+    # process must stay small too
+    return subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_meal_history_export", mode],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        env = dict(os.environ, STORAGE_BACKEND="local", STORAGE_LOCAL_ROOT=root)
+        run_subprocess("setup", env)
+
+        print(f"{meals} meals (Parquet base file), peak RSS growth per request")
+        print(f"{'mode':>16} {'RSS growth (MB)':>16} {'response (MB)':>14} {'time (s)':>9}")
+        for mode, label in (("get", "GET (full JSON)"), ("ndjson", "export ndjson"), ("csv", "export csv")):
+            output = run_subprocess(mode, env)
+            growth, size, elapsed = output.strip().splitlines()[-1].split()
+            print(f"{label:>16} {float(growth):>16.1f} {int(size) / 1024 / 1024:>14.1f} {float(elapsed):>9.2f}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["setup"]:
+        setup()
+    elif len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        main()
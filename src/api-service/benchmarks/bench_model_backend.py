@@ -0,0 +1,108 @@
+"""
+Benchmark the PyTorch, INT8 quantized and ONNX Runtime classifier backends
+
+Saves a randomly initialized ViT-Base image classifier (the architecture of the
+fine-tuned food model, 101 labels) in the layout of the models/v2 folder, exports it to
+ONNX and INT8, and times each backend on the same images at batch sizes 1 and 8, including
+preprocessing. Each backend is measured in a fresh process that also reports its peak RSS.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_model_backend
+"""
+
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+
+# Define variables
+repeats = 10
+backends = ("pytorch", "int8", "onnx")
+batch_sizes = (1, 8)
+
+
+def setup(model_path: str):
+    """Save a random ViT-Base checkpoint and export it to ONNX and INT8"""
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    from api.utils.onnx_utils import export_onnx
+    from api.utils.quantization_utils import build_quantized_model
+
+    torch.manual_seed(0)
+    config = ViTConfig(id2label={i: f"dish_{i}" for i in range(101)})
+    ViTForImageClassification(config).save_pretrained(model_path)
+    ViTImageProcessor().save_pretrained(model_path)
+    export_onnx(model_path)
+    build_quantized_model(model_path)
+
+
+def run(backend: str, model_path: str):
+    """Time one backend in this process and print '<batch size> <ms per image>' lines and the peak RSS"""
+    if backend == "onnx":
+        from api.utils.onnx_utils import OnnxImageClassifier
+
+        classifier = OnnxImageClassifier(model_path)
+    elif backend == "int8":
+        from api.utils.quantization_utils import load_quantized_classifier
+
+        classifier = load_quantized_classifier(model_path)
+    else:
+        from transformers import pipeline
+
+        classifier = pipeline("image-classification", model=model_path)
+
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 255, (384, 512, 3), dtype=np.uint8)) for _ in range(max(batch_sizes))]
+    for batch_size in batch_sizes:
+        batch = images[:batch_size]
+        classifier(batch, batch_size=batch_size)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            classifier(batch, batch_size=batch_size)
+            times.append((time.perf_counter() - start) * 1000 / batch_size)
+        print(f"{batch_size} {statistics.median(times):.1f}")
+    # ru_maxrss is in KB on Linux
+    print(f"rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}")
+
+
+def run_subprocess(*args) -> str:
+    return subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_model_backend", *args], check=True, capture_output=True, text=True
+    ).stdout
+
+
+def main():
+    with tempfile.TemporaryDirectory() as model_path:
+        run_subprocess("setup", model_path)
+
+        results = {}
+        for backend in backends:
+            lines = [line.split() for line in run_subprocess(backend, model_path).strip().splitlines()]
+            results[backend] = {key: float(value) for key, value in lines[-len(batch_sizes) - 1 :]}
+
+        print(f"ViT-Base (101 labels), median of {repeats} runs, {os.cpu_count()} CPU(s), ms per image")
+        print(f"{'batch':>14}" + "".join(f"{backend:>10}" for backend in backends))
+        for batch_size in batch_sizes:
+            print(f"{batch_size:>14}" + "".join(f"{results[backend][str(batch_size)]:>10.1f}" for backend in backends))
+        print(f"{'peak RSS (MB)':>14}" + "".join(f"{results[backend]['rss']:>10.0f}" for backend in backends))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "setup":
+        setup(sys.argv[2])
+    elif len(sys.argv) == 3:
+        run(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,180 @@
+"""
+Benchmark per-worker memory of the food model across uvicorn-style workers
+
+Saves a randomly initialized ViT-Base image classifier (the architecture of the
+fine-tuned food model) in the layout of the models/v2 folder, then starts 4 worker
+processes per mode, like `uvicorn --workers 4`, which each run one prediction and wait:
+
+- runtime only: torch and transformers imported, no model (the floor of every worker)
+- from_pretrained: the default loader
+- MODEL_MMAP=1: weights used in place from a read-only mapping of model.safetensors
+- preload + fork: one parent loads the model and forks the workers (copy-on-write)
+
+Their memory is read from /proc/<pid>/smaps_rollup:
+
+- RSS counts every resident page, including pages shared with other processes
+- PSS splits each shared page between the processes that map it (sums to the real total)
+- USS counts pages private to the process (freed if that worker exits)
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_model_memory
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+
+# Define variables
+workers = 4
+modes = (
+    ("runtime", "runtime only"),
+    ("copy", "from_pretrained (default)"),
+    ("mmap", "MODEL_MMAP=1"),
+    ("fork", "preload + fork"),
+)
+
+
+def setup(model_path: str):
+    """Save a random ViT-Base checkpoint"""
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    torch.manual_seed(0)
+    ViTForImageClassification(ViTConfig(id2label={i: f"dish_{i}" for i in range(101)})).save_pretrained(model_path)
+    ViTImageProcessor().save_pretrained(model_path)
+
+
+def load_classifier(mode: str, model_path: str):
+    if mode == "runtime":
+        import torch
+        import transformers  # noqa: F401
+
+        return lambda image: torch.zeros(1)
+    if mode == "mmap":
+        from api.utils.safetensors_utils import load_mmap_classifier
+
+        return load_mmap_classifier(model_path)
+
+    from transformers import pipeline
+
+    return pipeline("image-classification", model=model_path)
+
+
+def worker(mode: str, model_path: str):
+    """Load the classifier, run one prediction, then wait until stdin is closed"""
+    from PIL import Image
+
+    classifier = load_classifier(mode, model_path)
+    classifier(Image.new("RGB", (512, 384), (200, 120, 40)))
+    print("ready", flush=True)
+    sys.stdin.read()
+
+
+def fork_parent(model_path: str):
+    """Load the classifier once, fork the workers, print their pids and wait until stdin is closed"""
+    from PIL import Image
+
+    classifier = load_classifier("copy", model_path)
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            classifier(Image.new("RGB", (512, 384), (200, 120, 40)))
+            os.write(write_fd, b"r")
+            signal.pause()
+        pids.append(pid)
+    for _ in range(workers):
+        os.read(read_fd, 1)
+    print("ready " + " ".join(map(str, pids)), flush=True)
+    sys.stdin.read()
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def read_memory(pid: int) -> dict:
+    """Read RSS, PSS and USS of a process in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def start(*args) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_model_memory", *args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+
+
+def wait_ready(process: subprocess.Popen) -> list:
+    # Return the words after "ready" on the line the process prints once loaded
+    while True:
+        line = process.stdout.readline()
+        if line.startswith("ready"):
+            return line.split()[1:]
+        if not line and process.poll() is not None:
+            raise RuntimeError(f"Worker exited with status {process.returncode}")
+
+
+def measure(mode: str, model_path: str) -> tuple:
+    """Start the workers of one mode and return the memory of each, and the PSS of the preloading parent"""
+    if mode == "fork":
+        processes = [start("fork", model_path)]
+    else:
+        processes = [start("worker", mode, model_path) for _ in range(workers)]
+    try:
+        if mode == "fork":
+            pids = [int(pid) for pid in wait_ready(processes[0])]
+            return [read_memory(pid) for pid in pids], read_memory(processes[0].pid)["pss"]
+        pids = [process.pid for process in processes if wait_ready(process) is not None]
+        return [read_memory(pid) for pid in pids], 0.0
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as model_path:
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_model_memory", "setup", model_path], check=True)
+        weights_mb = os.path.getsize(os.path.join(model_path, "model.safetensors")) / 1024 / 1024
+
+        print(f"ViT-Base ({weights_mb:.0f} MB of weights), {workers} workers, memory in MB")
+        print(f"{'mode':>26} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11} {'PSS total*':>10}")
+        for mode, label in modes:
+            memory, parent_pss = measure(mode, model_path)
+            average = {key: sum(m[key] for m in memory) / workers for key in ("rss", "pss", "uss")}
+            # The preloading parent stays alive, so its share of the pages counts too
+            total_pss = sum(m["pss"] for m in memory) + parent_pss
+            row = f"{label:>26} {average['rss']:>11.0f} {average['pss']:>11.0f} {average['uss']:>11.0f}"
+            print(f"{row} {total_pss:>10.0f}")
+        print("* all workers, plus the parent for preload + fork")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "setup":
+        setup(sys.argv[2])
+    elif len(sys.argv) == 4 and sys.argv[1] == "worker":
+        worker(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == "fork":
+        fork_parent(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the pipeline and fused image preprocessing paths
+
+For JPEG uploads of several sizes, times the path from upload bytes to model input:
+- pipeline: safe_load_image (LANCZOS shrink to 512px) then the transformers image processor
+- fused: safe_load_image(resize=False) then ImagePreprocessor (one resize, fused normalize)
+
+Then times the classification of one decoded upload (preprocessing included) with a random
+ViT-Base (the architecture of the fine-tuned food model), through the transformers
+pipeline and through TorchImageClassifier.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_preprocessing
+"""
+
+import io
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from api.routers.food_model import safe_load_image  # noqa: E402
+from api.utils.preprocessing_utils import ImagePreprocessor, TorchImageClassifier  # noqa: E402
+
+
+# Define variables
+repeats = 10
+upload_sizes = [(640, 480), (1600, 1200), (4032, 3024)]
+
+
+def make_upload(size: tuple) -> bytes:
+    """Encode a smooth synthetic photo as a JPEG upload"""
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)), (x + y) / 2], axis=2)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def median_ms(function, *args) -> float:
+    function(*args)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    import contextlib
+
+    import torch
+    from transformers import AutoImageProcessor, ViTConfig, ViTForImageClassification, ViTImageProcessor, pipeline
+
+    with tempfile.TemporaryDirectory() as model_path:
+        torch.manual_seed(0)
+        ViTForImageClassification(ViTConfig(id2label={i: f"dish_{i}" for i in range(101)})).save_pretrained(model_path)
+        ViTImageProcessor().save_pretrained(model_path)
+
+        image_processor = AutoImageProcessor.from_pretrained(model_path)
+        preprocessor = ImagePreprocessor(model_path)
+
+        def pipeline_path(data: bytes):
+            return image_processor(images=safe_load_image(data), return_tensors="np")["pixel_values"]
+
+        def fused_path(data: bytes):
+            return preprocessor(safe_load_image(data, resize=False))
+
+        # safe_load_image logs every step; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = []
+            for size in upload_sizes:
+                data = make_upload(size)
+                rows.append((size, median_ms(pipeline_path, data), median_ms(fused_path, data)))
+
+            classifier = pipeline("image-classification", model=model_path)
+            fused_classifier = TorchImageClassifier(model_path, classifier.model)
+            data = make_upload(upload_sizes[1])
+            pipeline_ms = median_ms(classifier, safe_load_image(data))
+            fused_ms = median_ms(fused_classifier, safe_load_image(data, resize=False))
+
+    print(f"Upload bytes to model input, median of {repeats} runs, ms per image")
+    print(f"{'upload':>12}{'pipeline':>10}{'fused':>10}{'speedup':>10}")
+    for (width, height), pipeline_time, fused_time in rows:
+        print(f"{f'{width}x{height}':>12}{pipeline_time:>10.1f}{fused_time:>10.1f}{pipeline_time / fused_time:>9.1f}x")
+    print(f"Classification of one {upload_sizes[1][0]}x{upload_sizes[1][1]} upload with ViT-Base, ms")
+    print(f"{'pipeline':>12}{pipeline_ms:>10.1f}")
+    print(f"{'fused':>12}{fused_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark request throughput against concurrent users on a single worker
+
+Serves the app in-process (one event loop, as in one uvicorn worker) on top of an
+in-memory storage backend that sleeps on every call to simulate GCS latency. Each user
+repeatedly reads their meal history while /health is probed every 10 ms. Runs once with storage
+calls on the storage thread pool, and once with them blocking the event loop as before.
+
+Usage (from src/api-service):
+    python -m benchmarks.bench_storage_concurrency
+"""
+
+import asyncio
+import os
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("SKIP_DOWNLOAD", "1")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+import httpx  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from api.service import app  # noqa: E402
+from api.utils import utils  # noqa: E402
+from api.utils.async_storage_utils import storage_pool  # noqa: E402
+from api.utils.meal_history_utils import (  # noqa: E402
+    meal_history_columns,
+    meal_history_schema,
+    get_meal_history_path,
+)
+from api.utils.storage_utils import MemoryBackend  # noqa: E402
+from api.utils.table_utils import write_table  # noqa: E402
+
+
+# Define variables
+storage_latency = 0.02
+requests_per_user = 10
+
+
+class SlowMemoryBackend(MemoryBackend):
+    """In-memory backend that sleeps on every call like a remote object store"""
+
+    def stat(self, name):
+        time.sleep(storage_latency)
+        return super().stat(name)
+
+    def get(self, name):
+        time.sleep(storage_latency)
+        return super().get(name)
+
+    def list(self, prefix=""):
+        time.sleep(storage_latency)
+        return super().list(prefix)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Previous behaviour: storage calls run directly on the event loop"""
+    return func(*args, **kwargs)
+
+
+async def run_users(users):
+    """Return (requests/s, worst /health latency in ms) for the given number of users"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def user(i):
+            for _ in range(requests_per_user):
+                response = await client.get(f"/meal-history/user{i}")
+                assert response.status_code == 200
+
+        async def probe_health(done):
+            # A /health request arriving at a random time waits for the event loop to be free,
+            # so measure from when the probe was due rather than when it got to run
+            latencies = []
+            while not done.is_set():
+                due = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                await client.get("/health")
+                latencies.append((time.perf_counter() - due) * 1000)
+            return latencies
+
+        done = asyncio.Event()
+        prober = asyncio.create_task(probe_health(done))
+        start = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(users)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        latencies = await prober
+
+    return users * requests_per_user / elapsed, max(latencies, default=0.0)
+
+
+def main():
+    backend = MemoryBackend()
+    utils._storage = backend
+    row = dict.fromkeys(meal_history_columns, "x")
+    for i in range(64):
+        write_table(get_meal_history_path(f"user{i}"), pd.DataFrame([row] * 50), meal_history_schema)
+    backend.__class__ = SlowMemoryBackend
+
+    print(f"Simulated storage latency: {storage_latency * 1000:.0f} ms per call")
+    print(f"{'users':>6} {'pool (req/s)':>13} {'health max (ms)':>16} {'blocking (req/s)':>17} {'health max (ms)':>16}")
+    for users in (1, 2, 4, 8, 16, 32, 64):
+        utils.csv_cache.clear()
+        pooled, pooled_health = asyncio.run(run_users(users))
+
+        utils.csv_cache.clear()
+        with (
+            patch("api.routers.meal_history.run_storage_io", run_blocking),
+            patch("api.routers.user_list.run_storage_io", run_blocking),
+        ):
+            blocking, blocking_health = asyncio.run(run_users(users))
+
+        print(f"{users:>6} {pooled:>13.1f} {pooled_health:>16.1f} {blocking:>17.1f} {blocking_health:>16.1f}")
+
+    print(f"Storage pool: {storage_pool.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,5 +22,12 @@ if [ "${DEV}" = "1" ]; then
 else
   echo "Running in PROD mode"
   # Production: optimized settings
-  uvicorn api.service:app --host 0.0.0.0 --port 9000 --workers 4
+  if [ "${PRELOAD_APP}" = "1" ]; then
+    # Load the app once and fork the workers, so they share the model in memory
+    # (and every worker is ready as soon as it serves, so /ready holds for the whole pod)
+    gunicorn api.service:app -c gunicorn.conf.py
+  else
+    # Each worker loads the model on its own: /ready only reports the worker that answers
+    uvicorn api.service:app --host 0.0.0.0 --port 9000 --workers 4
+  fi
 fi
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for serving the API with a preloaded app (PRELOAD_APP=1)
+
+The app is imported once in the gunicorn master, which also loads the food model and
+reference tables (when_ready) before the uvicorn workers are forked from it. Workers
+share the model weights and most of the torch/transformers runtime pages copy-on-write,
+instead of each holding its own copy as with `uvicorn --workers`. Measure with
+benchmarks/bench_model_memory.py.
+
+Each worker runs the warm-up inference itself in its lifespan, before it accepts
+connections: torch inference in the master would leave the forked workers' intra-op
+thread pool deadlocked.
+"""
+
+import os
+
+bind = "0.0.0.0:9000"
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    # Load in the master before workers fork, but leave the warm-up (a torch forward pass) to the workers
+    from api.routers import food_model
+
+    food_model.load_resources(warm=False)
+
+
+def post_fork(server, worker):
+    # Connections opened by the master while preloading must not be shared between workers
+    from api.utils.utils import reset_storage
+
+    reset_storage()
@@ -3,6 +3,9 @@ Pytest configuration file
 Sets up environment variables and fixtures for all tests
 """
 import os
+from pathlib import Path
+
+import pytest
 
 # Set environment variables BEFORE any imports
 # This prevents model downloads during testing
@@ -15,3 +18,60 @@ def pytest_configure(config):
     # Ensure environment variables are set
     os.environ.setdefault("SKIP_DOWNLOAD", "1")
     os.environ.setdefault("GCS_BUCKET_NAME", "test-bucket")
+
+
+# Labeled images used to validate the production model, and the dishes they show
+test_images_path = Path(__file__).parents[2] / "validate_model" / "test_images"
+tiny_vit_labels = [
+    "mussels",
+    "sushi",
+    "lobster bisque",
+    "caesar salad",
+    "chicken quesadilla",
+    "baklava",
+    "tuna tartare",
+    "nachos",
+]
+
+
+@pytest.fixture
+def tiny_vit_checkpoint(tmp_path, request):
+    """
+    Save a small random ViT checkpoint in the layout of the models/v2 folder and return its path.
+
+    Parametrize indirectly with a dict to change the model ("hidden_size", "intermediate_size")
+    or image processor (any other key, e.g. "image_mean") settings.
+    """
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    options = dict(getattr(request, "param", {}))
+    hidden_size = options.pop("hidden_size", 32)
+    intermediate_size = options.pop("intermediate_size", 2 * hidden_size)
+
+    torch.manual_seed(0)
+    config = ViTConfig(
+        image_size=64,
+        patch_size=16,
+        hidden_size=hidden_size,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=intermediate_size,
+        id2label=dict(enumerate(tiny_vit_labels)),
+        label2id={label: i for i, label in enumerate(tiny_vit_labels)},
+    )
+    ViTForImageClassification(config).save_pretrained(tmp_path)
+    ViTImageProcessor(size={"height": 64, "width": 64}, **options).save_pretrained(tmp_path)
+    return str(tmp_path)
+
+
+@pytest.fixture(scope="session")
+def images():
+    """Validation images, or generated ones if the validation set is not available"""
+    import numpy as np
+    from PIL import Image
+
+    if test_images_path.exists():
+        return [Image.open(path).convert("RGB") for path in sorted(test_images_path.glob("*.jpg"))]
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 255, (96, 128, 3), dtype=np.uint8)) for _ in range(4)]
@@ -91,14 +91,9 @@ class TestMealHistoryAPIEndpoints:
             {"id": 2, "ingredients": ["bread"], "symptoms": ["headache", "nausea"]},
         ]
 
-        # Patch get_blob and read_csv_from_gcs to return sample data
-        with (
-            patch("api.routers.meal_history.get_blob") as mock_get_blob,
-            patch("api.routers.meal_history.read_csv_from_gcs") as mock_read_csv,
-        ):
-            mock_blob = MagicMock()
-            mock_get_blob.return_value = mock_blob
-            mock_read_csv.return_value = pd.DataFrame(sample_df)
+        # Patch read_meal_history to return sample data
+        with patch("api.routers.meal_history.read_meal_history") as mock_read_history:
+            mock_read_history.return_value = pd.DataFrame(sample_df)
 
             response = client.get(f"/meal-history/{user_id}")
 
@@ -112,8 +107,8 @@ class TestMealHistoryAPIEndpoints:
         """Test GET /meal-history/{user_id} endpoint when file not found"""
         user_id = "nonexistentuser"
 
-        with patch("api.routers.meal_history.get_blob") as mock_get_blob:
-            mock_get_blob.side_effect = HTTPException(status_code=404, detail="File not found")
+        with patch("api.routers.meal_history.read_meal_history") as mock_read_history:
+            mock_read_history.side_effect = HTTPException(status_code=404, detail="File not found")
 
             response = client.get(f"/meal-history/{user_id}")
 
@@ -127,22 +122,15 @@ class TestMealHistoryAPIEndpoints:
         user_id = "testuser"
         new_meal = {"date_time": "2025-01-02 12:00:00", "ingredients": "bread", "symptoms": "headache,nausea"}
 
-        # Existing data
-        existing_df = pd.DataFrame(
-            [{"date_time": "2025-01-01 12:00:00", "ingredients": "milk,cheese", "symptoms": "nausea"}]
-        )
-
-        # Patch get_blob, read_csv_from_gcs, and write_csv_to_gcs
+        # Patch get_table_blob, append_meal, and background compaction
         with (
-            patch("api.routers.meal_history.get_blob") as mock_get_blob,
-            patch("api.routers.meal_history.read_csv_from_gcs") as mock_read_csv,
-            patch("api.routers.meal_history.write_csv_to_gcs") as mock_write_csv,
+            patch("api.routers.meal_history.get_table_blob") as mock_get_blob,
+            patch("api.routers.meal_history.append_meal") as mock_append_meal,
+            patch("api.routers.meal_history.compact_meal_history_if_needed") as mock_compact,
         ):
             mock_blob = MagicMock()
             mock_blob.name = "meal_history_testuser.csv"
             mock_get_blob.return_value = mock_blob
-            mock_read_csv.return_value = existing_df
-            mock_write_csv.return_value = None
 
             response = client.put(f"/meal-history/{user_id}", json=new_meal)
 
@@ -152,17 +140,19 @@ class TestMealHistoryAPIEndpoints:
             assert data["user_id"] == user_id
             assert data["file"] == mock_blob.name
 
-            written_df = mock_write_csv.call_args[0][1]
-            assert len(written_df) == 2
-            assert new_meal["ingredients"] in written_df["ingredients"].values
-            assert new_meal["symptoms"] in written_df["symptoms"].values
+            # Only the new row is written, the existing history is never read
+            appended_user_id, appended_row = mock_append_meal.call_args[0]
+            assert appended_user_id == user_id
+            assert appended_row["ingredients"] == new_meal["ingredients"]
+            assert appended_row["symptoms"] == new_meal["symptoms"]
+            mock_compact.assert_called_once_with(user_id)
 
     def test_put_meal_history_not_found(self):
         """Test PUT /meal-history/{user_id} endpoint when file not found"""
         user_id = "nonexistentuser"
         new_meal = {"date_time": "2025-01-02 12:00:00", "ingredients": "bread", "symptoms": "headache,nausea"}
 
-        with patch("api.routers.meal_history.get_blob") as mock_get_blob:
+        with patch("api.routers.meal_history.get_table_blob") as mock_get_blob:
             mock_get_blob.side_effect = HTTPException(status_code=404, detail="File not found")
 
             response = client.put(f"/meal-history/{user_id}", json=new_meal)
@@ -204,8 +194,8 @@ class TestHealthReportAPIEndpoints:
 
         # Patch GCS functions
         with (
-            patch("api.routers.health_report.get_blob") as mock_get_blob,
-            patch("api.routers.health_report.read_csv_from_gcs") as mock_read_csv,
+            patch("api.routers.health_report.get_table_blob") as mock_get_blob,
+            patch("api.routers.health_report.read_table") as mock_read_csv,
         ):
             mock_blob = MagicMock()
             mock_blob.name = "health_report_testuser.csv"
@@ -225,7 +215,7 @@ class TestHealthReportAPIEndpoints:
         """Test GET /health-report/{user_id} endpoint when file not found"""
         user_id = "nonexistentuser"
 
-        with patch("api.routers.health_report.get_blob") as mock_get_blob:
+        with patch("api.routers.health_report.get_table_blob") as mock_get_blob:
             mock_get_blob.side_effect = HTTPException(status_code=404, detail="File not found")
 
             response = client.get(f"/health-report/{user_id}")
@@ -269,24 +259,24 @@ class TestHealthReportAPIEndpoints:
             ]
         )
 
+        mock_report_blob = MagicMock()
+        mock_report_blob.name = f"data/health_report/health_report_{user_id}.parquet"
+
+        def fake_update_table(path, schema, update, read=True):
+            # Conditional write of the rebuilt report succeeds on the first attempt
+            assert update(None) is sample_report
+            return mock_report_blob
+
         # Patch GCS interactions and processing functions
         with (
-            patch("api.routers.health_report.get_blob") as mock_get_blob,
-            patch("api.routers.health_report.read_csv_from_gcs") as mock_read_csv,
-            patch("api.routers.health_report.write_csv_to_gcs") as mock_write_csv,
+            patch("api.routers.health_report.update_table", side_effect=fake_update_table),
+            patch("api.routers.health_report.read_meal_history") as mock_read_history,
             patch("api.routers.health_report.convert_onehot") as mock_convert_onehot,
             patch("api.routers.health_report.run_fisher") as mock_run_fisher,
         ):
-
-            mock_history_blob = MagicMock()
-            mock_report_blob = MagicMock()
-            mock_report_blob.name = f"data/health_report/health_report_{user_id}.csv"
-
-            mock_get_blob.side_effect = [mock_history_blob, mock_report_blob]
-            mock_read_csv.return_value = sample_history
+            mock_read_history.return_value = sample_history
             mock_convert_onehot.return_value = sample_history
             mock_run_fisher.return_value = sample_report
-            mock_write_csv.return_value = None
 
             response = client.put(f"/health-report/{user_id}")
 
@@ -294,14 +284,20 @@ class TestHealthReportAPIEndpoints:
             data = response.json()
             assert data["status"] == "success"
             assert data["user_id"] == user_id
-            assert data["file"] == f"data/health_report/health_report_{user_id}.csv"
+            assert data["file"] == f"data/health_report/health_report_{user_id}.parquet"
 
     def test_put_health_report_not_found(self):
         """Test PUT /health-report/{user_id} endpoint when meal history file not found"""
         user_id = "nonexistentuser"
 
-        with patch("api.routers.health_report.get_blob") as mock_get_blob:
-            mock_get_blob.side_effect = HTTPException(status_code=404, detail="File not found")
+        def update_missing_table(path, schema, update, read):
+            return update(None)
+
+        with (
+            patch("api.routers.health_report.update_table", side_effect=update_missing_table),
+            patch("api.routers.health_report.read_meal_history") as mock_read_history,
+        ):
+            mock_read_history.side_effect = HTTPException(status_code=404, detail="File not found")
 
             response = client.put(f"/health-report/{user_id}")
 
@@ -8,6 +8,7 @@ import pytest
 # Set SKIP_DOWNLOAD before importing the app to prevent model download
 os.environ["SKIP_DOWNLOAD"] = "1"
 
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 from api.service import app
 
@@ -74,6 +75,157 @@ class TestHealthEndpoint:
             assert data["status"] == "healthy"
 
 
+class TestHealthFailedComponents:
+    """Tests for liveness when a component failed to load"""
+
+    def test_health_endpoint_fails_when_component_failed(self):
+        """Test liveness fails once a component failed to load, so the pod is restarted"""
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register("food_model", "warm_up")
+        readiness.set("food_model", "failed", "model missing")
+        with patch("api.service.readiness", readiness):
+            response = client.get("/health")
+
+        assert response.status_code == 503
+        assert response.json() == {"status": "unhealthy", "failed": ["food_model"]}
+
+    def test_health_endpoint_healthy_while_loading(self):
+        """Test liveness does not wait for components that are still loading"""
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register("food_model")
+        readiness.set("food_model", "loading")
+        with patch("api.service.readiness", readiness):
+            assert client.get("/health").status_code == 200
+
+
+class TestReadyEndpoint:
+    """Tests for the readiness endpoint"""
+
+    def test_ready_endpoint_returns_503_while_loading(self):
+        """Test readiness is 503 with per-component status until everything is loaded"""
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register("food_model", "warm_up")
+        readiness.set("food_model", "loading")
+        with patch("api.service.readiness", readiness):
+            response = client.get("/ready")
+
+        assert response.status_code == 503
+        data = response.json()
+        assert data["ready"] is False
+        assert data["components"]["food_model"]["status"] == "loading"
+        assert data["components"]["warm_up"]["status"] == "pending"
+
+    def test_ready_endpoint_returns_200_once_loaded(self):
+        """Test readiness is 200 once every component is ready"""
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register("food_model", "warm_up")
+        readiness.set("food_model", "ready")
+        readiness.set("warm_up", "ready")
+        with patch("api.service.readiness", readiness):
+            response = client.get("/ready")
+
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+
+
+class TestLifespan:
+    """Tests for startup/shutdown handling"""
+
+    def test_shutdown_flushes_buffered_meals(self):
+        """Test buffered meals are written when the app shuts down"""
+        with patch("api.service.meal_write_buffer") as mock_buffer:
+            mock_buffer.flush_all.return_value = 0
+            with TestClient(app) as lifespan_client:
+                assert lifespan_client.get("/health").status_code == 200
+                mock_buffer.flush_all.assert_not_called()
+
+        mock_buffer.flush_all.assert_called_once_with()
+
+    def test_startup_loads_model_in_background(self):
+        """Test startup starts the background model loader without waiting for it"""
+        with patch("api.service.food_model.start_loading") as mock_start:
+            with TestClient(app) as lifespan_client:
+                assert lifespan_client.get("/health").status_code == 200
+
+        mock_start.assert_called_once_with()
+
+    def test_startup_warms_up_preloaded_model_before_serving(self):
+        """Test a worker of a preloaded app finishes its warm-up before the lifespan yields"""
+        with patch("api.service.food_model.is_preloaded", return_value=True), patch(
+            "api.service.food_model.load_resources"
+        ) as mock_load, patch("api.service.food_model.start_loading") as mock_start:
+            with TestClient(app):
+                mock_load.assert_called_once_with()
+
+        mock_start.assert_not_called()
+
+
+class TestMetricsEndpoint:
+    """Tests for the metrics endpoint"""
+
+    def test_metrics_endpoint_returns_cache_stats(self):
+        """Test metrics endpoint reports CSV cache counters"""
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        data = response.json()
+        assert "csv_cache" in data
+        for key in ["hits", "misses", "bytes", "max_bytes", "evictions"]:
+            assert key in data["csv_cache"]
+
+    def test_metrics_endpoint_returns_storage_pool_stats(self):
+        """Test metrics endpoint reports storage thread pool saturation"""
+        response = client.get("/metrics")
+        data = response.json()
+        assert "storage_pool" in data
+        for key in ["max_workers", "active", "queued", "saturation", "avg_wait_ms"]:
+            assert key in data["storage_pool"]
+
+    def test_metrics_endpoint_returns_write_conflicts(self):
+        """Test metrics endpoint reports conditional write conflicts"""
+        data = client.get("/metrics").json()
+        assert set(data["write_conflicts"]) == {"conflicts", "retries_exhausted"}
+
+    def test_metrics_endpoint_returns_gcs_client_stats(self):
+        """Test metrics endpoint reports HTTP connection reuse of the GCS client"""
+        data = client.get("/metrics").json()
+        for key in ["pool_size", "connections_opened", "requests", "reused", "reuse_rate"]:
+            assert key in data["gcs_client"]
+
+    def test_metrics_endpoint_returns_write_buffer_stats(self):
+        """Test metrics endpoint reports meal write-behind buffer counters"""
+        data = client.get("/metrics").json()
+        for key in ["enabled", "pending_items", "writes", "items_per_write"]:
+            assert key in data["meal_write_buffer"]
+
+    def test_metrics_endpoint_returns_inference_stats(self):
+        """Test metrics endpoint reports inference micro-batching counters"""
+        data = client.get("/metrics").json()
+        for key in ["max_batch_size", "max_wait_ms", "queue_depth", "avg_batch_size", "avg_queue_wait_ms"]:
+            assert key in data["inference"]
+
+    def test_metrics_endpoint_returns_inference_backpressure_stats(self):
+        """Test metrics endpoint reports admission and decode pool queue vs run time"""
+        data = client.get("/metrics").json()
+        for key in ["max_in_flight", "in_flight", "rejected", "avg_latency_ms"]:
+            assert key in data["inference_admission"]
+        for key in ["avg_wait_ms", "avg_run_ms"]:
+            assert key in data["image_decode_pool"]
+
+    def test_metrics_endpoint_returns_prediction_cache_stats(self):
+        """Test metrics endpoint reports prediction cache hit rate and size"""
+        data = client.get("/metrics").json()
+        for key in ["entries", "max_entries", "hits", "misses", "hit_rate"]:
+            assert key in data["prediction_cache"]
+
+
 class TestCORSMiddleware:
     """Tests for CORS middleware configuration"""
 
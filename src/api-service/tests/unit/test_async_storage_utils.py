@@ -0,0 +1,171 @@
+"""
+Unit tests for non-blocking storage access
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.utils.storage_utils import MemoryBackend
+from api.utils.async_storage_utils import InstrumentedThreadPool, AsyncStorage, iterate_storage_io
+
+
+class TestInstrumentedThreadPool:
+    """Tests for InstrumentedThreadPool"""
+
+    @pytest.mark.asyncio
+    async def test_run_returns_result(self):
+        """Test calls run on a worker thread and return their result"""
+        pool = InstrumentedThreadPool("test", max_workers=2)
+        main_thread = threading.get_ident()
+
+        thread_id = await pool.run(threading.get_ident)
+        result = await pool.run(lambda a, b=0: a + b, 1, b=2)
+
+        assert thread_id != main_thread
+        assert result == 3
+        stats = pool.stats()
+        assert stats["submitted"] == 2
+        assert stats["completed"] == 2
+        assert stats["active"] == 0
+        assert stats["queued"] == 0
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_failures_are_counted(self):
+        """Test exceptions propagate to the caller and are counted"""
+        pool = InstrumentedThreadPool("test", max_workers=1)
+
+        with pytest.raises(ValueError):
+            await pool.run(int, "not a number")
+
+        assert pool.stats()["failed"] == 1
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_saturation_is_tracked(self):
+        """Test calls beyond max_workers queue and record their wait time"""
+        pool = InstrumentedThreadPool("test", max_workers=2)
+
+        await asyncio.gather(*(pool.run(time.sleep, 0.05) for _ in range(6)))
+
+        stats = pool.stats()
+        assert stats["peak_active"] == 2
+        assert stats["peak_queued"] >= 4
+        assert stats["max_wait_ms"] >= 50
+        assert stats["avg_run_ms"] >= 40
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_event_loop_is_not_blocked(self):
+        """Test the event loop keeps running while a slow call is in progress"""
+        pool = InstrumentedThreadPool("test", max_workers=1)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await pool.run(time.sleep, 0.2)
+        ticker.cancel()
+
+        assert ticks >= 5
+        pool.shutdown()
+
+
+class TestIterateStorageIO:
+    """Tests for iterate_storage_io"""
+
+    @pytest.mark.asyncio
+    async def test_yields_items_and_closes(self):
+        """Test items are produced on the pool and the generator is closed when iteration stops early"""
+        closed = []
+
+        def chunks():
+            try:
+                for i in range(5):
+                    yield i
+            finally:
+                closed.append(True)
+
+        items = []
+        iterator = iterate_storage_io(chunks())
+        async for item in iterator:
+            items.append(item)
+            if item == 2:
+                break
+        await iterator.aclose()
+
+        assert items == [0, 1, 2]
+        assert closed == [True]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_while_next_is_running(self):
+        """Test cancelling during a pending next() closes the generator after it returns instead of failing"""
+        entered = threading.Event()
+        release = threading.Event()
+        closed = threading.Event()
+
+        def chunks():
+            try:
+                yield b"first"
+                entered.set()
+                release.wait(5)
+                yield b"second"
+            finally:
+                closed.set()
+
+        async def consume():
+            async for _ in iterate_storage_io(chunks()):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.to_thread(entered.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The generator is still inside next() on the pool thread, so it cannot be closed yet
+        assert not closed.is_set()
+        release.set()
+        assert await asyncio.to_thread(closed.wait, 5)
+
+
+class TestAsyncStorage:
+    """Tests for the AsyncStorage facade"""
+
+    @pytest.mark.asyncio
+    async def test_blob_operations(self):
+        """Test the facade round-trips objects through a storage backend"""
+        storage = AsyncStorage(MemoryBackend())
+
+        blob = await storage.upload_from_string("data/a.txt", "hello", content_type="text/plain")
+
+        assert blob.name == "data/a.txt"
+        assert await storage.exists("data/a.txt")
+        assert await storage.download_as_text("data/a.txt") == "hello"
+        assert await storage.download_as_bytes("data/a.txt") == b"hello"
+        assert (await storage.get_blob("data/a.txt")).content_type == "text/plain"
+
+        await storage.delete("data/a.txt")
+        assert not await storage.exists("data/a.txt")
+        assert await storage.get_blob("data/a.txt") is None
+
+    @pytest.mark.asyncio
+    async def test_list_and_delete_blobs(self):
+        """Test listing by prefix and deleting several blobs"""
+        storage = AsyncStorage(MemoryBackend())
+        for i in range(3):
+            await storage.upload_from_string(f"data/user_photo/u1_{i}.jpg", b"x")
+        await storage.upload_from_string("data/user_photo/u2_0.jpg", b"x")
+
+        blobs = await storage.list_blobs(prefix="data/user_photo/u1_")
+        assert [b.name for b in blobs] == [f"data/user_photo/u1_{i}.jpg" for i in range(3)]
+
+        assert await storage.delete_blobs(blobs) == 3
+        assert [b.name for b in await storage.list_blobs(prefix="data/")] == ["data/user_photo/u2_0.jpg"]
@@ -0,0 +1,109 @@
+"""
+Unit tests for the write-behind buffer
+"""
+
+import threading
+import time
+
+import pytest
+
+from api.utils.buffer_utils import WriteBuffer
+
+
+class RecordingWriter:
+    """Collects write(key, items) calls"""
+
+    def __init__(self, fail=0):
+        self.calls = []
+        self.fail = fail
+        self.written = threading.Event()
+
+    def __call__(self, key, items):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("storage unavailable")
+        self.calls.append((key, list(items)))
+        self.written.set()
+
+
+class TestWriteBuffer:
+    """Tests for WriteBuffer"""
+
+    def test_disabled_with_zero_window(self):
+        """Test a zero window disables buffering"""
+        assert not WriteBuffer(0, RecordingWriter()).enabled
+        assert WriteBuffer(0.25, RecordingWriter()).enabled
+
+    def test_items_in_window_are_coalesced(self):
+        """Test items added within the window are written together by the background thread"""
+        writer = RecordingWriter()
+        buffer = WriteBuffer(0.05, writer)
+
+        for i in range(5):
+            buffer.add("user1", i)
+        buffer.add("user2", "a")
+
+        assert writer.written.wait(timeout=2)
+        time.sleep(0.05)
+        assert sorted(writer.calls) == [("user1", [0, 1, 2, 3, 4]), ("user2", ["a"])]
+        stats = buffer.stats()
+        assert stats["writes"] == 2
+        assert stats["items_written"] == 6
+        assert stats["items_per_write"] == 3.0
+        assert stats["pending_items"] == 0
+
+    def test_flush_writes_immediately(self):
+        """Test flush does not wait for the window to close"""
+        writer = RecordingWriter()
+        buffer = WriteBuffer(60, writer)
+        buffer.add("user1", 1)
+        buffer.add("user1", 2)
+
+        assert buffer.flush("user1") == 2
+        assert writer.calls == [("user1", [1, 2])]
+        assert buffer.flush("user1") == 0
+
+    def test_flush_all(self):
+        """Test flush_all writes every key (as on shutdown)"""
+        writer = RecordingWriter()
+        buffer = WriteBuffer(60, writer)
+        buffer.add("user1", 1)
+        buffer.add("user2", 2)
+
+        assert buffer.flush_all() == 2
+        assert sorted(writer.calls) == [("user1", [1]), ("user2", [2])]
+
+    def test_failed_write_is_retried_in_order(self):
+        """Test items of a failed write are kept ahead of newer items"""
+        writer = RecordingWriter(fail=1)
+        buffer = WriteBuffer(60, writer)
+        buffer.add("user1", 1)
+
+        with pytest.raises(RuntimeError):
+            buffer.flush("user1")
+        buffer.add("user1", 2)
+
+        assert buffer.flush("user1") == 2
+        assert writer.calls == [("user1", [1, 2])]
+        assert buffer.stats()["write_errors"] == 1
+
+    def test_discard(self):
+        """Test discarded items are never written"""
+        writer = RecordingWriter()
+        buffer = WriteBuffer(60, writer)
+        buffer.add("user1", 1)
+
+        buffer.discard("user1")
+
+        assert buffer.flush_all() == 0
+        assert writer.calls == []
+
+    def test_key_locks_are_bounded(self):
+        """Test flushing many keys does not create a lock per key"""
+        writer = RecordingWriter()
+        buffer = WriteBuffer(60, writer, lock_stripes=4)
+        for i in range(100):
+            buffer.add(f"user{i}", i)
+
+        assert buffer.flush_all() == 100
+        assert len(buffer.key_locks) == 4
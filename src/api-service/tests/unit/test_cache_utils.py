@@ -0,0 +1,189 @@
+"""
+Unit tests for in-process caches
+"""
+
+import json
+import time
+
+import pandas as pd
+
+from api.utils.cache_utils import DataFrameCache, PredictionCache
+from api.utils.storage_utils import MemoryBackend
+
+
+def make_df(rows):
+    return pd.DataFrame({"dish": ["pizza"] * rows, "dish_confidence": [0.9] * rows})
+
+
+def frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class TestDataFrameCache:
+    """Tests for DataFrameCache"""
+
+    def test_hit_and_miss(self):
+        """Test lookups count hits and misses"""
+        cache = DataFrameCache(max_bytes=10**6)
+        assert cache.get("a.csv", 1) is None
+
+        cache.put("a.csv", 1, None, make_df(2))
+        df = cache.get("a.csv", 1)
+
+        assert len(df) == 2
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_generation_mismatch_invalidates(self):
+        """Test entries for an older generation are dropped"""
+        cache = DataFrameCache(max_bytes=10**6)
+        cache.put("a.csv", 1, 1, make_df(2))
+
+        assert cache.get("a.csv", 2, 1) is None
+        assert cache.get("a.csv", 1, 1) is None
+        assert cache.stats()["invalidations"] == 1
+        assert cache.stats()["entries"] == 0
+
+    def test_metageneration_mismatch_invalidates(self):
+        """Test metadata updates also invalidate entries"""
+        cache = DataFrameCache(max_bytes=10**6)
+        cache.put("a.csv", 1, 1, make_df(2))
+        assert cache.get("a.csv", 1, 2) is None
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Test eviction is driven by total DataFrame size"""
+        df = make_df(100)
+        cache = DataFrameCache(max_bytes=frame_size(df) * 2)
+        cache.put("a.csv", 1, None, df)
+        cache.put("b.csv", 1, None, df)
+        cache.get("a.csv", 1)
+
+        cache.put("c.csv", 1, None, df)
+
+        assert cache.get("b.csv", 1) is None
+        assert cache.get("a.csv", 1) is not None
+        assert cache.get("c.csv", 1) is not None
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] <= cache.max_bytes
+
+    def test_oversized_frame_not_cached(self):
+        """Test frames larger than the whole cache are skipped"""
+        df = make_df(100)
+        cache = DataFrameCache(max_bytes=frame_size(df) - 1)
+        cache.put("a.csv", 1, None, df)
+        assert cache.stats()["entries"] == 0
+
+    def test_replace_entry_updates_size(self):
+        """Test re-caching a key does not double count its size"""
+        df = make_df(10)
+        cache = DataFrameCache(max_bytes=10**6)
+        cache.put("a.csv", 1, None, df)
+        cache.put("a.csv", 2, None, df)
+        assert cache.stats()["bytes"] == frame_size(df)
+
+    def test_unknown_generation_not_cached(self):
+        """Test objects without a generation are never cached"""
+        cache = DataFrameCache(max_bytes=10**6)
+        cache.put("a.csv", None, None, make_df(1))
+        assert cache.stats()["entries"] == 0
+
+    def test_invalidate(self):
+        """Test explicit invalidation"""
+        cache = DataFrameCache(max_bytes=10**6)
+        cache.put("a.csv", 1, None, make_df(1))
+        cache.invalidate("a.csv")
+        assert cache.get("a.csv", 1) is None
+        assert cache.stats()["bytes"] == 0
+
+
+class TestPredictionCache:
+    """Tests for PredictionCache"""
+
+    payload = {"dish": "Pizza", "dish_confidence": 0.9}
+
+    def test_hit_and_miss(self):
+        """Test identical bytes hit, other bytes miss, and hit rate is tracked"""
+        cache = PredictionCache(max_entries=10, ttl=60, namespace="models/v2")
+        key = cache.key_for(b"image bytes")
+        assert key == cache.key_for(b"image bytes")
+        assert key != cache.key_for(b"other bytes")
+        assert cache.get(key) is None
+
+        cache.put(key, self.payload)
+        hit = cache.get(key)
+        hit["dish"] = "changed"
+
+        assert cache.get(key) == self.payload
+        stats = cache.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 2 / 3
+
+    def test_namespace_separates_models(self):
+        """Test the same bytes have different keys under another model version"""
+        v1 = PredictionCache(max_entries=10, ttl=60, namespace="models/v1")
+        v2 = PredictionCache(max_entries=10, ttl=60, namespace="models/v2")
+        assert v1.key_for(b"photo") != v2.key_for(b"photo")
+
+    def test_evicts_least_recently_used(self):
+        """Test the cache is bounded by max_entries"""
+        cache = PredictionCache(max_entries=2, ttl=60)
+        cache.put("a", self.payload)
+        cache.put("b", self.payload)
+        cache.get("a")
+        cache.put("c", self.payload)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire(self):
+        """Test entries older than ttl are misses"""
+        cache = PredictionCache(max_entries=10, ttl=0.01)
+        cache.put("a", self.payload)
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["entries"] == 0
+
+    def test_shared_cache_across_instances(self):
+        """Test a pod reads predictions another pod wrote to the shared storage"""
+        backend = MemoryBackend()
+        pod_a = PredictionCache(max_entries=10, ttl=60, shared=lambda: backend)
+        pod_b = PredictionCache(max_entries=10, ttl=60, shared=lambda: backend)
+        key = pod_a.key_for(b"photo")
+
+        pod_a.put(key, self.payload)
+
+        assert pod_b.get(key) == self.payload
+        assert pod_b.get(key) == self.payload
+        stats = pod_b.stats()
+        assert stats["shared_hits"] == 1
+        assert stats["hits"] == 1
+
+    def test_expired_shared_entry_is_a_miss(self):
+        """Test shared entries past their expiry time are ignored"""
+        backend = MemoryBackend()
+        cache = PredictionCache(max_entries=10, ttl=60, shared=lambda: backend)
+        entry = {"expires_at": time.time() - 1, "payload": self.payload}
+        backend.put(cache.shared_path("a"), json.dumps(entry).encode())
+
+        assert cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+
+    def test_shared_errors_are_misses(self):
+        """Test storage errors do not fail lookups or writes"""
+
+        def broken():
+            raise ConnectionError("storage down")
+
+        cache = PredictionCache(max_entries=10, ttl=60, shared=broken)
+        cache.put("a", self.payload)
+        cache.clear()
+
+        assert cache.get("a") is None
+        assert cache.stats()["shared_errors"] == 1
@@ -0,0 +1,157 @@
+"""
+Unit tests for CSV tail reads
+"""
+
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from api.utils import csv_tail_utils
+from api.utils import utils as utils_module
+from api.utils.storage_utils import MemoryBackend
+from api.utils.csv_tail_utils import get_csv_header, parse_timestamp, read_csv_tail, select_tail
+
+
+path = "data/meal_history/meal_history_user1.csv"
+
+
+@pytest.fixture
+def storage():
+    backend = MemoryBackend()
+    utils_module.csv_cache.clear()
+    csv_tail_utils._header_cache.clear()
+    with patch("api.utils.csv_tail_utils.tail_chunk_size", 256):
+        yield backend
+    utils_module.csv_cache.clear()
+
+
+def make_history(meals):
+    return pd.DataFrame(
+        {
+            "date_time": [f"2025-01-01T{i // 60:02d}:{i % 60:02d}:00" for i in range(meals)],
+            "dish": [f"dish{i}" for i in range(meals)],
+            "ingredients": ["garlic, onion"] * meals,
+        }
+    )
+
+
+def write_history(storage, meals, **kwargs):
+    storage.blob(path).upload_from_string(make_history(meals).to_csv(index=False), content_type="text/csv", **kwargs)
+    return storage.get_blob(path)
+
+
+class TestSelectTail:
+    """Tests for select_tail()"""
+
+    def test_last_and_since(self):
+        """Test rows are filtered by timestamp, then limited to the last N"""
+        df = make_history(10)
+
+        assert select_tail(df, last=3)["dish"].tolist() == ["dish7", "dish8", "dish9"]
+        assert select_tail(df, since="2025-01-01T00:08:00")["dish"].tolist() == ["dish8", "dish9"]
+        assert select_tail(df, last=1, since="2025-01-01T00:08:00")["dish"].tolist() == ["dish9"]
+
+    def test_since_compares_times_not_strings(self):
+        """Test since matches rows by time across separators and UTC offsets"""
+        df = pd.DataFrame(
+            {
+                "date_time": ["2025-01-01 07:00:00", "2025-01-01T08:00:00", "2025-01-01 09:30:00", "unknown"],
+                "dish": ["a", "b", "c", "d"],
+            }
+        )
+
+        assert select_tail(df, since="2025-01-01T08:00:00Z")["dish"].tolist() == ["b", "c"]
+        assert select_tail(df, since="2025-01-01T10:00:00+02:00")["dish"].tolist() == ["b", "c"]
+        assert select_tail(df, since="2025-01-01 09:00:00")["dish"].tolist() == ["c"]
+
+
+class TestParseTimestamp:
+    """Tests for parse_timestamp()"""
+
+    def test_normalizes_to_utc(self):
+        """Test timestamps with and without an offset are parsed as UTC"""
+        expected = pd.Timestamp("2025-01-01 08:00:00", tz="UTC")
+
+        assert parse_timestamp("2025-01-01T08:00:00") == expected
+        assert parse_timestamp("2025-01-01 08:00:00") == expected
+        assert parse_timestamp("2025-01-01T10:00:00+02:00") == expected
+        assert parse_timestamp("2025-01-01T08:00:00Z") == expected
+        assert parse_timestamp(pd.Timestamp("2025-01-01 08:00:00")) == expected
+
+    @pytest.mark.parametrize("value", ["now", "yesterday", "", "2025-13-01", "01/02/2025", None])
+    def test_rejects_invalid_timestamps(self, value):
+        """Test values that are not ISO 8601 timestamps raise ValueError"""
+        with pytest.raises(ValueError):
+            parse_timestamp(value)
+
+
+class TestReadCsvTail:
+    """Tests for read_csv_tail()"""
+
+    def test_last_rows_use_ranged_reads(self, storage):
+        """Test only the end of a large object is downloaded"""
+        blob = write_history(storage, 500)
+
+        with patch.object(storage, "get", wraps=storage.get) as mock_get:
+            df = read_csv_tail(blob, last=5)
+
+        mock_get.assert_not_called()
+        assert df["dish"].tolist() == [f"dish{i}" for i in range(495, 500)]
+        assert list(df.columns) == ["date_time", "dish", "ingredients"]
+
+    def test_range_extends_backward(self, storage):
+        """Test the range grows until enough complete rows are found"""
+        blob = write_history(storage, 500)
+
+        df = read_csv_tail(blob, last=100)
+
+        assert df["dish"].tolist() == [f"dish{i}" for i in range(400, 500)]
+
+    def test_since(self, storage):
+        """Test rows since a timestamp are read from the tail"""
+        blob = write_history(storage, 500)
+
+        df = read_csv_tail(blob, since="2025-01-01T08:00:00")
+
+        assert df["dish"].tolist() == [f"dish{i}" for i in range(480, 500)]
+
+    def test_more_rows_than_object(self, storage):
+        """Test asking for more rows than exist returns the whole object"""
+        blob = write_history(storage, 500)
+
+        assert len(read_csv_tail(blob, last=1000)) == 500
+
+    def test_header_is_cached(self, storage):
+        """Test the header is only fetched once per object generation"""
+        blob = write_history(storage, 500)
+        read_csv_tail(blob, last=1)
+
+        with patch.object(storage, "get_range", wraps=storage.get_range) as mock_get_range:
+            read_csv_tail(blob, last=1)
+
+        assert all(call.args[1] > 0 for call in mock_get_range.call_args_list)
+        assert get_csv_header(blob) == b"date_time,dish,ingredients\n"
+
+    def test_compressed_object_is_read_in_full(self, storage):
+        """Test compressed objects fall back to a full read"""
+        blob = write_history(storage, 500, content_encoding="gzip")
+
+        df = read_csv_tail(blob, last=5)
+
+        assert df["dish"].tolist() == [f"dish{i}" for i in range(495, 500)]
+
+    def test_rewritten_object_falls_back_to_full_read(self, storage):
+        """Test a write between two ranged reads does not mix object versions"""
+        blob = write_history(storage, 500)
+        get_range = storage.get_range
+
+        def rewrite_then_read(*args, **kwargs):
+            data = get_range(*args, **kwargs)
+            if args[1] > 0 and len(storage.get(path)) > 100:
+                storage.put(path, b"date_time,dish,ingredients\n2025-02-01T00:00:00,new,rice\n")
+            return data
+
+        with patch.object(storage, "get_range", side_effect=rewrite_then_read):
+            df = read_csv_tail(blob, last=100)
+
+        assert df["dish"].tolist() == ["new"]
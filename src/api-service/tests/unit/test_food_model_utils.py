@@ -12,6 +12,8 @@ from api.utils.food_model_utils import (
     download_model_from_gcs,
     load_dish_to_ing_dict,
     load_ing_to_fodmap_dict,
+    load_food_model,
+    get_model_variant,
 )
 
 
@@ -256,30 +258,28 @@ class TestVerifyModelFiles:
 class TestLoadDishToIngDict:
     """Test dish-to-ingredient dictionary loading from GCS"""
 
-    @patch("api.utils.food_model_utils.storage.Client")
-    def test_successful_load(self, mock_storage_client):
+    @patch("api.utils.food_model_utils.get_storage")
+    def test_successful_load(self, mock_get_storage):
         """Test successful loading of dish-to-ingredient mappings from GCS"""
         csv_content = """bibimbap,"['rice', 'beef', 'spinach']"
 waffles,wheat flour, milk, eggs
 """
-        mock_client = MagicMock()
         mock_bucket = MagicMock()
         mock_blob = MagicMock()
         mock_blob.download_as_text.return_value = csv_content
 
-        mock_client.bucket.return_value = mock_bucket
         mock_bucket.blob.return_value = mock_blob
-        mock_storage_client.return_value = mock_client
+        mock_get_storage.return_value = mock_bucket
 
         result = load_dish_to_ing_dict()
 
         assert "bibimbap" in result
         assert "waffles" in result
 
-    @patch("api.utils.food_model_utils.storage.Client")
-    def test_load_failure_returns_empty_dict(self, mock_storage_client):
+    @patch("api.utils.food_model_utils.get_storage")
+    def test_load_failure_returns_empty_dict(self, mock_get_storage):
         """Test that load failures return empty dict"""
-        mock_storage_client.side_effect = Exception("GCS error")
+        mock_get_storage.side_effect = Exception("GCS error")
 
         result = load_dish_to_ing_dict()
 
@@ -289,8 +289,8 @@ waffles,wheat flour, milk, eggs
 class TestLoadIngToFodmapDict:
     """Test ingredient-to-FODMAP dictionary loading from GCS"""
 
-    @patch("api.utils.food_model_utils.storage.Client")
-    def test_successful_load(self, mock_storage_client):
+    @patch("api.utils.food_model_utils.get_storage")
+    def test_successful_load(self, mock_get_storage):
         """Test successful loading of FODMAP lookup from GCS"""
         csv_content = """ingredient,fodmap
 garlic,high
@@ -298,14 +298,12 @@ onion,high
 rice,low
 beef,none
 """
-        mock_client = MagicMock()
         mock_bucket = MagicMock()
         mock_blob = MagicMock()
         mock_blob.download_as_text.return_value = csv_content
 
-        mock_client.bucket.return_value = mock_bucket
         mock_bucket.blob.return_value = mock_blob
-        mock_storage_client.return_value = mock_client
+        mock_get_storage.return_value = mock_bucket
 
         result = load_ing_to_fodmap_dict()
 
@@ -314,30 +312,28 @@ beef,none
         assert result["rice"] == "low"
         assert result["beef"] == "none"
 
-    @patch("api.utils.food_model_utils.storage.Client")
-    def test_load_failure_returns_empty_dict(self, mock_storage_client):
+    @patch("api.utils.food_model_utils.get_storage")
+    def test_load_failure_returns_empty_dict(self, mock_get_storage):
         """Test that load failures return empty dict"""
-        mock_storage_client.side_effect = Exception("GCS error")
+        mock_get_storage.side_effect = Exception("GCS error")
 
         result = load_ing_to_fodmap_dict()
 
         assert result == {}
 
-    @patch("api.utils.food_model_utils.storage.Client")
-    def test_lowercase_normalization(self, mock_storage_client):
+    @patch("api.utils.food_model_utils.get_storage")
+    def test_lowercase_normalization(self, mock_get_storage):
         """Test that ingredients and FODMAP levels are lowercased"""
         csv_content = """ingredient,fodmap
 GARLIC,HIGH
 Rice,Low
 """
-        mock_client = MagicMock()
         mock_bucket = MagicMock()
         mock_blob = MagicMock()
         mock_blob.download_as_text.return_value = csv_content
 
-        mock_client.bucket.return_value = mock_bucket
         mock_bucket.blob.return_value = mock_blob
-        mock_storage_client.return_value = mock_client
+        mock_get_storage.return_value = mock_bucket
 
         result = load_ing_to_fodmap_dict()
 
@@ -348,7 +344,7 @@ Rice,Low
 class TestDownloadModelFromGcs:
     """Test model download from GCS"""
 
-    @patch("api.utils.food_model_utils.get_gcs_bucket")
+    @patch("api.utils.food_model_utils.get_storage")
     @patch("api.utils.food_model_utils.Path")
     def test_download_creates_directory(self, mock_path, mock_get_bucket):
         """Test that download creates the model directory"""
@@ -366,7 +362,7 @@ class TestDownloadModelFromGcs:
 
         mock_model_dir.mkdir.assert_called_once_with(parents=True, exist_ok=True)
 
-    @patch("api.utils.food_model_utils.get_gcs_bucket")
+    @patch("api.utils.food_model_utils.get_storage")
     @patch("api.utils.food_model_utils.Path")
     def test_skip_existing_files(self, mock_path, mock_get_bucket):
         """Test that existing files are skipped during download"""
@@ -387,5 +383,105 @@ class TestDownloadModelFromGcs:
         assert result == str(mock_model_dir)
 
 
+class TestLoadFoodModel:
+    """Tests for load_food_model backend selection"""
+
+    @patch("api.utils.food_model_utils.pipeline")
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_pytorch_backend_is_default(self, mock_verify, mock_pipeline):
+        """Test the transformers pipeline is used by default"""
+        with patch("api.utils.food_model_utils.model_backend", "pytorch"):
+            classifier = load_food_model()
+
+        mock_pipeline.assert_called_once_with("image-classification", model="/tmp/models")
+        assert classifier == mock_pipeline.return_value
+
+    @patch("api.utils.onnx_utils.load_onnx_classifier")
+    @patch("api.utils.food_model_utils.pipeline")
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_onnx_backend(self, mock_verify, mock_pipeline, mock_load_onnx):
+        """Test MODEL_BACKEND=onnx loads the ONNX Runtime classifier"""
+        with patch("api.utils.food_model_utils.model_backend", "onnx"):
+            classifier = load_food_model()
+
+        mock_load_onnx.assert_called_once_with("/tmp/models")
+        mock_pipeline.assert_not_called()
+        assert classifier == mock_load_onnx.return_value
+
+    @patch("api.utils.quantization_utils.load_quantized_classifier")
+    @patch("api.utils.food_model_utils.pipeline")
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_int8_quantization(self, mock_verify, mock_pipeline, mock_load_quantized):
+        """Test MODEL_QUANTIZATION=int8 loads the quantized classifier"""
+        with patch("api.utils.food_model_utils.model_backend", "pytorch"), patch(
+            "api.utils.food_model_utils.model_quantization", "int8"
+        ):
+            classifier = load_food_model()
+
+        mock_load_quantized.assert_called_once_with("/tmp/models")
+        mock_pipeline.assert_not_called()
+        assert classifier == mock_load_quantized.return_value
+
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_int8_quantization_requires_pytorch(self, mock_verify):
+        """Test INT8 quantization cannot be combined with the ONNX backend"""
+        with patch("api.utils.food_model_utils.model_backend", "onnx"), patch(
+            "api.utils.food_model_utils.model_quantization", "int8"
+        ):
+            with pytest.raises(ValueError):
+                load_food_model()
+
+    @patch("api.utils.safetensors_utils.load_mmap_classifier")
+    @patch("api.utils.food_model_utils.pipeline")
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_mmap_weights(self, mock_verify, mock_pipeline, mock_load_mmap):
+        """Test MODEL_MMAP=1 loads the memory-mapped classifier"""
+        with patch("api.utils.food_model_utils.model_backend", "pytorch"), patch(
+            "api.utils.food_model_utils.model_quantization", "none"
+        ), patch("api.utils.food_model_utils.model_mmap", True):
+            classifier = load_food_model()
+
+        mock_load_mmap.assert_called_once_with("/tmp/models")
+        mock_pipeline.assert_not_called()
+        assert classifier == mock_load_mmap.return_value
+
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_mmap_weights_require_fp32_pytorch(self, mock_verify):
+        """Test memory-mapped weights cannot be combined with INT8 quantization"""
+        with patch("api.utils.food_model_utils.model_backend", "pytorch"), patch(
+            "api.utils.food_model_utils.model_quantization", "int8"
+        ), patch("api.utils.food_model_utils.model_mmap", True):
+            with pytest.raises(ValueError):
+                load_food_model()
+
+    @patch("api.utils.food_model_utils.verify_model_files", return_value=True)
+    def test_unknown_backend(self, mock_verify):
+        """Test an unknown MODEL_BACKEND is an error"""
+        with patch("api.utils.food_model_utils.model_backend", "tensorrt"):
+            with pytest.raises(ValueError):
+                load_food_model()
+
+
+class TestGetModelVariant:
+    """Tests for get_model_variant"""
+
+    def test_variants_differ_by_setting(self):
+        """Test backend, quantization and preprocessing mode each change the variant"""
+        variants = set()
+        for backend, quantization, fused in [
+            ("pytorch", "none", False),
+            ("pytorch", "int8", False),
+            ("onnx", "none", False),
+            ("pytorch", "none", True),
+        ]:
+            with patch("api.utils.food_model_utils.model_backend", backend), patch(
+                "api.utils.food_model_utils.model_quantization", quantization
+            ), patch("api.utils.food_model_utils.fused_preprocessing", fused):
+                variants.add(get_model_variant())
+
+        assert len(variants) == 4
+        assert all(variant.startswith("models/v2/") for variant in variants)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
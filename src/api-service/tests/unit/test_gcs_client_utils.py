@@ -0,0 +1,155 @@
+"""
+Unit tests for the shared GCS client
+"""
+
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock
+
+import pytest
+import requests
+
+import api.utils.gcs_client_utils as gcs_client_module
+from api.utils.gcs_client_utils import (
+    KeepAliveHTTPAdapter,
+    create_http_adapter,
+    get_gcs_client,
+    get_client_stats,
+    get_retry_policy,
+    reset_gcs_client,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_client():
+    reset_gcs_client()
+    yield
+    reset_gcs_client()
+
+
+class TestGetGcsClient:
+    """Tests for get_gcs_client()"""
+
+    @patch("api.utils.gcs_client_utils.storage.Client")
+    def test_client_is_shared(self, mock_client_class):
+        """Test concurrent callers get the same client, created once"""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: get_gcs_client(), range(16)))
+
+        assert all(client is clients[0] for client in clients)
+        mock_client_class.assert_called_once_with()
+
+    @patch("api.utils.gcs_client_utils.storage.Client")
+    def test_pooled_adapter_is_mounted(self, mock_client_class):
+        """Test the client's HTTP session uses the pooled keep-alive adapter"""
+        client = get_gcs_client()
+
+        adapter = client._http.mount.call_args_list[0][0][1]
+        assert isinstance(adapter, KeepAliveHTTPAdapter)
+        assert adapter._pool_maxsize == gcs_client_module.http_pool_size
+
+    def test_retry_policy_timeout(self):
+        """Test the retry policy gives up after GCS_RETRY_TIMEOUT"""
+        assert get_retry_policy().timeout == gcs_client_module.retry_timeout
+
+
+class TestHttpAdapter:
+    """Tests for the pooled HTTP adapter"""
+
+    def test_keepalive_socket_options(self):
+        """Test pooled connections enable TCP keep-alive"""
+        adapter = create_http_adapter()
+
+        options = adapter.poolmanager.connection_pool_kw["socket_options"]
+        assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in options
+
+    def test_only_connection_errors_are_retried(self):
+        """Test the adapter leaves request retries to the GCS retry policy"""
+        retries = create_http_adapter().max_retries
+
+        assert retries.connect == gcs_client_module.connect_retries
+        assert retries.read == 0
+        assert retries.status == 0
+
+
+class TestClientStats:
+    """Tests for connection reuse counters"""
+
+    def test_stats_before_client_exists(self):
+        """Test stats are reported before the client is created"""
+        stats = get_client_stats()
+
+        assert stats["initialized"] is False
+        assert stats["requests"] == 0
+        assert stats["reuse_rate"] == 0.0
+
+    def test_reuse_counters(self):
+        """Test reuse is derived from requests and opened connections per host"""
+        adapter = create_http_adapter()
+        pool = MagicMock(num_connections=2, num_requests=10)
+        pool.pool.qsize.return_value = 2
+        adapter.poolmanager.pools = {"storage.googleapis.com": pool}
+
+        with (
+            patch.object(gcs_client_module, "_client", MagicMock()),
+            patch.object(gcs_client_module, "_adapter", adapter),
+        ):
+            stats = get_client_stats()
+
+        assert stats["initialized"] is True
+        assert stats["hosts"] == 1
+        assert stats["connections_opened"] == 2
+        assert stats["reused"] == 8
+        assert stats["reuse_rate"] == 0.8
+        assert stats["idle_connections"] == 2
+
+    @patch("api.utils.gcs_client_utils.storage.Client")
+    def test_reset_closes_connections(self, mock_client_class):
+        """Test resetting the client closes its pooled connections"""
+        get_gcs_client()
+        adapter = gcs_client_module._adapter
+
+        with patch.object(adapter, "close") as mock_close:
+            reset_gcs_client()
+
+        mock_close.assert_called_once()
+        assert gcs_client_module._client is None
+
+    def test_connections_are_reused(self):
+        """Test sequential requests through the adapter share one keep-alive connection"""
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        adapter = create_http_adapter()
+        session = requests.Session()
+        session.mount("http://", adapter)
+        try:
+            for _ in range(5):
+                assert session.get(f"http://127.0.0.1:{server.server_port}/").text == "ok"
+
+            with (
+                patch.object(gcs_client_module, "_client", MagicMock()),
+                patch.object(gcs_client_module, "_adapter", adapter),
+            ):
+                stats = get_client_stats()
+        finally:
+            session.close()
+            server.shutdown()
+
+        assert stats["requests"] == 5
+        assert stats["connections_opened"] == 1
+        assert stats["reused"] == 4
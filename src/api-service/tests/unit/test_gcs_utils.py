@@ -2,41 +2,57 @@
 Unit tests for GCS utilities module
 Tests the GCS bucket, blob, and CSV read/write functions
 """
+
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
 from fastapi import HTTPException
 
-from api.utils.utils import get_gcs_bucket, get_blob, read_csv_from_gcs, write_csv_to_gcs
+from concurrent.futures import ThreadPoolExecutor
+
+from api.utils.utils import (
+    get_gcs_bucket,
+    get_blob,
+    read_csv_from_gcs,
+    write_csv_to_gcs,
+    csv_cache,
+    retry_on_conflict,
+    update_blob,
+    parse_csv_compression,
+    get_csv_encoding,
+)
+from api.utils.storage_utils import MemoryBackend, PreconditionFailedError
 
 
 class TestGetGcsBucket:
     """Tests for the get_gcs_bucket() function"""
 
-    @patch("api.utils.utils.storage.Client")
-    def test_get_gcs_bucket_success(self, mock_client_class):
+    @patch("api.utils.utils.get_gcs_client")
+    def test_get_gcs_bucket_success(self, mock_get_client):
         """Test get_gcs_bucket returns bucket correctly"""
-        mock_client = mock_client_class.return_value
+        mock_client = mock_get_client.return_value
         mock_bucket = MagicMock()
         mock_client.bucket.return_value = mock_bucket
 
         with patch.dict("os.environ", {"GCS_BUCKET_NAME": "test-bucket"}):
             # Reset the cached bucket
             import api.utils.utils as utils_module
+
             utils_module._bucket = None
 
             bucket = get_gcs_bucket()
             assert bucket is mock_bucket
 
-    @patch("api.utils.utils.storage.Client")
-    def test_get_gcs_bucket_uses_env_var(self, mock_client_class):
+    @patch("api.utils.utils.get_gcs_client")
+    def test_get_gcs_bucket_uses_env_var(self, mock_get_client):
         """Test get_gcs_bucket uses GCS_BUCKET_NAME environment variable"""
-        mock_client = mock_client_class.return_value
+        mock_client = mock_get_client.return_value
         mock_bucket = MagicMock()
         mock_client.bucket.return_value = mock_bucket
 
         with patch.dict("os.environ", {"GCS_BUCKET_NAME": "my-custom-bucket"}):
             import api.utils.utils as utils_module
+
             utils_module._bucket = None
 
             get_gcs_bucket()
@@ -46,25 +62,41 @@ class TestGetGcsBucket:
 class TestGetBlob:
     """Tests for the get_blob() function"""
 
+    @pytest.fixture(autouse=True)
+    def reset_name_index(self):
+        """Start every test with an empty name index"""
+        import api.utils.utils as utils_module
+
+        utils_module._name_index.clear()
+        yield
+        utils_module._name_index.clear()
+
+    def make_bucket(self, names):
+        """Create mock bucket holding blobs with the given names"""
+        blobs = {}
+        for name in names:
+            blob = MagicMock()
+            blob.name = name
+            blobs[name] = blob
+
+        mock_bucket = MagicMock()
+        mock_bucket.get_blob.side_effect = lambda name: blobs.get(name)
+        mock_bucket.list_blobs.side_effect = lambda prefix="": [b for n, b in blobs.items() if n.startswith(prefix)]
+        return mock_bucket
+
     def test_get_blob_found(self):
         """Test get_blob returns blob when file exists"""
-        mock_bucket = MagicMock()
-        mock_blob = MagicMock()
-        mock_blob.name = "example.csv"
-        mock_bucket.list_blobs.return_value = [mock_blob]
+        mock_bucket = self.make_bucket(["example.csv"])
 
-        with patch("api.utils.utils.get_gcs_bucket", return_value=mock_bucket):
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
             blob = get_blob("example.csv")
             assert blob.name == "example.csv"
 
     def test_get_blob_not_found(self):
         """Test get_blob raises HTTPException when file doesn't exist"""
-        mock_bucket = MagicMock()
-        mock_blob = MagicMock()
-        mock_blob.name = "other.csv"
-        mock_bucket.list_blobs.return_value = [mock_blob]
+        mock_bucket = self.make_bucket(["other.csv"])
 
-        with patch("api.utils.utils.get_gcs_bucket", return_value=mock_bucket):
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
             with pytest.raises(HTTPException) as e:
                 get_blob("nonexistent.csv")
             assert e.value.status_code == 404
@@ -72,15 +104,70 @@ class TestGetBlob:
 
     def test_get_blob_with_prefix(self):
         """Test get_blob with file path prefix"""
-        mock_bucket = MagicMock()
-        mock_blob = MagicMock()
-        mock_blob.name = "data/users/user123.csv"
-        mock_bucket.list_blobs.return_value = [mock_blob]
+        mock_bucket = self.make_bucket(["data/users/user123.csv"])
 
-        with patch("api.utils.utils.get_gcs_bucket", return_value=mock_bucket):
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
             blob = get_blob("data/users/user123.csv")
             assert blob.name == "data/users/user123.csv"
 
+    def test_get_blob_exact_path_skips_listing(self):
+        """Test get_blob resolves plain paths without listing the bucket"""
+        mock_bucket = self.make_bucket(["data/users/user123.csv", "data/users/user456.csv"])
+
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
+            get_blob("data/users/user123.csv")
+
+        mock_bucket.get_blob.assert_called_once_with("data/users/user123.csv")
+        mock_bucket.list_blobs.assert_not_called()
+
+    def test_get_blob_pattern_lists_prefix_only(self):
+        """Test get_blob lists only the literal prefix of a regex pattern"""
+        mock_bucket = self.make_bucket(["data/users/user123.csv", "models/v2/config.json"])
+
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
+            blob = get_blob(r"data/users/user\d+\.csv")
+
+        assert blob.name == "data/users/user123.csv"
+        mock_bucket.list_blobs.assert_called_once_with(prefix="data/users/user")
+
+    def test_get_blob_pattern_uses_name_index(self):
+        """Test repeated pattern lookups reuse the cached name index"""
+        mock_bucket = self.make_bucket(["data/users/user123.csv"])
+
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
+            get_blob(r"data/users/user\d+\.csv")
+            get_blob(r"data/users/user\d+\.csv")
+
+        assert mock_bucket.list_blobs.call_count == 1
+
+    def test_name_index_is_bounded(self):
+        """Test the least recently used prefixes are evicted from the name index"""
+        import api.utils.utils as utils_module
+
+        mock_bucket = self.make_bucket(["data/users/user123.csv", "data/admins/admin1.csv"])
+
+        with (
+            patch("api.utils.utils.get_storage", return_value=mock_bucket),
+            patch("api.utils.utils.name_index_size", 2),
+        ):
+            get_blob(r"data/users/user\d+\.csv")
+            get_blob(r"data/admins/admin\d+\.csv")
+            get_blob(r"data/users/user\d+\.csv")
+            with pytest.raises(HTTPException):
+                get_blob(r"data/guests/guest\d+\.csv")
+
+        assert list(utils_module._name_index) == ["data/users/user", "data/guests/guest"]
+
+    def test_get_blob_pattern_refreshes_stale_index(self):
+        """Test a pattern miss refreshes the name index before giving up"""
+        mock_bucket = self.make_bucket(["data/users/user123.csv"])
+
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
+            with pytest.raises(HTTPException):
+                get_blob(r"data/users/admin\d+\.csv")
+
+        assert mock_bucket.list_blobs.call_count == 2
+
 
 class TestReadCsvFromGcs:
     """Tests for the read_csv_from_gcs() function"""
@@ -200,5 +287,177 @@ class TestWriteCsvToGcs:
         mock_blob.upload_from_string.assert_called_once_with(expected_csv, content_type="text/csv")
 
 
+class TestCsvCache:
+    """Tests for the generation-validated CSV cache in read_csv_from_gcs()/write_csv_to_gcs()"""
+
+    @pytest.fixture(autouse=True)
+    def reset_cache(self):
+        csv_cache.clear()
+        yield
+        csv_cache.clear()
+
+    def test_read_hit_skips_download(self):
+        """Test unchanged objects are parsed only once"""
+        storage = MemoryBackend()
+        storage.put("data/a.csv", b"col1\n1\n")
+
+        with patch.object(storage, "get", wraps=storage.get) as mock_get:
+            read_csv_from_gcs(storage.get_blob("data/a.csv"))
+            df = read_csv_from_gcs(storage.get_blob("data/a.csv"))
+
+        assert mock_get.call_count == 1
+        assert df.iloc[0]["col1"] == 1
+        assert csv_cache.stats()["hits"] == 1
+
+    def test_read_after_external_write_reloads(self):
+        """Test a new object generation is never served from the cache"""
+        storage = MemoryBackend()
+        storage.put("data/a.csv", b"col1\n1\n")
+        read_csv_from_gcs(storage.get_blob("data/a.csv"))
+
+        storage.put("data/a.csv", b"col1\n2\n")
+        df = read_csv_from_gcs(storage.get_blob("data/a.csv"))
+
+        assert df.iloc[0]["col1"] == 2
+        assert csv_cache.stats()["invalidations"] == 1
+
+    def test_write_updates_cache(self):
+        """Test writes cache the new generation so the next read needs no download"""
+        storage = MemoryBackend()
+        write_csv_to_gcs(storage.blob("data/a.csv"), pd.DataFrame({"col1": [1.0, float("inf")]}))
+
+        with patch.object(storage, "get", wraps=storage.get) as mock_get:
+            df = read_csv_from_gcs(storage.get_blob("data/a.csv"))
+
+        mock_get.assert_not_called()
+        assert df.iloc[0]["col1"] == 1.0
+        assert df.iloc[1]["col1"] is None
+
+    def test_cached_frame_is_not_shared(self):
+        """Test modifying a returned DataFrame does not corrupt the cache"""
+        storage = MemoryBackend()
+        storage.put("data/a.csv", b"col1\n1\n")
+
+        df = read_csv_from_gcs(storage.get_blob("data/a.csv"))
+        df["col1"] = 99
+        df = read_csv_from_gcs(storage.get_blob("data/a.csv"))
+
+        assert df.iloc[0]["col1"] == 1
+
+    def test_reload_when_generation_unknown(self):
+        """Test handles without metadata are reloaded before the cache lookup"""
+        storage = MemoryBackend()
+        storage.put("data/a.csv", b"col1\n1\n")
+
+        df = read_csv_from_gcs(storage.blob("data/a.csv"))
+        assert df.iloc[0]["col1"] == 1
+
+
+class TestConditionalWrites:
+    """Tests for optimistic-concurrency helpers"""
+
+    def test_retry_on_conflict_retries(self):
+        """Test attempts failing with a write conflict are retried"""
+        calls = []
+
+        def attempt():
+            calls.append(1)
+            if len(calls) < 3:
+                raise PreconditionFailedError("a.csv")
+            return "done"
+
+        assert retry_on_conflict(attempt, retries=5) == "done"
+        assert len(calls) == 3
+
+    def test_retry_on_conflict_gives_up(self):
+        """Test a 409 error is raised once retries are exhausted"""
+
+        def attempt():
+            raise PreconditionFailedError("a.csv")
+
+        with pytest.raises(HTTPException) as exc_info:
+            retry_on_conflict(attempt, retries=2)
+        assert exc_info.value.status_code == 409
+
+    def test_update_blob_rereads_after_conflict(self):
+        """Test a concurrent write is merged instead of overwritten"""
+        storage = MemoryBackend()
+        storage.put("list.txt", b"user1")
+
+        def add_user2(content):
+            if "user3" not in content:
+                # Another request writes between our read and our write
+                storage.put("list.txt", content.encode() + b"\nuser3")
+            return content + "\nuser2", None
+
+        update_blob(storage.blob("list.txt"), add_user2)
+
+        assert storage.get("list.txt").decode().split("\n") == ["user1", "user3", "user2"]
+
+    def test_update_blob_concurrent_updates(self):
+        """Test no update is lost when many threads update the same object"""
+        storage = MemoryBackend()
+        storage.put("list.txt", b"")
+
+        def add(i):
+            update_blob(storage.blob("list.txt"), lambda content: (content + f"{i}\n", None), retries=100)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(add, range(20)))
+
+        assert sorted(storage.get("list.txt").decode().split()) == sorted(str(i) for i in range(20))
+
+    def test_write_csv_precondition(self):
+        """Test write_csv_to_gcs passes the generation precondition"""
+        storage = MemoryBackend()
+        df = pd.DataFrame({"col1": [1]})
+        write_csv_to_gcs(storage.blob("a.csv"), df, if_generation_match=0)
+
+        with pytest.raises(PreconditionFailedError):
+            write_csv_to_gcs(storage.blob("a.csv"), df, if_generation_match=0)
+
+
+class TestCsvCompression:
+    """Tests for compressed CSV objects"""
+
+    def test_parse_csv_compression(self):
+        """Test per-family settings and a default for every CSV object"""
+        compression = parse_csv_compression("data/meal_history/=gzip, data/health_report/=none")
+        assert compression == {"data/meal_history/": "gzip", "data/health_report/": None}
+        assert parse_csv_compression("gzip") == {"": "gzip"}
+        assert parse_csv_compression("") == {}
+
+    def test_parse_unknown_compression(self):
+        """Test unknown encodings are rejected"""
+        with pytest.raises(ValueError):
+            parse_csv_compression("data/=brotli")
+
+    def test_zstd_falls_back_to_gzip(self):
+        """Test zstd falls back to gzip without the zstandard package"""
+        with patch("api.utils.storage_utils.zstandard", None):
+            assert parse_csv_compression("zstd") == {"": "gzip"}
+
+    def test_longest_prefix_wins(self):
+        """Test the most specific family setting is used"""
+        compression = {"": "gzip", "data/meal_history/segments/": None}
+        with patch("api.utils.utils.csv_compression", compression):
+            assert get_csv_encoding("data/meal_history/segments/user1/1.csv") is None
+            assert get_csv_encoding("data/health_report/health_report_user1.csv") == "gzip"
+
+    def test_write_and_read_compressed_csv(self):
+        """Test compressed CSV objects are read back transparently"""
+        storage = MemoryBackend()
+        df = pd.DataFrame({"col1": ["garlic"] * 50, "col2": range(50)})
+
+        with patch("api.utils.utils.csv_compression", {"data/": "gzip"}):
+            write_csv_to_gcs(storage.blob("data/a.csv"), df)
+
+        blob = storage.get_blob("data/a.csv")
+        assert blob.content_encoding == "gzip"
+        assert blob.size < len(df.to_csv(index=False))
+        csv_cache.clear()
+        pd.testing.assert_frame_equal(read_csv_from_gcs(blob), df)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,59 @@
+"""
+Unit tests for conditional GET helpers
+"""
+
+from datetime import datetime, timezone
+
+from starlette.requests import Request
+
+from api.utils.http_cache_utils import make_etag, get_validator_headers, is_not_modified
+
+
+updated = datetime(2025, 1, 2, 3, 4, 5, 600000, tzinfo=timezone.utc)
+
+
+def make_request(**headers):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    }
+    return Request(scope)
+
+
+class TestHttpCacheUtils:
+    """Tests for ETag / Last-Modified helpers"""
+
+    def test_make_etag(self):
+        """Test ETags are quoted, deterministic and change with any part"""
+        etag = make_etag("a.parquet", 1, 1)
+        assert etag.startswith('"') and etag.endswith('"')
+        assert etag == make_etag("a.parquet", 1, 1)
+        assert etag != make_etag("a.parquet", 2, 1)
+
+    def test_validator_headers(self):
+        """Test Last-Modified is an HTTP date and clients must revalidate"""
+        headers = get_validator_headers('"abc"', updated)
+        assert headers["ETag"] == '"abc"'
+        assert headers["Last-Modified"] == "Thu, 02 Jan 2025 03:04:05 GMT"
+        assert headers["Cache-Control"] == "private, no-cache"
+        assert "Last-Modified" not in get_validator_headers('"abc"', None)
+
+    def test_if_none_match(self):
+        """Test If-None-Match matches any listed ETag, including weak ones and *"""
+        assert is_not_modified(make_request(if_none_match='"x", W/"abc"'), '"abc"')
+        assert is_not_modified(make_request(if_none_match="*"), '"abc"')
+        assert not is_not_modified(make_request(if_none_match='"x"'), '"abc"')
+        assert not is_not_modified(make_request(), '"abc"')
+
+    def test_if_none_match_takes_precedence(self):
+        """Test If-Modified-Since is ignored when If-None-Match is present"""
+        request = make_request(if_none_match='"x"', if_modified_since="Thu, 02 Jan 2025 03:04:05 GMT")
+        assert not is_not_modified(request, '"abc"', updated)
+
+    def test_if_modified_since(self):
+        """Test If-Modified-Since compares at one second resolution"""
+        assert is_not_modified(make_request(if_modified_since="Thu, 02 Jan 2025 03:04:05 GMT"), '"abc"', updated)
+        assert not is_not_modified(make_request(if_modified_since="Thu, 02 Jan 2025 03:04:04 GMT"), '"abc"', updated)
+        assert not is_not_modified(make_request(if_modified_since="yesterday"), '"abc"', updated)
@@ -0,0 +1,231 @@
+"""
+Unit tests for inference micro-batching
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.utils.inference_utils import AdmissionGate, BatchingScheduler, InferenceOverloadedError
+
+
+class RecordingBatch:
+    """Batch function that records the batches it receives"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self.threads = set()
+
+    def __call__(self, items: list) -> list:
+        self.batches.append(list(items))
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return [item * 2 for item in items]
+
+
+class TestBatchingScheduler:
+    """Tests for BatchingScheduler"""
+
+    @pytest.mark.asyncio
+    async def test_submit_returns_own_result(self):
+        """Test every submitter gets the result for its own item"""
+        run_batch = RecordingBatch()
+        scheduler = BatchingScheduler(run_batch, max_batch_size=16, max_wait=0.01)
+
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(10)))
+
+        assert results == [i * 2 for i in range(10)]
+        assert threading.get_ident() not in run_batch.threads
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_items_share_a_batch(self):
+        """Test items submitted together are run in one batch"""
+        run_batch = RecordingBatch()
+        scheduler = BatchingScheduler(run_batch, max_batch_size=16, max_wait=0.05)
+
+        await asyncio.gather(*(scheduler.submit(i) for i in range(8)))
+
+        assert run_batch.batches == [list(range(8))]
+        stats = scheduler.stats()
+        assert stats["batches"] == 1
+        assert stats["items"] == 8
+        assert stats["avg_batch_size"] == 8
+        assert stats["batch_sizes"] == {8: 1}
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_batches_are_capped_at_max_batch_size(self):
+        """Test a full batch runs without waiting for more items"""
+        run_batch = RecordingBatch()
+        scheduler = BatchingScheduler(run_batch, max_batch_size=4, max_wait=1.0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(scheduler.submit(i) for i in range(8)))
+
+        assert [len(batch) for batch in run_batch.batches] == [4, 4]
+        assert time.perf_counter() - start < 0.5
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_partial_batch_runs_after_max_wait(self):
+        """Test a lone item runs once max_wait has passed"""
+        run_batch = RecordingBatch()
+        scheduler = BatchingScheduler(run_batch, max_batch_size=16, max_wait=0.05)
+
+        start = time.perf_counter()
+        assert await scheduler.submit(1) == 2
+
+        assert 0.04 <= time.perf_counter() - start < 0.5
+        assert scheduler.stats()["max_queue_wait_ms"] >= 40
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_items_arriving_during_a_batch_form_the_next_batch(self):
+        """Test items queue up while a batch is running"""
+        run_batch = RecordingBatch(delay=0.05)
+        scheduler = BatchingScheduler(run_batch, max_batch_size=16, max_wait=0)
+
+        first = asyncio.ensure_future(scheduler.submit(0))
+        await asyncio.sleep(0.01)
+        rest = await asyncio.gather(*(scheduler.submit(i) for i in range(1, 6)))
+
+        assert await first == 0
+        assert rest == [2, 4, 6, 8, 10]
+        assert run_batch.batches == [[0], [1, 2, 3, 4, 5]]
+        assert scheduler.stats()["peak_queue_depth"] >= 5
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_batch_failure_propagates_to_every_item(self):
+        """Test an exception in the batch function is raised to every submitter"""
+
+        def run_batch(items):
+            raise ValueError("bad batch")
+
+        scheduler = BatchingScheduler(run_batch, max_batch_size=16, max_wait=0.01)
+
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert scheduler.stats()["failed_batches"] == 1
+
+        # The worker keeps serving later batches
+        scheduler.run_batch = RecordingBatch()
+        assert await scheduler.submit(2) == 4
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_wrong_result_count_is_an_error(self):
+        """Test a batch function returning the wrong number of results fails the batch"""
+        scheduler = BatchingScheduler(lambda items: items[:1], max_batch_size=16, max_wait=0.01)
+
+        with pytest.raises(RuntimeError):
+            await asyncio.gather(scheduler.submit(1), scheduler.submit(2))
+        scheduler.shutdown()
+
+    def test_worker_restarts_on_new_event_loop(self):
+        """Test the scheduler works across event loops (one per test client request)"""
+        scheduler = BatchingScheduler(RecordingBatch(), max_batch_size=16, max_wait=0.01)
+
+        assert asyncio.run(scheduler.submit(1)) == 2
+        assert asyncio.run(scheduler.submit(2)) == 4
+        assert scheduler.stats()["batches"] == 2
+        scheduler.shutdown()
+
+    def test_stats_before_first_item(self):
+        """Test stats are available before the worker starts"""
+        scheduler = BatchingScheduler(RecordingBatch(), max_batch_size=8, max_wait=0.02)
+
+        stats = scheduler.stats()
+
+        assert stats["max_batch_size"] == 8
+        assert stats["max_wait_ms"] == pytest.approx(20)
+        assert stats["queue_depth"] == 0
+        assert stats["avg_batch_size"] == 0.0
+        scheduler.shutdown()
+
+    def test_submit_after_shutdown_restarts(self):
+        """Test the scheduler serves requests again after an app shutdown"""
+        scheduler = BatchingScheduler(RecordingBatch(), max_batch_size=16, max_wait=0.01)
+
+        assert asyncio.run(scheduler.submit(1)) == 2
+        scheduler.shutdown()
+        assert asyncio.run(scheduler.submit(3)) == 6
+        scheduler.shutdown()
+
+
+class TestAdmissionGate:
+    """Tests for AdmissionGate"""
+
+    def test_admits_up_to_max_in_flight(self):
+        """Test requests beyond max_in_flight are rejected and counted"""
+        gate = AdmissionGate(max_in_flight=2)
+
+        with gate.admit(), gate.admit():
+            with pytest.raises(InferenceOverloadedError) as exc_info:
+                with gate.admit():
+                    pass
+            assert gate.stats()["in_flight"] == 2
+
+        assert exc_info.value.retry_after >= 1
+        stats = gate.stats()
+        assert stats["in_flight"] == 0
+        assert stats["peak_in_flight"] == 2
+        assert stats["admitted"] == 2
+        assert stats["rejected"] == 1
+
+    def test_admit_holds_one_slot_per_image(self):
+        """Test a multi-image request is admitted only if all its images fit"""
+        gate = AdmissionGate(max_in_flight=4)
+
+        with gate.admit(3):
+            with pytest.raises(InferenceOverloadedError):
+                with gate.admit(2):
+                    pass
+            with gate.admit(1):
+                assert gate.stats()["in_flight"] == 4
+
+        assert gate.stats()["in_flight"] == 0
+        assert gate.stats()["rejected"] == 2
+
+    def test_slot_is_released_on_error(self):
+        """Test an exception inside the block frees its slot"""
+        gate = AdmissionGate(max_in_flight=1)
+
+        with pytest.raises(ValueError):
+            with gate.admit():
+                raise ValueError("bad image")
+
+        with gate.admit():
+            assert gate.stats()["in_flight"] == 1
+
+    def test_retry_after_follows_latency(self):
+        """Test the Retry-After hint is the recent in-flight time, rounded up to seconds"""
+        gate = AdmissionGate(max_in_flight=1)
+        assert gate.retry_after() == 1
+
+        gate.avg_latency = 2.3
+        assert gate.retry_after() == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_bounded(self):
+        """Test concurrent async requests hold slots until they finish"""
+        gate = AdmissionGate(max_in_flight=3)
+
+        async def request():
+            try:
+                with gate.admit():
+                    await asyncio.sleep(0.02)
+                    return "ok"
+            except InferenceOverloadedError:
+                return "rejected"
+
+        results = await asyncio.gather(*(request() for _ in range(5)))
+
+        assert results.count("ok") == 3
+        assert results.count("rejected") == 2
+        assert gate.stats()["avg_latency_ms"] >= 15
@@ -0,0 +1,73 @@
+"""
+Unit tests for JSON serialization of tables
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from api.utils.json_utils import DataFrameJSONResponse, dataframe_to_records, dumps
+
+
+def reference_records(df):
+    """Previous serialization: to_dict plus a per-cell NaN/Inf scrub"""
+    records = df.to_dict(orient="records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, float) and (np.isnan(value) or np.isinf(value)):
+                record[key] = None
+    return records
+
+
+class TestJsonUtils:
+    """Tests for DataFrame records serialization"""
+
+    def test_non_finite_values_become_null(self):
+        """Test NaN, Inf and missing values are serialized as null in every column type"""
+        df = pd.DataFrame(
+            {
+                "odds_ratio": [2.5, np.inf, -np.inf, np.nan],
+                "p_value": pd.Series([0.01, None, 0.2, 0.3], dtype=object),
+                "ingredient": ["garlic", None, np.nan, "onion"],
+                "count": [1, 2, 3, 4],
+                "significant": [True, False, True, False],
+                "nullable": pd.array([1, None, 3, None], dtype="Int64"),
+            }
+        )
+
+        records = json.loads(dumps(df))
+
+        assert [r["odds_ratio"] for r in records] == [2.5, None, None, None]
+        assert [r["p_value"] for r in records] == [0.01, None, 0.2, 0.3]
+        assert [r["ingredient"] for r in records] == ["garlic", None, None, "onion"]
+        assert [r["count"] for r in records] == [1, 2, 3, 4]
+        assert [r["significant"] for r in records] == [True, False, True, False]
+        assert [r["nullable"] for r in records] == [1, None, 3, None]
+
+    def test_matches_previous_serialization(self):
+        """Test records equal the previous to_dict + scrub output"""
+        df = pd.DataFrame(
+            {
+                "date_time": ["2025-01-01T12:00:00", "2025-01-02T12:00:00"],
+                "dish_confidence": [0.9, float("nan")],
+                "symptoms": ["bloating", None],
+            }
+        )
+        assert dataframe_to_records(df) == reference_records(df)
+
+    def test_datetimes_and_empty_frames(self):
+        """Test datetime columns are ISO strings and empty frames are empty lists"""
+        df = pd.DataFrame({"t": pd.to_datetime(["2025-01-01 12:00", None])})
+
+        assert json.loads(dumps(df)) == [{"t": "2025-01-01T12:00:00.000000"}, {"t": None}]
+        assert dumps(pd.DataFrame()) == b"[]"
+
+    def test_response(self):
+        """Test the response renders DataFrames and plain content"""
+        response = DataFrameJSONResponse(pd.DataFrame({"a": [1.0, np.inf]}), headers={"ETag": '"x"'})
+
+        assert response.body == b'[{"a":1.0},{"a":null}]'
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["etag"] == '"x"'
+        assert DataFrameJSONResponse({"status": "ok"}).body == b'{"status":"ok"}'
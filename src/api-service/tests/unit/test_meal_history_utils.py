@@ -0,0 +1,390 @@
+"""
+Unit tests for the append-only meal history log
+"""
+
+import io
+import json
+import threading
+
+import pytest
+import pandas as pd
+from fastapi import HTTPException
+from unittest.mock import patch
+
+import api.utils.utils as utils_module
+import api.utils.meal_history_utils as meal_history_module
+from api.utils.storage_utils import MemoryBackend
+from api.utils.table_utils import write_table
+from api.utils.buffer_utils import WriteBuffer
+from api.utils.meal_history_utils import (
+    meal_history_columns,
+    meal_history_schema,
+    get_meal_history_path,
+    list_segments,
+    append_meal,
+    read_meal_history,
+    compact_meal_history,
+    compact_meal_history_if_needed,
+    write_segment,
+    paginate_meal_history,
+    get_meal_history_version,
+    iter_meal_history_export,
+)
+
+
+@pytest.fixture
+def storage():
+    """Create an in-memory storage backend holding an empty meal history for user1"""
+    original = utils_module._storage
+    utils_module._storage = MemoryBackend()
+    utils_module.csv_cache.clear()
+    write_table(get_meal_history_path("user1"), pd.DataFrame(columns=meal_history_columns), meal_history_schema)
+    yield utils_module._storage
+    utils_module._storage = original
+    utils_module.csv_cache.clear()
+
+
+def make_meal(i, symptoms=""):
+    return {
+        "date_time": f"2025-01-{i:02d}T12:00:00",
+        "dish": f"dish{i}",
+        "dish_confidence": 0.9,
+        "dish_fodmap": "high",
+        "ingredients": "garlic, onion",
+        "ingredients_fodmap_high": "garlic, onion",
+        "ingredients_fodmap_low": "",
+        "ingredients_fodmap_none": "",
+        "symptoms": symptoms,
+    }
+
+
+class TestAppendMeal:
+    """Tests for append_meal()"""
+
+    def test_append_writes_segment_only(self, storage):
+        """Test logging a meal never reads or rewrites the base file"""
+        base_path = get_meal_history_path("user1") + ".parquet"
+        base_generation = storage.stat(base_path).generation
+
+        with patch.object(storage, "get", wraps=storage.get) as mock_get:
+            append_meal("user1", make_meal(1))
+
+        mock_get.assert_not_called()
+        assert storage.stat(base_path).generation == base_generation
+        assert len(list_segments("user1")) == 1
+
+    def test_read_merges_segments_in_order(self, storage):
+        """Test readers see base rows followed by segments in append order"""
+        for i in range(1, 4):
+            append_meal("user1", make_meal(i))
+
+        df = read_meal_history("user1")
+        assert list(df["dish"]) == ["dish1", "dish2", "dish3"]
+        assert list(df.columns) == meal_history_columns
+
+    def test_concurrent_appends_are_not_lost(self, storage):
+        """Test parallel writers each keep their row"""
+        threads = [threading.Thread(target=append_meal, args=("user1", make_meal(i))) for i in range(1, 21)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(read_meal_history("user1")) == 20
+
+    def test_read_latest_meals(self, storage):
+        """Test last N and since select the latest meals across base file and segments"""
+        with patch("api.utils.table_utils.table_format", "csv"):
+            for i in range(1, 6):
+                append_meal("user1", make_meal(i))
+            compact_meal_history("user1")
+        append_meal("user1", make_meal(6))
+
+        assert list(read_meal_history("user1", last=3)["dish"]) == ["dish4", "dish5", "dish6"]
+        assert list(read_meal_history("user1", since="2025-01-05")["dish"]) == ["dish5", "dish6"]
+        assert list(read_meal_history("user1", last=3).columns) == meal_history_columns
+
+    def test_segments_are_per_user(self, storage):
+        """Test users with a common ID prefix do not see each other's segments"""
+        append_meal("user1", make_meal(1))
+        append_meal("user10", make_meal(2))
+        assert len(list_segments("user1")) == 1
+
+
+class TestCompaction:
+    """Tests for compact_meal_history()"""
+
+    def test_compaction_merges_and_deletes_segments(self, storage):
+        """Test compaction folds segments into the base file"""
+        for i in range(1, 4):
+            append_meal("user1", make_meal(i, symptoms="bloating"))
+
+        assert compact_meal_history("user1") == 3
+        assert list_segments("user1") == []
+
+        df = read_meal_history("user1")
+        assert list(df["dish"]) == ["dish1", "dish2", "dish3"]
+        assert "segment_id" not in df.columns
+
+    def test_append_after_compaction(self, storage):
+        """Test new segments are merged after the compacted rows"""
+        append_meal("user1", make_meal(1))
+        compact_meal_history("user1")
+        append_meal("user1", make_meal(2))
+
+        assert list(read_meal_history("user1")["dish"]) == ["dish1", "dish2"]
+
+    def test_merged_segments_not_counted_twice(self, storage):
+        """Test segments left behind after a compaction are ignored by readers"""
+        append_meal("user1", make_meal(1))
+
+        # Simulate a crash between the base write and the segment deletes
+        with patch("api.utils.storage_utils.StorageBlob.delete", side_effect=RuntimeError("crash")):
+            with pytest.raises(RuntimeError):
+                compact_meal_history("user1")
+
+        assert len(list_segments("user1")) == 1
+        assert len(read_meal_history("user1")) == 1
+
+        compact_meal_history("user1")
+        assert list_segments("user1") == []
+        assert len(read_meal_history("user1")) == 1
+
+    @pytest.mark.parametrize("fmt", ["parquet", "csv"])
+    def test_merged_segments_not_counted_twice_in_tail(self, storage, fmt):
+        """Test tail reads ignore left-behind segments merged into rows before the tail"""
+        with patch("api.utils.table_utils.table_format", fmt):
+            storage.delete(get_meal_history_path("user1") + ".parquet")
+            write_table(get_meal_history_path("user1"), pd.DataFrame(columns=meal_history_columns), meal_history_schema)
+            for i in range(1, 6):
+                append_meal("user1", make_meal(i))
+
+            # Simulate a crash between the base write and the segment deletes
+            with patch("api.utils.storage_utils.StorageBlob.delete", side_effect=RuntimeError("crash")):
+                with pytest.raises(RuntimeError):
+                    compact_meal_history("user1")
+
+        assert storage.exists(f"{get_meal_history_path('user1')}.{fmt}")
+        assert len(list_segments("user1")) == 5
+        assert list(read_meal_history("user1", last=1)["dish"]) == ["dish5"]
+        assert list(read_meal_history("user1", last=2)["dish"]) == ["dish4", "dish5"]
+        assert list(read_meal_history("user1", since="2025-01-04T00:00:00")["dish"]) == ["dish4", "dish5"]
+
+    def test_concurrent_compactions_do_not_drop_segments(self, storage):
+        """Test a compaction based on a stale base file is retried instead of overwriting"""
+        load_meal_log = meal_history_module.load_meal_log
+        append_meal("user1", make_meal(1))
+        interleaved = []
+
+        def load_then_interleave(user_id):
+            result = load_meal_log(user_id)
+            if not interleaved:
+                # Another worker logs a meal and compacts between our read and our write
+                interleaved.append(True)
+                append_meal(user_id, make_meal(2))
+                compact_meal_history(user_id)
+            return result
+
+        with (
+            patch("api.utils.meal_history_utils.load_meal_log", side_effect=load_then_interleave),
+            patch("api.utils.meal_history_utils._compaction_locks", [threading.RLock()]),
+        ):
+            assert compact_meal_history("user1") == 0
+
+        assert list(read_meal_history("user1")["dish"]) == ["dish1", "dish2"]
+
+    def test_compact_if_needed_threshold(self, storage):
+        """Test compaction only runs once the segment threshold is reached"""
+        with patch("api.utils.meal_history_utils.compaction_threshold", 3):
+            append_meal("user1", make_meal(1))
+            append_meal("user1", make_meal(2))
+            assert compact_meal_history_if_needed("user1") == 0
+
+            append_meal("user1", make_meal(3))
+            assert compact_meal_history_if_needed("user1") == 3
+
+    def test_legacy_base_file(self, storage):
+        """Test histories written before segments existed are still readable"""
+        storage.delete(get_meal_history_path("user1") + ".parquet")
+        storage.put(get_meal_history_path("user1") + ".csv", b"date_time,dish\n2024-12-31T12:00:00,soup\n")
+        append_meal("user1", make_meal(1))
+
+        assert list(read_meal_history("user1")["dish"]) == ["soup", "dish1"]
+
+    def test_compaction_migrates_legacy_base_file(self, storage):
+        """Test compacting a CSV base file rewrites it as Parquet"""
+        storage.delete(get_meal_history_path("user1") + ".parquet")
+        storage.put(get_meal_history_path("user1") + ".csv", b"date_time,dish\n2024-12-31T12:00:00,soup\n")
+        append_meal("user1", make_meal(1))
+
+        compact_meal_history("user1")
+
+        assert not storage.exists(get_meal_history_path("user1") + ".csv")
+        assert storage.exists(get_meal_history_path("user1") + ".parquet")
+        assert list(read_meal_history("user1")["dish"]) == ["soup", "dish1"]
+
+
+class TestMealWriteBuffer:
+    """Tests for write-behind buffering of logged meals"""
+
+    @pytest.fixture
+    def buffer(self, storage):
+        buffer = WriteBuffer(60, write_segment)
+        with patch("api.utils.meal_history_utils.meal_write_buffer", buffer):
+            yield buffer
+
+    def test_burst_is_written_as_one_segment(self, storage, buffer):
+        """Test meals logged within the window produce a single write"""
+        for i in range(1, 6):
+            assert append_meal("user1", make_meal(i)) is None
+        assert list_segments("user1") == []
+
+        buffer.flush_all()
+
+        assert len(list_segments("user1")) == 1
+        assert list(read_meal_history("user1")["dish"]) == [f"dish{i}" for i in range(1, 6)]
+
+    def test_read_sees_buffered_meals(self, storage, buffer):
+        """Test reads flush the user's buffer first"""
+        append_meal("user1", make_meal(1))
+        append_meal("user1", make_meal(2))
+
+        assert list(read_meal_history("user1")["dish"]) == ["dish1", "dish2"]
+        assert buffer.stats()["pending_items"] == 0
+
+    def test_compaction_includes_buffered_meals(self, storage, buffer):
+        """Test compaction folds buffered meals into the base file"""
+        append_meal("user1", make_meal(1))
+
+        assert compact_meal_history("user1") == 1
+        assert list(read_meal_history("user1")["dish"]) == ["dish1"]
+
+
+class TestPagination:
+    """Tests for paginate_meal_history()"""
+
+    def make_history(self, days):
+        return pd.DataFrame([make_meal(i) for i in days])
+
+    def test_pages_follow_date_time_order(self):
+        """Test pages are ordered by date_time and cover every meal once"""
+        df = self.make_history([3, 1, 2, 5, 4])
+
+        page, cursor = paginate_meal_history(df, limit=2)
+        assert list(page["dish"]) == ["dish1", "dish2"]
+        page, cursor = paginate_meal_history(df, limit=2, cursor=cursor)
+        assert list(page["dish"]) == ["dish3", "dish4"]
+        page, cursor = paginate_meal_history(df, limit=2, cursor=cursor)
+        assert list(page["dish"]) == ["dish5"]
+        assert cursor is None
+
+    def test_same_date_time_keeps_log_order(self):
+        """Test meals logged at the same time are split across pages without repeats"""
+        df = pd.DataFrame([dict(make_meal(1), dish=f"meal{i}") for i in range(3)])
+
+        page, cursor = paginate_meal_history(df, limit=2)
+        assert list(page["dish"]) == ["meal0", "meal1"]
+        page, cursor = paginate_meal_history(df, limit=2, cursor=cursor)
+        assert list(page["dish"]) == ["meal2"]
+
+    def test_cursor_survives_new_meals(self):
+        """Test meals logged after a page was read do not shift the next page"""
+        df = self.make_history([1, 2, 3])
+        _, cursor = paginate_meal_history(df, limit=1)
+
+        df = pd.concat([df, self.make_history([4])], ignore_index=True)
+        page, _ = paginate_meal_history(df, limit=2, cursor=cursor)
+        assert list(page["dish"]) == ["dish2", "dish3"]
+
+    def test_until(self):
+        """Test until excludes meals logged at or after the timestamp"""
+        page, cursor = paginate_meal_history(self.make_history([1, 2, 3]), until="2025-01-03")
+        assert list(page["dish"]) == ["dish1", "dish2"]
+        assert cursor is None
+
+        page, _ = paginate_meal_history(self.make_history([1, 2, 3]), until="2025-01-03T02:00:00+02:00")
+        assert list(page["dish"]) == ["dish1", "dish2"]
+
+    def test_invalid_cursor(self):
+        """Test malformed cursors are rejected with 400"""
+        with pytest.raises(HTTPException) as exc_info:
+            paginate_meal_history(self.make_history([1]), limit=1, cursor="not-a-cursor")
+        assert exc_info.value.status_code == 400
+
+
+class TestMealHistoryVersion:
+    """Tests for meal history ETags"""
+
+    def test_version_matches_read(self, storage):
+        """Test the metadata-only version equals the version of the rows read"""
+        append_meal("user1", make_meal(1))
+
+        assert read_meal_history("user1").attrs["version"] == get_meal_history_version("user1")
+
+    def test_version_changes_on_append_and_compaction(self, storage):
+        """Test every write to the base file or segments produces a new ETag"""
+        etags = {get_meal_history_version("user1")[0]}
+        append_meal("user1", make_meal(1))
+        etags.add(get_meal_history_version("user1")[0])
+        compact_meal_history("user1")
+        etags.add(get_meal_history_version("user1")[0])
+
+        assert len(etags) == 3
+
+    def test_version_includes_buffered_meals(self, storage):
+        """Test buffered meals are written before the version is computed"""
+        etag = get_meal_history_version("user1")[0]
+        buffer = WriteBuffer(60, write_segment)
+        with patch.object(meal_history_module, "meal_write_buffer", buffer):
+            append_meal("user1", make_meal(1))
+            assert get_meal_history_version("user1")[0] != etag
+
+
+class TestExport:
+    """Tests for iter_meal_history_export()"""
+
+    def log_meals(self):
+        for i in range(1, 6):
+            append_meal("user1", make_meal(i))
+        compact_meal_history("user1")
+        append_meal("user1", make_meal(6))
+
+    def test_ndjson(self, storage):
+        """Test every meal is exported once, in log order, in chunks"""
+        self.log_meals()
+
+        with patch.object(meal_history_module, "export_chunk_rows", 2):
+            chunks = list(iter_meal_history_export("user1", "ndjson"))
+
+        records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+        assert [r["dish"] for r in records] == [f"dish{i}" for i in range(1, 7)]
+        assert list(records[0]) == meal_history_columns
+        assert len(chunks) == 4
+
+    def test_csv(self, storage):
+        """Test the CSV export has one header line and matches the history"""
+        self.log_meals()
+
+        content = b"".join(iter_meal_history_export("user1", "csv")).decode()
+
+        lines = content.splitlines()
+        assert lines[0] == ",".join(meal_history_columns)
+        assert len(lines) == 7
+        df = pd.read_csv(io.StringIO(content))
+        assert list(df["dish"]) == [f"dish{i}" for i in range(1, 7)]
+
+    def test_merged_segments_not_repeated(self, storage):
+        """Test segments already folded into the base file (but not deleted yet) are exported once"""
+        self.log_meals()
+        segment = list_segments("user1")[0]
+        content = storage.get(segment.name)
+        compact_meal_history("user1")
+        storage.put(segment.name, content)
+
+        records = [json.loads(line) for chunk in iter_meal_history_export("user1") for line in chunk.splitlines()]
+        assert [r["dish"] for r in records] == [f"dish{i}" for i in range(1, 7)]
+
+    def test_empty_history(self, storage):
+        """Test an empty history exports only the CSV header"""
+        assert list(iter_meal_history_export("user1", "ndjson")) == []
+        assert list(iter_meal_history_export("user1", "csv")) == [(",".join(meal_history_columns) + "\n").encode()]
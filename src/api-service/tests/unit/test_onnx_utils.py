@@ -0,0 +1,109 @@
+"""
+Unit tests for the ONNX Runtime classifier backend
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from api.utils.onnx_utils import OnnxImageClassifier, export_onnx, onnx_file_name  # noqa: E402
+
+
+@pytest.fixture
+def model_path(tiny_vit_checkpoint):
+    """Tiny ViT checkpoint exported to ONNX"""
+    export_onnx(tiny_vit_checkpoint)
+    return tiny_vit_checkpoint
+
+
+class TestExportOnnx:
+    """Tests for export_onnx"""
+
+    def test_export_is_cached(self, model_path):
+        """Test an up-to-date export is reused"""
+        onnx_path = Path(model_path) / onnx_file_name
+        mtime = onnx_path.stat().st_mtime_ns
+
+        assert export_onnx(model_path) == str(onnx_path)
+        assert onnx_path.stat().st_mtime_ns == mtime
+
+    def test_newer_checkpoint_is_reexported(self, model_path):
+        """Test the export is redone when the checkpoint is newer than it"""
+        onnx_path = Path(model_path) / onnx_file_name
+        stale_time = (Path(model_path) / "model.safetensors").stat().st_mtime - 10
+        os.utime(onnx_path, (stale_time, stale_time))
+
+        export_onnx(model_path)
+
+        assert onnx_path.stat().st_mtime > stale_time
+        assert not list(Path(model_path).glob(".tmp-*"))
+
+    def test_each_export_writes_its_own_temporary_file(self, tiny_vit_checkpoint):
+        """Test workers exporting at the same time never write into the same temporary file"""
+        written = []
+
+        def fake_export(model, args, path, **kwargs):
+            written.append(path)
+            Path(path).write_bytes(b"onnx")
+
+        with patch("torch.onnx.export", side_effect=fake_export):
+            export_onnx(tiny_vit_checkpoint, force=True)
+            export_onnx(tiny_vit_checkpoint, force=True)
+
+        assert len(set(written)) == 2
+        assert all(Path(path).parent == Path(tiny_vit_checkpoint) for path in written)
+        assert (Path(tiny_vit_checkpoint) / onnx_file_name).read_bytes() == b"onnx"
+        assert not list(Path(tiny_vit_checkpoint).glob(".tmp-*"))
+
+    def test_failed_export_leaves_no_temporary_file(self, tiny_vit_checkpoint):
+        """Test a failed export removes its temporary file"""
+        with patch("torch.onnx.export", side_effect=RuntimeError("export failed")):
+            with pytest.raises(RuntimeError):
+                export_onnx(tiny_vit_checkpoint)
+
+        assert not list(Path(tiny_vit_checkpoint).glob(".tmp-*"))
+        assert not (Path(tiny_vit_checkpoint) / onnx_file_name).exists()
+
+
+class TestOnnxImageClassifier:
+    """Parity tests of OnnxImageClassifier against the transformers pipeline"""
+
+    def test_matches_pytorch_pipeline(self, model_path, images):
+        """Test labels and scores match the PyTorch pipeline on the validation images"""
+        from transformers import pipeline
+
+        expected = pipeline("image-classification", model=model_path)(images)
+        results = OnnxImageClassifier(model_path)(images)
+
+        assert len(results) == len(images)
+        for result, reference in zip(results, expected):
+            assert [p["label"] for p in result] == [p["label"] for p in reference]
+            np.testing.assert_allclose([p["score"] for p in result], [p["score"] for p in reference], atol=1e-4)
+
+    def test_output_schema(self, model_path, images):
+        """Test a single image gives one list of label/score dicts, best first"""
+        classifier = OnnxImageClassifier(model_path)
+
+        result = classifier(images[0])
+
+        assert len(result) == 5
+        assert set(result[0]) == {"label", "score"}
+        assert isinstance(result[0]["score"], float)
+        assert [p["score"] for p in result] == sorted((p["score"] for p in result), reverse=True)
+        assert classifier([images[0]]) == [result]
+
+    def test_batch_size_splits_batches(self, model_path, images):
+        """Test results do not depend on how images are split into batches"""
+        classifier = OnnxImageClassifier(model_path)
+
+        whole = classifier(images[:3], batch_size=3)
+        split = classifier(images[:3], batch_size=2)
+
+        for a, b in zip(whole, split):
+            assert [p["label"] for p in a] == [p["label"] for p in b]
+            np.testing.assert_allclose([p["score"] for p in a], [p["score"] for p in b], atol=1e-5)
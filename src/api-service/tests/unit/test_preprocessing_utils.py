@@ -0,0 +1,93 @@
+"""
+Unit tests for the fused image preprocessing
+"""
+
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from api.utils.preprocessing_utils import ImagePreprocessor, TorchImageClassifier
+
+
+# Non-default normalization, so the tests also cover reading mean/std from the config
+custom_normalization = {"image_mean": [0.4, 0.5, 0.6], "image_std": [0.2, 0.3, 0.25]}
+
+
+class TestImagePreprocessor:
+    """Parity tests of ImagePreprocessor against the checkpoint's image processor"""
+
+    @pytest.mark.parametrize("tiny_vit_checkpoint", [{}, custom_normalization], indirect=True)
+    def test_matches_image_processor(self, tiny_vit_checkpoint, images):
+        """Test pixel values match the transformers image processor on the validation images"""
+        from transformers import AutoImageProcessor
+
+        image_processor = AutoImageProcessor.from_pretrained(tiny_vit_checkpoint)
+        expected = image_processor(images=images, return_tensors="np")["pixel_values"]
+        pixel_values = ImagePreprocessor(tiny_vit_checkpoint).batch(images)
+
+        assert pixel_values.dtype == np.float32
+        assert pixel_values.shape == expected.shape
+        np.testing.assert_allclose(pixel_values, expected, atol=1e-5)
+
+    def test_default_config_matches_image_processor(self, tmp_path, images):
+        """Test the ViTImageProcessor defaults (224x224, mean/std 0.5) are used when the config omits them"""
+        from transformers import ViTImageProcessor
+
+        (tmp_path / "preprocessor_config.json").write_text(json.dumps({"image_processor_type": "ViTImageProcessor"}))
+        expected = ViTImageProcessor()(images=images[:2], return_tensors="np")["pixel_values"]
+
+        np.testing.assert_allclose(ImagePreprocessor(tmp_path).batch(images[:2]), expected, atol=1e-5)
+
+    def test_converts_non_rgb_images(self, tiny_vit_checkpoint):
+        """Test grayscale images are converted to 3 channels"""
+        pixel_values = ImagePreprocessor(tiny_vit_checkpoint)(Image.new("L", (80, 40), 128))
+        assert pixel_values.shape == (3, 64, 64)
+
+    def test_batch_keeps_preprocessed_pixel_values(self, tiny_vit_checkpoint, images):
+        """Test pixel values prepared ahead of time are stacked as they are"""
+        preprocessor = ImagePreprocessor(tiny_vit_checkpoint)
+        prepared = preprocessor(images[0])
+
+        batch = preprocessor.batch([prepared, images[1]])
+
+        np.testing.assert_array_equal(batch[0], prepared)
+        np.testing.assert_array_equal(batch[1], preprocessor(images[1]))
+
+    def test_unsupported_config_raises(self, tmp_path):
+        """Test processors that crop or resize by shortest edge are rejected"""
+        (tmp_path / "preprocessor_config.json").write_text(json.dumps({"size": {"shortest_edge": 224}}))
+        with pytest.raises(ValueError):
+            ImagePreprocessor(tmp_path)
+
+
+class TestTorchImageClassifier:
+    """Parity tests of TorchImageClassifier against the transformers pipeline"""
+
+    def test_matches_pipeline(self, tiny_vit_checkpoint, images):
+        """Test labels and scores match the pipeline on the validation images"""
+        from transformers import pipeline
+
+        reference_pipeline = pipeline("image-classification", model=tiny_vit_checkpoint)
+        expected = reference_pipeline(images)
+        classifier = TorchImageClassifier(tiny_vit_checkpoint, reference_pipeline.model)
+
+        results = classifier(images, batch_size=4)
+
+        assert len(results) == len(expected)
+        for result, reference in zip(results, expected):
+            assert [p["label"] for p in result] == [p["label"] for p in reference]
+            np.testing.assert_allclose([p["score"] for p in result], [p["score"] for p in reference], atol=1e-5)
+
+    def test_single_image_returns_flat_list(self, tiny_vit_checkpoint, images):
+        """Test a single image returns its predictions like the pipeline"""
+        from transformers import AutoModelForImageClassification
+
+        model = AutoModelForImageClassification.from_pretrained(tiny_vit_checkpoint)
+        classifier = TorchImageClassifier(tiny_vit_checkpoint, model)
+        result = classifier(images[0], top_k=3)
+
+        assert len(result) == 3
+        assert result[0]["score"] >= result[1]["score"] >= result[2]["score"]
+        assert classifier([classifier.preprocessor(images[0])], top_k=3) == [result]
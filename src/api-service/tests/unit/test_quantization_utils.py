@@ -0,0 +1,111 @@
+"""
+Unit tests for dynamic INT8 quantization of the food classifier
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from transformers import ViTForImageClassification, pipeline
+
+from api.utils.quantization_utils import (
+    build_quantized_model,
+    load_quantized_classifier,
+    quantize_model,
+    quantized_file_name,
+)
+
+# A wider model than the default tiny ViT, so INT8 outputs stay close to fp32
+pytestmark = pytest.mark.parametrize("tiny_vit_checkpoint", [{"hidden_size": 64}], indirect=True)
+
+
+def pixel_values():
+    torch.manual_seed(1)
+    return torch.randn(4, 3, 64, 64)
+
+
+class TestQuantizeModel:
+    """Tests for quantize_model"""
+
+    def test_linear_layers_are_quantized(self, tiny_vit_checkpoint):
+        """Test Linear layers become dynamic INT8 Linear layers with close outputs"""
+        model = ViTForImageClassification.from_pretrained(tiny_vit_checkpoint).eval()
+        with torch.no_grad():
+            expected = model(pixel_values()).logits
+
+        quantized = quantize_model(model)
+
+        modules = list(quantized.modules())
+        assert not any(type(module) is torch.nn.Linear for module in modules)
+        assert any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in modules)
+        with torch.no_grad():
+            logits = quantized(pixel_values()).logits
+        assert torch.allclose(logits, expected, atol=0.1)
+
+
+class TestBuildQuantizedModel:
+    """Tests for build_quantized_model"""
+
+    def test_quantized_model_is_cached(self, tiny_vit_checkpoint):
+        """Test the INT8 weights are written once and reloaded with identical outputs"""
+        quantized_path = Path(tiny_vit_checkpoint) / quantized_file_name
+
+        first = build_quantized_model(tiny_vit_checkpoint)
+        mtime = quantized_path.stat().st_mtime_ns
+        second = build_quantized_model(tiny_vit_checkpoint)
+
+        assert quantized_path.stat().st_mtime_ns == mtime
+        assert quantized_path.stat().st_size < (Path(tiny_vit_checkpoint) / "model.safetensors").stat().st_size
+        with torch.no_grad():
+            assert torch.equal(first(pixel_values()).logits, second(pixel_values()).logits)
+
+    def test_newer_checkpoint_is_requantized(self, tiny_vit_checkpoint):
+        """Test the cache is rebuilt when the checkpoint is newer than it"""
+        quantized_path = Path(tiny_vit_checkpoint) / quantized_file_name
+        build_quantized_model(tiny_vit_checkpoint)
+        stale_time = (Path(tiny_vit_checkpoint) / "model.safetensors").stat().st_mtime - 10
+        os.utime(quantized_path, (stale_time, stale_time))
+
+        build_quantized_model(tiny_vit_checkpoint)
+
+        assert quantized_path.stat().st_mtime > stale_time
+        assert not list(Path(tiny_vit_checkpoint).glob(".tmp-*"))
+
+    def test_each_build_writes_its_own_temporary_file(self, tiny_vit_checkpoint):
+        """Test workers quantizing at the same time never write into the same temporary file"""
+        written = []
+        mkstemp = tempfile.mkstemp
+
+        def recording_mkstemp(**kwargs):
+            fd, path = mkstemp(**kwargs)
+            written.append(path)
+            return fd, path
+
+        with patch("tempfile.mkstemp", side_effect=recording_mkstemp):
+            build_quantized_model(tiny_vit_checkpoint, force=True)
+            build_quantized_model(tiny_vit_checkpoint, force=True)
+
+        assert len(set(written)) == 2
+        assert all(Path(name).parent == Path(tiny_vit_checkpoint) for name in written)
+        assert not list(Path(tiny_vit_checkpoint).glob(".tmp-*"))
+
+    def test_classifier_output_schema(self, tiny_vit_checkpoint):
+        """Test the quantized pipeline returns the same label/score lists as the fp32 one"""
+        rng = np.random.default_rng(0)
+        images = [Image.fromarray(rng.integers(0, 255, (80, 96, 3), dtype=np.uint8)) for _ in range(2)]
+
+        results = load_quantized_classifier(tiny_vit_checkpoint)(images, batch_size=2)
+        reference_pipeline = pipeline("image-classification", model=tiny_vit_checkpoint)
+        expected = reference_pipeline(images, batch_size=2)
+        labels = set(reference_pipeline.model.config.id2label.values())
+
+        assert len(results) == 2
+        for result, reference in zip(results, expected):
+            assert len(result) == len(reference) == 5
+            assert {p["label"] for p in result} <= labels
+            np.testing.assert_allclose([p["score"] for p in result], [p["score"] for p in reference], atol=0.05)
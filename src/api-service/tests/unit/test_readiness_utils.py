@@ -0,0 +1,56 @@
+"""
+Unit tests for readiness of background-loaded components
+"""
+
+from api.utils import readiness_utils
+from api.utils.readiness_utils import Readiness
+
+
+class TestReadiness:
+    """Tests for Readiness"""
+
+    def test_registered_components_are_pending(self):
+        """Test registered components start pending and are not ready"""
+        readiness = Readiness()
+        readiness.register("model", "tables")
+
+        report = readiness.report()
+        assert report["ready"] is False
+        assert report["components"]["model"]["status"] == readiness_utils.pending
+        assert readiness.is_ready() is False
+
+    def test_ready_when_all_components_ready_degraded_or_skipped(self):
+        """Test readiness once every component is ready, degraded or skipped"""
+        readiness = Readiness()
+        readiness.register("model", "tables", "warm_up")
+        readiness.set("model", readiness_utils.ready)
+        readiness.set("tables", readiness_utils.degraded, "No mappings loaded")
+        assert readiness.is_ready() is False
+
+        readiness.set("warm_up", readiness_utils.skipped)
+        assert readiness.is_ready() is True
+        assert readiness.report()["components"]["tables"]["error"] == "No mappings loaded"
+
+    def test_failed_component_is_not_ready(self):
+        """Test a failed component keeps the service not ready and reports its error"""
+        readiness = Readiness()
+        readiness.register("model")
+        readiness.set("model", readiness_utils.loading)
+        readiness.set("model", readiness_utils.failed, "download failed")
+
+        component = readiness.report()["components"]["model"]
+        assert readiness.is_ready() is False
+        assert component["status"] == readiness_utils.failed
+        assert component["error"] == "download failed"
+        assert component["seconds"] is not None
+        assert readiness.failed() == ["model"]
+
+    def test_register_keeps_existing_status(self):
+        """Test registering again does not reset a loaded component"""
+        readiness = Readiness()
+        readiness.register("model")
+        readiness.set("model", readiness_utils.ready)
+        readiness.register("model")
+
+        assert readiness.status("model") == readiness_utils.ready
+        assert readiness.status("unknown") == readiness_utils.pending
@@ -5,11 +5,14 @@ These tests increase code coverage for router modules.
 
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 import pandas as pd
 import io
+from datetime import datetime, timezone
 
 from api.service import app
+from api.utils.storage_utils import MemoryBackend
 
 
 client = TestClient(app)
@@ -21,7 +24,7 @@ client = TestClient(app)
 class TestUserListRouter:
     """Tests for user_list.py router endpoints"""
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_get_user_list_success(self, mock_get_bucket):
         """Test successful retrieval of user list"""
         mock_bucket = MagicMock()
@@ -37,7 +40,7 @@ class TestUserListRouter:
         assert "user_list" in data
         assert data["user_list"] == ["user1", "user2", "user3"]
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_get_user_list_not_found(self, mock_get_bucket):
         """Test user list not found returns 500 (wrapped in exception)"""
         mock_bucket = MagicMock()
@@ -50,7 +53,7 @@ class TestUserListRouter:
         # The router wraps HTTPException in another exception, so it returns 500
         assert response.status_code in [404, 500]
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_get_user_list_error(self, mock_get_bucket):
         """Test error handling in get_user_list"""
         mock_get_bucket.side_effect = Exception("GCS connection error")
@@ -58,7 +61,7 @@ class TestUserListRouter:
         response = client.get("/user-list/")
         assert response.status_code == 500
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_add_user_success(self, mock_get_bucket):
         """Test successfully adding a new user"""
         mock_bucket = MagicMock()
@@ -74,7 +77,7 @@ class TestUserListRouter:
         assert data["status"] == "success"
         assert "user3" in data["user_list"]
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_add_user_already_exists(self, mock_get_bucket):
         """Test adding user that already exists"""
         mock_bucket = MagicMock()
@@ -89,7 +92,7 @@ class TestUserListRouter:
         data = response.json()
         assert data["status"] == "exists"
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_add_user_list_not_found(self, mock_get_bucket):
         """Test adding user when user list doesn't exist"""
         mock_bucket = MagicMock()
@@ -102,7 +105,7 @@ class TestUserListRouter:
         # The router wraps HTTPException in another exception, so it returns 500
         assert response.status_code in [404, 500]
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_add_user_error(self, mock_get_bucket):
         """Test error handling in add_user"""
         mock_get_bucket.side_effect = Exception("GCS error")
@@ -110,7 +113,7 @@ class TestUserListRouter:
         response = client.put("/user-list/user1")
         assert response.status_code == 500
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_delete_user_success(self, mock_get_bucket):
         """Test successfully deleting a user"""
         mock_bucket = MagicMock()
@@ -124,7 +127,7 @@ class TestUserListRouter:
         response = client.delete("/user-list/user2")
         assert response.status_code == 200
 
-    @patch("api.routers.user_list.get_gcs_bucket")
+    @patch("api.routers.user_list.get_storage")
     def test_delete_user_not_found(self, mock_get_bucket):
         """Test deleting user when user list doesn't exist"""
         mock_bucket = MagicMock()
@@ -144,7 +147,7 @@ class TestUserListRouter:
 class TestUserPhotoRouter:
     """Tests for user_photo.py router endpoints"""
 
-    @patch("api.routers.user_photo.get_gcs_bucket")
+    @patch("api.routers.user_photo.get_storage")
     def test_upload_photo_success(self, mock_get_bucket):
         """Test successful photo upload"""
         mock_bucket = MagicMock()
@@ -165,7 +168,7 @@ class TestUserPhotoRouter:
         assert data["status"] == "success"
         assert data["user_id"] == "user1"
 
-    @patch("api.routers.user_photo.get_gcs_bucket")
+    @patch("api.routers.user_photo.get_storage")
     def test_upload_photo_invalid_file_type(self, mock_get_bucket):
         """Test upload with non-image file returns 400"""
         fake_file = io.BytesIO(b"not an image")
@@ -176,27 +179,41 @@ class TestUserPhotoRouter:
         )
         assert response.status_code == 400
 
-    @patch("api.routers.user_photo.get_gcs_bucket")
+    @patch("api.routers.user_photo.get_storage")
     def test_get_photo_success(self, mock_get_bucket):
         """Test successful photo retrieval"""
         mock_bucket = MagicMock()
         mock_blob = MagicMock()
-        mock_blob.exists.return_value = True
+        mock_blob.name = "data/user_photo/user_photo_user1_20240115T123000.jpg"
         mock_blob.download_as_bytes.return_value = b"fake image content"
         mock_blob.content_type = "image/jpeg"  # Set as string, not MagicMock
+        mock_bucket.get_blob.return_value = mock_blob
         mock_bucket.blob.return_value = mock_blob
         mock_get_bucket.return_value = mock_bucket
 
         response = client.get("/user-photo/user1/2024-01-15T12:30:00")
         assert response.status_code == 200
 
-    @patch("api.routers.user_photo.get_gcs_bucket")
+    @patch("api.routers.user_photo.get_storage")
+    def test_get_photo_keeps_content_type(self, mock_get_bucket):
+        """Test a photo is served with the content type it was uploaded with"""
+        mock_get_bucket.return_value = MemoryBackend()
+        client.post(
+            "/user-photo/user1/2024-01-15T12:30:00",
+            files={"file": ("meal.png", io.BytesIO(b"fake png content"), "image/png")},
+        )
+
+        response = client.get("/user-photo/user1/2024-01-15T12:30:00")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.content == b"fake png content"
+
+    @patch("api.routers.user_photo.get_storage")
     def test_get_photo_not_found(self, mock_get_bucket):
         """Test photo not found returns 404"""
         mock_bucket = MagicMock()
-        mock_blob = MagicMock()
-        mock_blob.exists.return_value = False
-        mock_bucket.blob.return_value = mock_blob
+        mock_bucket.get_blob.return_value = None
         mock_get_bucket.return_value = mock_bucket
 
         response = client.get("/user-photo/user1/2024-01-15T12:30:00")
@@ -210,9 +227,10 @@ class TestChatAssistantRouter:
     """Tests for chat_assistant.py router endpoints"""
 
     @patch("api.routers.chat_assistant.client")
-    @patch("api.routers.chat_assistant.read_csv_from_gcs")
-    @patch("api.routers.chat_assistant.get_blob")
-    def test_get_recommendations_success(self, mock_get_blob, mock_read_csv, mock_gemini_client):
+    @patch("api.routers.chat_assistant.read_meal_history")
+    @patch("api.routers.chat_assistant.read_table")
+    @patch("api.routers.chat_assistant.get_table_blob")
+    def test_get_recommendations_success(self, mock_get_blob, mock_read_csv, mock_read_history, mock_gemini_client):
         """Test successful recommendations retrieval"""
         # Mock meal history
         meal_df = pd.DataFrame({
@@ -230,7 +248,8 @@ class TestChatAssistantRouter:
         })
         
         mock_get_blob.return_value = MagicMock()
-        mock_read_csv.side_effect = [meal_df, health_df]
+        mock_read_history.return_value = meal_df
+        mock_read_csv.return_value = health_df
         
         # Mock Gemini response
         mock_response = MagicMock()
@@ -247,23 +266,147 @@ class TestChatAssistantRouter:
 class TestMealHistoryRouter:
     """Tests for meal_history.py router endpoints"""
 
-    @patch("api.routers.meal_history.get_blob")
-    @patch("api.routers.meal_history.read_csv_from_gcs")
-    def test_get_meal_history_success(self, mock_read_csv, mock_get_blob):
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_get_meal_history_success(self, mock_read_history):
         """Test successful meal history retrieval"""
-        mock_blob = MagicMock()
-        mock_get_blob.return_value = mock_blob
-        
         mock_df = pd.DataFrame({
             "date": ["2024-01-01", "2024-01-02"],
             "meal": ["pasta", "salad"],
             "symptoms": ["bloating", "none"]
         })
-        mock_read_csv.return_value = mock_df
+        mock_read_history.return_value = mock_df
 
         response = client.get("/meal-history/user1")
         assert response.status_code == 200
 
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_get_meal_history_latest(self, mock_read_history):
+        """Test last and since are passed to the tail read"""
+        mock_read_history.return_value = pd.DataFrame({"dish": ["pasta"]})
+
+        response = client.get("/meal-history/user1?last=5&since=2024-01-01")
+        assert response.status_code == 200
+        mock_read_history.assert_called_once_with("user1", last=5, since=pd.Timestamp("2024-01-01", tz="UTC"))
+
+        assert client.get("/meal-history/user1?last=0").status_code == 422
+
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_get_meal_history_invalid_time_range(self, mock_read_history):
+        """Test since and until that are not ISO 8601 timestamps are rejected with 400"""
+        for query in ["since=yesterday", "since=2024-13-01", "until=now", "until=01/02/2024"]:
+            response = client.get(f"/meal-history/user1?{query}")
+            assert response.status_code == 400, query
+        mock_read_history.assert_not_called()
+
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_get_meal_history_until_with_offset(self, mock_read_history):
+        """Test until is compared as a UTC time, whatever its offset"""
+        mock_read_history.return_value = pd.DataFrame(
+            {
+                "date_time": ["2024-01-01 09:00:00", "2024-01-01T10:00:00", "2024-01-01T11:00:00"],
+                "dish": ["a", "b", "c"],
+            }
+        )
+
+        response = client.get("/meal-history/user1", params={"until": "2024-01-01T12:30:00+02:00"})
+        assert [record["dish"] for record in response.json()] == ["a", "b"]
+
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_get_meal_history_page(self, mock_read_history):
+        """Test limit returns one page and the next cursor in a header"""
+        mock_read_history.return_value = pd.DataFrame(
+            {"date_time": ["2024-01-02", "2024-01-01", "2024-01-03"], "dish": ["salad", "pasta", "soup"]}
+        )
+
+        response = client.get("/meal-history/user1?limit=2")
+        assert [record["dish"] for record in response.json()] == ["pasta", "salad"]
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = client.get(f"/meal-history/user1?limit=2&cursor={cursor}")
+        assert [record["dish"] for record in response.json()] == ["soup"]
+        assert "X-Next-Cursor" not in response.headers
+
+
+class TestMealHistoryExportRouter:
+    """Tests for the streaming meal history export"""
+
+    @patch("api.routers.meal_history.iter_meal_history_export")
+    def test_export_streams_chunks(self, mock_export):
+        """Test exported chunks are streamed as NDJSON with an attachment name"""
+        mock_export.return_value = iter([b'{"dish":"pasta"}\n', b'{"dish":"salad"}\n'])
+
+        response = client.get("/meal-history/user1/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert 'filename="meal_history_user1.ndjson"' in response.headers["content-disposition"]
+        assert response.content == b'{"dish":"pasta"}\n{"dish":"salad"}\n'
+        mock_export.assert_called_once_with("user1", "ndjson")
+
+    @patch("api.routers.meal_history.iter_meal_history_export")
+    def test_export_csv(self, mock_export):
+        """Test the CSV export media type"""
+        mock_export.return_value = iter([b"date_time,dish\n"])
+
+        response = client.get("/meal-history/user1/export?format=csv")
+        assert response.headers["content-type"].startswith("text/csv")
+        assert client.get("/meal-history/user1/export?format=xml").status_code == 422
+
+    @patch("api.routers.meal_history.iter_meal_history_export")
+    def test_export_missing_history(self, mock_export):
+        """Test a missing history is a 404 rather than a broken stream"""
+
+        def missing(*args):
+            raise HTTPException(status_code=404, detail="File not found")
+            yield
+
+        mock_export.side_effect = missing
+
+        assert client.get("/meal-history/user1/export").status_code == 404
+
+
+class TestMealHistoryConditionalGet:
+    """Tests for ETag revalidation of meal history"""
+
+    version = ('"v1"', datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    def make_history(self):
+        df = pd.DataFrame({"date_time": ["2024-01-01"], "dish": ["pasta"]})
+        df.attrs["version"] = self.version
+        return df
+
+    @patch("api.routers.meal_history.get_meal_history_version")
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_not_modified(self, mock_read_history, mock_version):
+        """Test a matching If-None-Match gets 304 without reading the history"""
+        mock_read_history.return_value = self.make_history()
+        mock_version.return_value = self.version
+
+        response = client.get("/meal-history/user1")
+        etag = response.headers["ETag"]
+        assert response.headers["Last-Modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+        mock_read_history.reset_mock()
+
+        response = client.get("/meal-history/user1", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        mock_read_history.assert_not_called()
+
+    @patch("api.routers.meal_history.get_meal_history_version")
+    @patch("api.routers.meal_history.read_meal_history")
+    def test_modified(self, mock_read_history, mock_version):
+        """Test a stale ETag, or another page, gets the full response"""
+        mock_read_history.return_value = self.make_history()
+        mock_version.return_value = ('"v2"', self.version[1])
+        etag = client.get("/meal-history/user1").headers["ETag"]
+
+        response = client.get("/meal-history/user1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()[0]["dish"] == "pasta"
+
+        mock_version.return_value = self.version
+        response = client.get("/meal-history/user1?limit=1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
 
 # ============================================================================
 # Health Report Router Tests
@@ -271,8 +414,8 @@ class TestMealHistoryRouter:
 class TestHealthReportRouter:
     """Tests for health_report.py router endpoints"""
 
-    @patch("api.routers.health_report.get_blob")
-    @patch("api.routers.health_report.read_csv_from_gcs")
+    @patch("api.routers.health_report.get_table_blob")
+    @patch("api.routers.health_report.read_table")
     def test_get_health_report_success(self, mock_read_csv, mock_get_blob):
         """Test successful health report retrieval"""
         mock_blob = MagicMock()
@@ -289,6 +432,27 @@ class TestHealthReportRouter:
         response = client.get("/health-report/user1")
         assert response.status_code == 200
 
+    @patch("api.routers.health_report.get_table_blob")
+    @patch("api.routers.health_report.read_table")
+    def test_get_health_report_not_modified(self, mock_read_table, mock_get_blob):
+        """Test a matching If-None-Match gets 304 after the metadata lookup only"""
+        mock_blob = MagicMock()
+        mock_blob.name = "data/health_report/health_report_user1.parquet"
+        mock_blob.generation = 7
+        mock_blob.updated = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        mock_get_blob.return_value = mock_blob
+        mock_read_table.return_value = pd.DataFrame({"ingredient": ["garlic"]})
+
+        etag = client.get("/health-report/user1").headers["ETag"]
+        mock_read_table.reset_mock()
+
+        response = client.get("/health-report/user1", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        mock_read_table.assert_not_called()
+
+        mock_blob.generation = 8
+        assert client.get("/health-report/user1", headers={"If-None-Match": etag}).status_code == 200
+
 
 # ============================================================================
 # Food Model Router Tests
@@ -296,6 +460,11 @@ class TestHealthReportRouter:
 class TestFoodModelRouter:
     """Additional tests for food_model.py router"""
 
+    def setup_method(self):
+        from api.routers import food_model
+
+        food_model.prediction_cache.clear()
+
     def test_predict_no_file(self):
         """Test predict endpoint without file"""
         response = client.post("/food-model/predict")
@@ -305,3 +474,373 @@ class TestFoodModelRouter:
         """Test predict endpoint with GET method"""
         response = client.get("/food-model/predict")
         assert response.status_code == 405  # Method not allowed
+
+    def test_predict_returns_dish_and_fodmap(self):
+        """Test predict classifies the image through the batching scheduler"""
+        from PIL import Image
+        from api.routers import food_model
+
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (32, 32), (200, 100, 50)).save(image_bytes, format="JPEG")
+        classifier = MagicMock(return_value=[[{"label": "Pizza", "score": 0.9}, {"label": "Salad", "score": 0.1}]])
+
+        with patch.object(food_model, "classifier", classifier), patch.object(
+            food_model, "dish_to_ing_dict", {"pizza": ["wheat", "cheese"]}
+        ), patch.object(food_model, "ing_to_fodmap_dict", {"wheat": "high", "cheese": "low"}):
+            response = client.post(
+                "/food-model/predict", files={"file": ("meal.jpg", image_bytes.getvalue(), "image/jpeg")}
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["dish"] == "Pizza"
+        assert data["dish_confidence"] == 0.9
+        assert data["ingredients"] == "wheat, cheese"
+        assert data["ingredients_fodmap_high"] == "wheat"
+        assert data["ingredients_fodmap_low"] == "cheese"
+        # The classifier received a batch of images
+        images = classifier.call_args.args[0]
+        assert len(images) == 1 and images[0].size == (32, 32)
+
+    def test_predict_rejects_when_overloaded(self):
+        """Test predict answers 503 with Retry-After when too many predictions are pending"""
+        from api.routers import food_model
+        from api.utils.inference_utils import AdmissionGate
+
+        gate = AdmissionGate(max_in_flight=1)
+        gate.in_flight = 1
+        gate.avg_latency = 1.5
+        with patch.object(food_model, "classifier", MagicMock()), patch.object(
+            food_model, "inference_admission", gate
+        ), patch.object(food_model, "safe_load_image") as mock_load:
+            response = client.post("/food-model/predict", files={"file": ("meal.jpg", b"jpeg", "image/jpeg")})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+        assert "error" in response.json()
+        mock_load.assert_not_called()
+        assert gate.stats()["rejected"] == 1
+
+    def test_predict_decodes_off_the_event_loop(self):
+        """Test the image is decoded on the decode thread pool"""
+        import threading
+        from PIL import Image
+        from api.routers import food_model
+
+        threads = []
+
+        def load_image(image_bytes, filename=""):
+            threads.append(threading.current_thread().name)
+            return Image.new("RGB", (8, 8))
+
+        classifier = MagicMock(return_value=[[{"label": "Salad", "score": 0.5}]])
+        with patch.object(food_model, "classifier", classifier), patch.object(
+            food_model, "safe_load_image", load_image
+        ):
+            response = client.post("/food-model/predict", files={"file": ("meal.jpg", b"jpeg", "image/jpeg")})
+
+        assert response.status_code == 200
+        assert threads[0].startswith("image-decode")
+
+    def test_predict_batch_returns_results_in_input_order(self):
+        """Test predict-batch classifies valid images in one batch and reports per-image errors"""
+        from PIL import Image
+        from api.routers import food_model
+
+        def jpeg(color):
+            buffer = io.BytesIO()
+            Image.new("RGB", (16, 16), color).save(buffer, format="JPEG")
+            return buffer.getvalue()
+
+        def classify(images, batch_size):
+            return [
+                [{"label": "Pizza" if image.getpixel((8, 8))[0] > 128 else "Salad", "score": 0.8}] for image in images
+            ]
+
+        classifier = MagicMock(side_effect=classify)
+        files = [
+            ("files", ("red.jpg", jpeg((250, 0, 0)), "image/jpeg")),
+            ("files", ("broken.jpg", b"not an image", "image/jpeg")),
+            ("files", ("empty.jpg", b"", "image/jpeg")),
+            ("files", ("green.jpg", jpeg((0, 250, 0)), "image/jpeg")),
+        ]
+        with patch.object(food_model, "classifier", classifier), patch.object(
+            food_model, "dish_to_ing_dict", {"pizza": ["wheat"]}
+        ):
+            response = client.post("/food-model/predict-batch", files=files)
+
+        assert response.status_code == 200
+        predictions = response.json()["predictions"]
+        assert [p["filename"] for p in predictions] == ["red.jpg", "broken.jpg", "empty.jpg", "green.jpg"]
+        assert predictions[0]["dish"] == "Pizza"
+        assert predictions[0]["ingredients"] == "wheat"
+        assert predictions[1]["error"].startswith("Invalid image format")
+        assert predictions[2]["error"] == "Empty file received"
+        assert predictions[3]["dish"] == "Salad"
+        assert "error" not in predictions[0] and "error" not in predictions[3]
+        # Both valid images went through a single forward pass
+        classifier.assert_called_once()
+        assert classifier.call_args.kwargs["batch_size"] == 2
+
+    def test_predict_repeated_image_is_served_from_cache(self):
+        """Test identical image bytes skip decode and inference on the second request"""
+        from PIL import Image
+        from api.routers import food_model
+
+        classifier = MagicMock(return_value=[[{"label": "Pizza", "score": 0.9}]])
+        load_image = MagicMock(return_value=Image.new("RGB", (8, 8)))
+        files = {"file": ("meal.jpg", b"same photo bytes", "image/jpeg")}
+        with patch.object(food_model, "classifier", classifier), patch.object(
+            food_model, "safe_load_image", load_image
+        ):
+            first = client.post("/food-model/predict", files=files)
+            second = client.post("/food-model/predict", files=files)
+            batch = client.post("/food-model/predict-batch", files=[("files", files["file"])])
+
+        assert first.status_code == second.status_code == 200
+        assert second.json() == first.json()
+        assert batch.json()["predictions"][0]["dish"] == "Pizza"
+        assert load_image.call_count == 1
+        assert classifier.call_count == 1
+        assert food_model.prediction_cache.stats()["hits"] == 2
+
+    def test_predictions_are_not_cached_while_maps_are_degraded(self):
+        """Test predictions made without the ingredient maps are not cached"""
+        from PIL import Image
+        from api.routers import food_model
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register(*food_model.components)
+        readiness.set("dish_to_ingredients", "degraded", "No mappings loaded")
+        classifier = MagicMock(return_value=[[{"label": "Pizza", "score": 0.9}]])
+        files = {"file": ("meal.jpg", b"same photo bytes", "image/jpeg")}
+        with patch.object(food_model, "classifier", classifier), patch.object(
+            food_model, "safe_load_image", MagicMock(return_value=Image.new("RGB", (8, 8)))
+        ), patch.object(food_model, "readiness", readiness):
+            client.post("/food-model/predict", files=files)
+            client.post("/food-model/predict", files=files)
+
+        assert classifier.call_count == 2
+        assert food_model.prediction_cache.stats()["hits"] == 0
+
+    def test_predict_batch_too_many_files(self):
+        """Test predict-batch rejects requests with more images than allowed"""
+        from api.routers import food_model
+
+        files = [("files", (f"{i}.jpg", b"jpeg", "image/jpeg")) for i in range(3)]
+        with patch.object(food_model, "classifier", MagicMock()), patch.object(
+            food_model, "predict_batch_max_files", 2
+        ):
+            response = client.post("/food-model/predict-batch", files=files)
+
+        assert response.status_code == 400
+
+    def test_batch_max_files_capped_at_admission_limit(self):
+        """Test a batch limit above the admission limit is lowered to it"""
+        from api.routers import food_model
+
+        assert food_model.cap_batch_max_files(32, 8) == 8
+        assert food_model.cap_batch_max_files(4, 8) == 4
+
+    def test_predict_batch_above_admission_limit_rejected_up_front(self):
+        """Test a batch larger than the admission limit gets 400 instead of an overload 503"""
+        from api.routers import food_model
+        from api.utils.inference_utils import AdmissionGate
+
+        gate = AdmissionGate(max_in_flight=2)
+        files = [("files", (f"{i}.jpg", b"jpeg", "image/jpeg")) for i in range(3)]
+        with patch.object(food_model, "classifier", MagicMock()), patch.object(
+            food_model, "inference_admission", gate
+        ), patch.object(food_model, "predict_batch_max_files", food_model.cap_batch_max_files(32, 2)):
+            response = client.post("/food-model/predict-batch", files=files)
+
+        assert response.status_code == 400
+        assert "Maximum is 2" in response.json()["error"]
+        assert gate.stats()["rejected"] == 0
+
+    def test_predict_batch_model_not_loaded(self):
+        """Test predict-batch answers 503 when no model is loaded"""
+        files = [("files", ("meal.jpg", b"jpeg", "image/jpeg"))]
+        response = client.post("/food-model/predict-batch", files=files)
+        assert response.status_code == 503
+
+    def test_run_classifier_batch_wraps_single_image_results(self):
+        """Test a single-image batch yields one list of predictions per image"""
+        from api.routers import food_model
+
+        classifier = MagicMock(return_value=[{"label": "Pizza", "score": 0.9}])
+        with patch.object(food_model, "classifier", classifier):
+            assert food_model.run_classifier_batch(["image"]) == [[{"label": "Pizza", "score": 0.9}]]
+        classifier.assert_called_once_with(["image"], batch_size=1)
+
+    def test_prepare_image_uses_fused_preprocessing(self):
+        """Test uploads are decoded just above the model input size and preprocessed once for a fused classifier"""
+        from PIL import Image
+        from api.routers import food_model
+        from api.utils.preprocessing_utils import DirectImageClassifier
+
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (1200, 900), (200, 100, 50)).save(image_bytes, format="JPEG")
+        classifier = MagicMock(spec=DirectImageClassifier)
+        classifier.preprocessor = MagicMock(return_value="pixel values")
+        classifier.preprocessor.size = (224, 224)
+
+        with patch.object(food_model, "classifier", classifier):
+            assert food_model.prepare_image(image_bytes.getvalue(), "meal.jpg") == "pixel values"
+        # JPEG DCT scaling by 1/4 is the smallest that still covers 224x224
+        assert classifier.preprocessor.call_args[0][0].size == (300, 225)
+
+        with patch.object(food_model, "classifier", MagicMock()):
+            assert food_model.prepare_image(image_bytes.getvalue(), "meal.jpg").size == (512, 384)
+
+    def test_safe_load_image_decodes_large_jpeg_at_reduced_scale(self):
+        """Test a large JPEG is decoded at the smallest DCT scale that still covers the 512px box"""
+        from PIL import Image, JpegImagePlugin
+        from api.routers import food_model
+
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (4032, 3024), (200, 100, 50)).save(image_bytes, format="JPEG")
+        draft = JpegImagePlugin.JpegImageFile.draft
+
+        with patch.object(JpegImagePlugin.JpegImageFile, "draft", autospec=True, side_effect=draft) as mock_draft:
+            image = food_model.safe_load_image(image_bytes.getvalue(), "meal.jpg")
+
+        assert mock_draft.call_args[0][1:] == (None, (512, 384))
+        assert image.size == (512, 384)
+        assert image.getpixel((100, 100)) == pytest.approx((200, 100, 50), abs=3)
+
+    def test_safe_load_image_keeps_small_and_non_jpeg_images(self):
+        """Test images that need no reduction decode at their own size"""
+        from PIL import Image
+        from api.routers import food_model
+
+        for size, image_format in [((400, 300), "JPEG"), ((1600, 1200), "PNG")]:
+            image_bytes = io.BytesIO()
+            Image.new("RGB", size, (200, 100, 50)).save(image_bytes, format=image_format)
+            assert food_model.safe_load_image(image_bytes.getvalue(), resize=False).size == size
+
+    def test_predict_while_loading_asks_to_retry(self):
+        """Test predict answers 503 with Retry-After while the model loads in the background"""
+        from api.routers import food_model
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register(*food_model.components)
+        with patch.object(food_model, "skip_download", "0"), patch.object(food_model, "readiness", readiness):
+            response = client.post("/food-model/predict", files={"file": ("meal.jpg", b"jpeg", "image/jpeg")})
+
+        assert response.status_code == 503
+        assert "loading" in response.json()["error"]
+        assert response.headers["Retry-After"] == "10"
+
+
+class TestFoodModelLoading:
+    """Tests for background loading of the food model resources"""
+
+    def load(self, model_loader, dish_map=None, fodmap_map=None):
+        from api.routers import food_model
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register(*food_model.components)
+        patches = {
+            "skip_download": "0",
+            "readiness": readiness,
+            "classifier": None,
+            "loaded_model": None,
+            "dish_to_ing_dict": {},
+            "ing_to_fodmap_dict": {},
+            "load_dish_to_ing_dict": MagicMock(return_value=dish_map or {}),
+            "load_ing_to_fodmap_dict": MagicMock(return_value=fodmap_map or {}),
+            "load_food_model": model_loader,
+            "model_load_retry_delay": 0,
+        }
+        with patch.multiple(food_model, **patches):
+            food_model.load_resources()
+            return readiness, food_model.classifier
+
+    def test_load_resources_warms_up_model(self):
+        """Test the model is loaded, warmed up on a synthetic image and then served"""
+        model = MagicMock(return_value=[[{"label": "Pizza", "score": 0.9}]])
+        readiness, classifier = self.load(
+            MagicMock(return_value=model), {"pizza": ["wheat"]}, {"wheat": "high"}
+        )
+
+        assert classifier is model
+        model.assert_called_once()
+        assert readiness.is_ready() is True
+        assert readiness.report()["components"]["warm_up"]["status"] == "ready"
+
+    def test_load_resources_retries_then_reports_failure(self):
+        """Test a model that keeps failing to load is retried, then reported as failed"""
+        from api.routers import food_model
+
+        loader = MagicMock(side_effect=FileNotFoundError("model missing"))
+        readiness, classifier = self.load(loader, {"pizza": ["wheat"]}, {"wheat": "high"})
+
+        assert classifier is None
+        assert loader.call_count == food_model.model_load_attempts
+        component = readiness.report()["components"]["food_model"]
+        assert component["status"] == "failed"
+        assert component["error"] == "model missing"
+        assert readiness.is_ready() is False
+
+    def test_load_resources_empty_reference_tables_are_degraded(self):
+        """Test empty ingredient mappings leave the service ready but degraded"""
+        model = MagicMock(return_value=[[{"label": "Pizza", "score": 0.9}]])
+        readiness, _ = self.load(MagicMock(return_value=model))
+
+        assert readiness.status("dish_to_ingredients") == "degraded"
+        assert readiness.is_ready() is True
+
+    def test_load_resources_runs_once(self):
+        """Test later calls do not reload resources that are already loaded"""
+        from api.routers import food_model
+        from api.utils.readiness_utils import Readiness
+
+        readiness = Readiness()
+        readiness.register(*food_model.components)
+        for name in food_model.components:
+            readiness.set(name, "ready")
+        loader = MagicMock()
+        with patch.object(food_model, "skip_download", "0"), patch.object(
+            food_model, "readiness", readiness
+        ), patch.object(food_model, "load_food_model", loader):
+            food_model.load_resources()
+
+        loader.assert_not_called()
+
+    def test_load_without_warm_up_then_warm_up_only(self):
+        """Test a preloading master loads without warming up, and workers then only warm up"""
+        from api.routers import food_model
+        from api.utils.readiness_utils import Readiness
+
+        model = MagicMock(return_value=[[{"label": "Pizza", "score": 0.9}]])
+        loader = MagicMock(return_value=model)
+        readiness = Readiness()
+        readiness.register(*food_model.components)
+        patches = {
+            "skip_download": "0",
+            "readiness": readiness,
+            "classifier": None,
+            "loaded_model": None,
+            "dish_to_ing_dict": {},
+            "ing_to_fodmap_dict": {},
+            "load_dish_to_ing_dict": MagicMock(return_value={"pizza": ["wheat"]}),
+            "load_ing_to_fodmap_dict": MagicMock(return_value={"wheat": "high"}),
+            "load_food_model": loader,
+        }
+        with patch.multiple(food_model, **patches):
+            food_model.load_resources(warm=False)
+            assert food_model.is_preloaded() is True
+            assert food_model.classifier is None
+            model.assert_not_called()
+
+            food_model.load_resources()
+            assert food_model.classifier is model
+            assert food_model.is_preloaded() is False
+
+        loader.assert_called_once_with()
+        model.assert_called_once()
+        assert readiness.is_ready() is True
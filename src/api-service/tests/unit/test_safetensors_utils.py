@@ -0,0 +1,98 @@
+"""
+Unit tests for memory-mapped model weights
+"""
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from safetensors.torch import load_file, save_file
+from transformers import ViTForImageClassification, pipeline
+
+from api.utils.safetensors_utils import load_mmap_classifier, load_mmap_model, mmap_safetensors
+
+
+class TestMmapSafetensors:
+    """Tests for mmap_safetensors"""
+
+    def test_matches_safetensors_loader(self, tmp_path):
+        """Test tensors of every dtype and shape match the reference loader"""
+        tensors = {
+            "f32": torch.randn(3, 4),
+            "f16": torch.randn(5).half(),
+            "bf16": torch.randn(2, 2).bfloat16(),
+            "i64": torch.arange(7),
+            "u8": torch.arange(9, dtype=torch.uint8).reshape(3, 3),
+            "bool": torch.tensor([True, False, True]),
+            "scalar": torch.tensor(1.5),
+            "empty": torch.zeros(0, 4),
+        }
+        path = str(tmp_path / "weights.safetensors")
+        save_file(tensors, path)
+
+        mapped = mmap_safetensors(path)
+        expected = load_file(path)
+
+        assert set(mapped) == set(expected)
+        for name, tensor in expected.items():
+            assert mapped[name].dtype == tensor.dtype
+            assert mapped[name].shape == tensor.shape
+            assert torch.equal(mapped[name], tensor)
+
+    def test_tensors_share_one_mapping(self, tmp_path):
+        """Test tensors are views into the mapped file rather than copies"""
+        path = str(tmp_path / "weights.safetensors")
+        save_file({"a": torch.randn(256), "b": torch.randn(256)}, path)
+
+        mapped = mmap_safetensors(path)
+
+        # Consecutive tensors of the file are adjacent in memory
+        a, b = mapped["a"], mapped["b"]
+        assert abs(b.data_ptr() - a.data_ptr()) == 256 * 4
+
+    def test_writes_do_not_reach_the_file(self, tmp_path):
+        """Test the mapping is copy-on-write"""
+        path = str(tmp_path / "weights.safetensors")
+        save_file({"a": torch.zeros(4)}, path)
+
+        mmap_safetensors(path)["a"].fill_(1)
+
+        assert torch.equal(load_file(path)["a"], torch.zeros(4))
+
+
+class TestLoadMmapModel:
+    """Tests for load_mmap_model"""
+
+    def test_matches_from_pretrained(self, tiny_vit_checkpoint):
+        """Test the mapped model computes the same logits as a regular load"""
+        torch.manual_seed(1)
+        pixel_values = torch.randn(2, 3, 64, 64)
+        reference = ViTForImageClassification.from_pretrained(tiny_vit_checkpoint).eval()
+
+        model = load_mmap_model(tiny_vit_checkpoint)
+
+        assert not model.training
+        assert not any(p.is_meta or p.requires_grad for p in model.parameters())
+        with torch.no_grad():
+            assert torch.allclose(model(pixel_values).logits, reference(pixel_values).logits, atol=1e-6)
+
+    def test_missing_tensor_is_an_error(self, tiny_vit_checkpoint):
+        """Test a checkpoint without every parameter is rejected"""
+        weights_path = f"{tiny_vit_checkpoint}/model.safetensors"
+        weights = load_file(weights_path)
+        weights.pop("classifier.bias")
+        save_file(weights, weights_path, metadata={"format": "pt"})
+
+        with pytest.raises(RuntimeError):
+            load_mmap_model(tiny_vit_checkpoint)
+
+    def test_classifier_matches_pipeline(self, tiny_vit_checkpoint):
+        """Test the mapped pipeline returns the same predictions as the regular one"""
+        rng = np.random.default_rng(0)
+        image = Image.fromarray(rng.integers(0, 255, (80, 96, 3), dtype=np.uint8))
+
+        result = load_mmap_classifier(tiny_vit_checkpoint)(image)
+        expected = pipeline("image-classification", model=tiny_vit_checkpoint)(image)
+
+        assert [p["label"] for p in result] == [p["label"] for p in expected]
+        np.testing.assert_allclose([p["score"] for p in result], [p["score"] for p in expected], atol=1e-6)
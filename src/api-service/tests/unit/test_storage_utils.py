@@ -0,0 +1,409 @@
+"""
+Unit tests for storage backends
+"""
+
+import gzip
+
+import pytest
+from unittest.mock import patch, MagicMock
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from api.utils.storage_utils import (
+    GCSBackend,
+    LocalBackend,
+    MemoryBackend,
+    ObjectNotFoundError,
+    PreconditionFailedError,
+    StorageBlob,
+    compress,
+    decompress,
+)
+
+
+@pytest.fixture(params=["local", "memory"])
+def backend(request, tmp_path):
+    """Local and in-memory backends share the same behavior"""
+    if request.param == "local":
+        return LocalBackend(tmp_path)
+    return MemoryBackend()
+
+
+class TestBackends:
+    """Tests for the local and in-memory storage backends"""
+
+    def test_put_and_get(self, backend):
+        """Test object content round trip"""
+        backend.put("data/a.csv", b"col1\n1\n", content_type="text/csv")
+        assert backend.get("data/a.csv") == b"col1\n1\n"
+
+    def test_stat(self, backend):
+        """Test object metadata"""
+        info = backend.put("data/a.csv", b"col1\n1\n", content_type="text/csv")
+        stat = backend.stat("data/a.csv")
+
+        assert stat.name == "data/a.csv"
+        assert stat.size == 7
+        assert stat.generation == info.generation
+        assert stat.etag == info.etag
+        assert stat.content_type == "text/csv"
+        assert stat.updated is not None
+
+    def test_stat_missing(self, backend):
+        """Test stat returns None for missing objects"""
+        assert backend.stat("missing.csv") is None
+        assert not backend.exists("missing.csv")
+
+    def test_generation_changes_on_write(self, backend):
+        """Test every write produces a new generation and etag"""
+        first = backend.put("a.csv", b"1")
+        second = backend.put("a.csv", b"1")
+        assert second.generation > first.generation
+        assert second.etag != first.etag
+
+    def test_create_only_precondition(self, backend):
+        """Test if_generation_match=0 only creates missing objects"""
+        backend.put("a.csv", b"1", if_generation_match=0)
+        with pytest.raises(PreconditionFailedError):
+            backend.put("a.csv", b"2", if_generation_match=0)
+        assert backend.get("a.csv") == b"1"
+
+    def test_generation_precondition(self, backend):
+        """Test conditional overwrites only succeed at the expected generation"""
+        first = backend.put("a.csv", b"1")
+        second = backend.put("a.csv", b"2", if_generation_match=first.generation)
+
+        with pytest.raises(PreconditionFailedError):
+            backend.put("a.csv", b"3", if_generation_match=first.generation)
+        assert backend.get("a.csv") == b"2"
+        assert backend.stat("a.csv").generation == second.generation
+
+    def test_get_missing(self, backend):
+        """Test get raises ObjectNotFoundError for missing objects"""
+        with pytest.raises(ObjectNotFoundError):
+            backend.get("missing.csv")
+
+    def test_list_prefix(self, backend):
+        """Test list only returns objects under prefix, sorted by name"""
+        backend.put("data/user_photo/user_photo_u1_2.jpg", b"2")
+        backend.put("data/user_photo/user_photo_u1_1.jpg", b"1")
+        backend.put("data/user_photo/user_photo_u2_1.jpg", b"3")
+        backend.put("models/v2/config.json", b"{}")
+
+        names = [info.name for info in backend.list("data/user_photo/user_photo_u1_")]
+        assert names == ["data/user_photo/user_photo_u1_1.jpg", "data/user_photo/user_photo_u1_2.jpg"]
+        assert len(backend.list()) == 4
+
+    def test_delete(self, backend):
+        """Test delete removes object"""
+        backend.put("a.csv", b"1")
+        backend.delete("a.csv")
+        assert not backend.exists("a.csv")
+        with pytest.raises(ObjectNotFoundError):
+            backend.delete("a.csv")
+
+    def test_stream(self, backend):
+        """Test stream yields content in chunks"""
+        backend.put("a.bin", b"x" * 10)
+        chunks = list(backend.stream("a.bin", chunk_size=4))
+        assert [len(c) for c in chunks] == [4, 4, 2]
+        assert b"".join(chunks) == b"x" * 10
+
+    def test_get_range(self, backend):
+        """Test ranges are inclusive and pinned to a generation"""
+        info = backend.put("data/a.csv", b"col1\n1\n2\n")
+
+        assert backend.get_range("data/a.csv", 5, 6) == b"1\n"
+        assert backend.get_range("data/a.csv", 7, 100, if_generation_match=info.generation) == b"2\n"
+        with pytest.raises(PreconditionFailedError):
+            backend.get_range("data/a.csv", 0, 3, if_generation_match=info.generation + 1)
+        with pytest.raises(ObjectNotFoundError):
+            backend.get_range("missing.csv", 0, 3)
+
+    def test_download_to_filename(self, backend, tmp_path):
+        """Test download to local file"""
+        backend.put("models/v2/config.json", b"{}")
+        target = tmp_path / "config.json"
+        backend.download_to_filename("models/v2/config.json", str(target))
+        assert target.read_bytes() == b"{}"
+
+
+class TestStorageBlob:
+    """Tests for the Blob-compatible object handle"""
+
+    def test_upload_and_download_text(self):
+        """Test text upload updates metadata and can be read back"""
+        blob = MemoryBackend().blob("data/a.csv")
+        assert blob.generation is None
+
+        blob.upload_from_string("col1\n1\n", content_type="text/csv")
+        assert blob.generation is not None
+        assert blob.content_type == "text/csv"
+        assert blob.download_as_text() == "col1\n1\n"
+
+    def test_get_blob_loads_metadata(self):
+        """Test get_blob returns handle with metadata, or None"""
+        backend = MemoryBackend()
+        backend.put("a.csv", b"1")
+
+        blob = backend.get_blob("a.csv")
+        assert isinstance(blob, StorageBlob)
+        assert blob.size == 1
+        assert backend.get_blob("missing.csv") is None
+
+    def test_reload_missing(self):
+        """Test reload raises ObjectNotFoundError for missing objects"""
+        with pytest.raises(ObjectNotFoundError):
+            MemoryBackend().blob("missing.csv").reload()
+
+    def test_exists_and_delete(self):
+        """Test exists and delete through the handle"""
+        backend = MemoryBackend()
+        blob = backend.blob("a.csv")
+        assert not blob.exists()
+        blob.upload_from_string("1")
+        assert blob.exists()
+        blob.delete()
+        assert not blob.exists()
+
+
+class TestCompression:
+    """Tests for compressed objects"""
+
+    csv = "col1,col2\n" + "garlic,onion\n" * 100
+
+    def test_gzip_upload_is_stored_compressed(self, backend):
+        """Test gzip uploads are smaller in storage and read back transparently"""
+        blob = backend.blob("data/a.csv")
+        blob.upload_from_string(self.csv, content_type="text/csv", content_encoding="gzip")
+
+        assert len(backend.get("data/a.csv")) < len(self.csv)
+        assert backend.get_blob("data/a.csv").download_as_text() == self.csv
+        assert blob.size == len(backend.get("data/a.csv"))
+
+    def test_content_encoding_metadata(self):
+        """Test the content encoding is recorded with the object"""
+        backend = MemoryBackend()
+        backend.blob("data/a.csv").upload_from_string(self.csv, content_type="text/csv", content_encoding="gzip")
+
+        assert backend.get_blob("data/a.csv").content_encoding == "gzip"
+
+    def test_zstd_round_trip(self, backend):
+        """Test zstd uploads read back transparently"""
+        pytest.importorskip("zstandard")
+        backend.blob("data/a.csv").upload_from_string(self.csv, content_type="text/csv", content_encoding="zstd")
+
+        assert backend.get_blob("data/a.csv").download_as_text() == self.csv
+
+    def test_zstd_without_zstandard(self):
+        """Test zstd is rejected when zstandard is not installed"""
+        with patch("api.utils.storage_utils.zstandard", None):
+            with pytest.raises(ValueError):
+                compress(b"abc", "zstd")
+
+    def test_already_decompressed_content(self):
+        """Test content GCS already decompressed is returned as is"""
+        assert decompress(b"col1\n1\n") == b"col1\n1\n"
+        assert decompress(gzip.compress(b"col1\n1\n")) == b"col1\n1\n"
+
+    def test_open_decompresses(self, backend):
+        """Test open() reads compressed objects decompressed, in chunks"""
+        backend.blob("data/a.csv").upload_from_string(self.csv, content_type="text/csv", content_encoding="gzip")
+
+        with backend.get_blob("data/a.csv").open() as f:
+            assert f.read(10) == self.csv[:10].encode()
+            assert f.read() == self.csv[10:].encode()
+
+    def test_stream_decompresses(self, backend):
+        """Test blob stream() yields decompressed content, as the GCS backend always did"""
+        backend.blob("data/a.csv").upload_from_string(self.csv, content_type="text/csv", content_encoding="gzip")
+
+        chunks = list(backend.get_blob("data/a.csv").stream(chunk_size=100))
+
+        assert b"".join(chunks) == self.csv.encode()
+        assert all(len(chunk) <= 100 for chunk in chunks)
+        assert b"".join(backend.stream("data/a.csv")) == backend.get("data/a.csv")
+
+    def test_open_is_pinned_to_generation(self, backend):
+        """Test open() fails if the object was rewritten since the handle was loaded"""
+        backend.put("data/a.csv", b"1")
+        blob = backend.get_blob("data/a.csv")
+        backend.put("data/a.csv", b"2")
+
+        with pytest.raises(PreconditionFailedError):
+            blob.open()
+
+    def test_binary_objects_are_not_decompressed(self):
+        """Test binary objects that happen to start with a gzip header are returned as stored"""
+        backend = MemoryBackend()
+        data = gzip.compress(b"abc")
+        backend.put("models/weights.bin", data, content_type="application/octet-stream")
+
+        assert backend.get_blob("models/weights.bin").download_as_bytes() == data
+
+
+class TestLocalBackend:
+    """Tests specific to the local filesystem backend"""
+
+    def test_rejects_path_traversal(self, tmp_path):
+        """Test object names cannot escape the root directory"""
+        backend = LocalBackend(tmp_path / "root")
+        with pytest.raises(ValueError):
+            backend.put("../outside.csv", b"1")
+
+    def test_objects_are_files(self, tmp_path):
+        """Test objects are stored as plain files under root"""
+        backend = LocalBackend(tmp_path)
+        backend.put("data/reference/user_list.txt", b"user1")
+        assert (tmp_path / "data/reference/user_list.txt").read_bytes() == b"user1"
+
+
+class TestGCSBackend:
+    """Tests for the GCS backend with a mocked bucket"""
+
+    def make_blob(self, name):
+        blob = MagicMock()
+        blob.name = name
+        blob.size = 3
+        blob.generation = 42
+        blob.metageneration = 1
+        blob.etag = "CKih"
+        blob.content_type = "text/csv"
+        return blob
+
+    def test_stat(self):
+        """Test stat maps blob metadata"""
+        bucket = MagicMock()
+        bucket.get_blob.return_value = self.make_blob("a.csv")
+
+        info = GCSBackend(bucket).stat("a.csv")
+        assert info.generation == 42
+        assert info.etag == "CKih"
+
+    def test_stat_missing(self):
+        """Test stat returns None for missing objects"""
+        bucket = MagicMock()
+        bucket.get_blob.return_value = None
+        assert GCSBackend(bucket).stat("a.csv") is None
+
+    def test_get_missing(self):
+        """Test NotFound is mapped to ObjectNotFoundError"""
+        bucket = MagicMock()
+        bucket.blob.return_value.download_as_bytes.side_effect = NotFound("missing")
+        with pytest.raises(ObjectNotFoundError):
+            GCSBackend(bucket).get("a.csv")
+
+    def test_put(self):
+        """Test put uploads with content type"""
+        bucket = MagicMock()
+        blob = self.make_blob("a.csv")
+        bucket.blob.return_value = blob
+
+        info = GCSBackend(bucket).put("a.csv", b"abc", content_type="text/csv")
+        blob.upload_from_string.assert_called_once_with(b"abc", content_type="text/csv")
+        assert info.generation == 42
+
+    def test_get_range(self):
+        """Test ranged reads download the stored bytes of one generation"""
+        bucket = MagicMock()
+        bucket.blob.return_value.download_as_bytes.return_value = b"1\n"
+
+        assert GCSBackend(bucket).get_range("a.csv", 5, 6, if_generation_match=42) == b"1\n"
+        bucket.blob.return_value.download_as_bytes.assert_called_once_with(
+            start=5, end=6, raw_download=True, if_generation_match=42
+        )
+
+        bucket.blob.return_value.download_as_bytes.side_effect = PreconditionFailed("rewritten")
+        with pytest.raises(PreconditionFailedError):
+            GCSBackend(bucket).get_range("a.csv", 5, 6, if_generation_match=42)
+
+    def test_put_content_encoding(self):
+        """Test the content encoding is set on the object before uploading"""
+        bucket = MagicMock()
+        blob = self.make_blob("a.csv")
+        bucket.blob.return_value = blob
+
+        GCSBackend(bucket).put("a.csv", b"abc", content_type="text/csv", content_encoding="gzip")
+        assert blob.content_encoding == "gzip"
+
+    def test_put_precondition(self):
+        """Test preconditions are passed to GCS and PreconditionFailed is mapped"""
+        bucket = MagicMock()
+        blob = self.make_blob("a.csv")
+        bucket.blob.return_value = blob
+
+        GCSBackend(bucket).put("a.csv", b"abc", if_generation_match=42)
+        blob.upload_from_string.assert_called_once_with(b"abc", content_type=None, if_generation_match=42)
+
+        blob.upload_from_string.side_effect = PreconditionFailed("conflict")
+        with pytest.raises(PreconditionFailedError):
+            GCSBackend(bucket).put("a.csv", b"abc", if_generation_match=0)
+
+    def test_request_options(self):
+        """Test timeout and retry policy are passed to GCS requests"""
+        bucket = MagicMock()
+        retry = object()
+        backend = GCSBackend(bucket, timeout=5, retry=retry)
+
+        backend.get("a.csv")
+        bucket.blob.return_value.download_as_bytes.assert_called_once_with(timeout=5, retry=retry)
+
+        backend.put("a.csv", b"abc")
+        bucket.blob.return_value.upload_from_string.assert_called_once_with(b"abc", content_type=None, timeout=5)
+
+    def test_list(self):
+        """Test list passes prefix to the bucket"""
+        bucket = MagicMock()
+        bucket.list_blobs.return_value = [self.make_blob("data/a.csv")]
+
+        infos = GCSBackend(bucket).list("data/")
+        bucket.list_blobs.assert_called_once_with(prefix="data/")
+        assert [info.name for info in infos] == ["data/a.csv"]
+
+
+class TestGetStorage:
+    """Tests for the get_storage() backend selection"""
+
+    @pytest.fixture(autouse=True)
+    def reset_storage(self):
+        import api.utils.utils as utils_module
+
+        original = utils_module._storage
+        utils_module._storage = None
+        yield
+        utils_module._storage = original
+
+    def test_memory_backend(self):
+        """Test STORAGE_BACKEND=memory selects the in-memory backend"""
+        from api.utils.utils import get_storage
+
+        with patch.dict("os.environ", {"STORAGE_BACKEND": "memory"}):
+            assert isinstance(get_storage(), MemoryBackend)
+
+    def test_local_backend(self, tmp_path):
+        """Test STORAGE_BACKEND=local uses STORAGE_LOCAL_ROOT"""
+        from api.utils.utils import get_storage
+
+        with patch.dict("os.environ", {"STORAGE_BACKEND": "local", "STORAGE_LOCAL_ROOT": str(tmp_path)}):
+            storage = get_storage()
+            assert isinstance(storage, LocalBackend)
+            assert storage.root == tmp_path.resolve()
+
+    def test_gcs_backend(self):
+        """Test STORAGE_BACKEND=gcs wraps the GCS bucket"""
+        from api.utils.utils import get_storage
+
+        with (
+            patch.dict("os.environ", {"STORAGE_BACKEND": "gcs"}),
+            patch("api.utils.utils.get_gcs_bucket") as mock_get_bucket,
+        ):
+            storage = get_storage()
+            assert isinstance(storage, GCSBackend)
+            assert storage.bucket is mock_get_bucket.return_value
+
+    def test_unknown_backend(self):
+        """Test unknown backend names are rejected"""
+        from api.utils.utils import get_storage
+
+        with patch.dict("os.environ", {"STORAGE_BACKEND": "s3"}):
+            with pytest.raises(ValueError):
+                get_storage()
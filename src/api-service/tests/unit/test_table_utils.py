@@ -0,0 +1,243 @@
+"""
+Unit tests for Parquet/CSV table utilities
+"""
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from unittest.mock import patch
+
+from api.utils import utils as utils_module
+from api.utils.storage_utils import MemoryBackend, PreconditionFailedError
+from api.utils.health_report_utils import health_report_schema
+from api.utils.table_utils import (
+    find_table_blob,
+    get_table_blob,
+    read_table,
+    write_table,
+    update_table,
+    delete_table,
+    migrate_table,
+    iter_table,
+)
+
+
+path = "data/health_report/health_report_user1"
+report_csv = (
+    b"symptom,ingredient,odds_ratio,p_value,p_value_adj,significant\n"
+    b"bloating,garlic,2.5,0.01,0.02,True\n"
+    b"gas,onion,inf,0.2,0.4,False\n"
+)
+
+
+@pytest.fixture
+def storage():
+    backend = MemoryBackend()
+    utils_module._storage = backend
+    utils_module.csv_cache.clear()
+    yield backend
+    utils_module._storage = None
+    utils_module.csv_cache.clear()
+
+
+def make_report():
+    return pd.DataFrame(
+        {
+            "symptom": ["bloating", "gas"],
+            "ingredient": ["garlic", "onion"],
+            "odds_ratio": [2.5, float("inf")],
+            "p_value": [0.01, 0.2],
+            "p_value_adj": [0.02, 0.4],
+            "significant": [True, False],
+        }
+    )
+
+
+class TestTableUtils:
+    """Tests for table format dispatch"""
+
+    def test_write_and_read_parquet(self, storage):
+        """Test tables are written as Parquet and read back with Inf replaced by None"""
+        blob = write_table(path, make_report(), health_report_schema)
+
+        assert blob.name == path + ".parquet"
+        df = read_table(get_table_blob(path))
+        assert list(df.columns) == health_report_schema.names
+        assert df["odds_ratio"].tolist() == [2.5, None]
+        assert df["significant"].tolist() == [True, False]
+
+    def test_read_selected_columns(self, storage):
+        """Test only the requested columns are read"""
+        write_table(path, make_report(), health_report_schema)
+
+        df = read_table(get_table_blob(path), columns=["ingredient", "p_value", "missing"])
+
+        assert list(df.columns) == ["ingredient", "p_value"]
+
+    def test_read_csv_fallback(self, storage):
+        """Test tables not migrated yet are read from CSV"""
+        storage.put(path + ".csv", report_csv)
+
+        blob = get_table_blob(path)
+
+        assert blob.name == path + ".csv"
+        assert read_table(blob, columns=["ingredient"])["ingredient"].tolist() == ["garlic", "onion"]
+
+    def test_parquet_preferred_over_csv(self, storage):
+        """Test the Parquet object wins when both formats exist"""
+        storage.put(path + ".csv", report_csv)
+        write_table(path, make_report(), health_report_schema)
+
+        assert find_table_blob(path).name == path + ".parquet"
+
+    def test_lookup_does_not_list(self, storage):
+        """Test tables are resolved by exact path, falling back to CSV, without listing objects"""
+        storage.put(path + ".csv", report_csv)
+
+        with patch.object(storage, "list", wraps=storage.list) as mock_list:
+            assert find_table_blob(path).name == path + ".csv"
+            write_table(path, make_report(), health_report_schema)
+            assert find_table_blob(path).name == path + ".parquet"
+
+        mock_list.assert_not_called()
+
+    def test_write_replaces_previous_format(self, storage):
+        """Test rewriting a CSV table stores it as Parquet and deletes the CSV"""
+        storage.put(path + ".csv", report_csv)
+
+        write_table(path, make_report(), health_report_schema, previous_blob=get_table_blob(path))
+
+        assert not storage.exists(path + ".csv")
+        assert storage.exists(path + ".parquet")
+
+    def test_csv_table_format(self, storage):
+        """Test TABLE_FORMAT=csv keeps writing CSV"""
+        with patch("api.utils.table_utils.table_format", "csv"):
+            blob = write_table(path, make_report(), health_report_schema)
+
+        assert blob.name == path + ".csv"
+        assert read_table(blob)["ingredient"].tolist() == ["garlic", "onion"]
+
+    def test_prefix_does_not_match_other_users(self, storage):
+        """Test user1 does not resolve to user10's table"""
+        write_table(path + "0", make_report(), health_report_schema)
+
+        assert find_table_blob(path) is None
+        with pytest.raises(HTTPException) as exc_info:
+            get_table_blob(path)
+        assert exc_info.value.status_code == 404
+
+    def test_delete_table(self, storage):
+        """Test deleting a table removes every format"""
+        storage.put(path + ".csv", report_csv)
+        write_table(path, make_report(), health_report_schema)
+
+        assert delete_table(path)
+        assert find_table_blob(path) is None
+        assert not delete_table(path)
+
+
+class TestIterTable:
+    """Tests for chunked table reads"""
+
+    def make_rows(self, n):
+        return pd.concat([make_report()] * (n // 2), ignore_index=True)
+
+    def test_iter_parquet(self, storage):
+        """Test Parquet tables are read in chunks"""
+        with patch("api.utils.table_utils.parquet_row_group_size", 10):
+            blob = write_table(path, self.make_rows(50), health_report_schema)
+
+        chunks = list(iter_table(blob, chunk_rows=10))
+        assert [len(chunk) for chunk in chunks] == [10] * 5
+        assert pd.concat(chunks)["ingredient"].tolist() == ["garlic", "onion"] * 25
+
+    def test_iter_csv(self, storage):
+        """Test CSV tables, including compressed ones, are read in chunks"""
+        with (
+            patch("api.utils.table_utils.table_format", "csv"),
+            patch("api.utils.utils.csv_compression", {"": "gzip"}),
+        ):
+            blob = write_table(path, self.make_rows(50), health_report_schema)
+
+        chunks = list(iter_table(storage.get_blob(blob.name), chunk_rows=20))
+        assert [len(chunk) for chunk in chunks] == [20, 20, 10]
+
+    def test_iter_empty_csv(self, storage):
+        """Test empty CSV objects yield nothing"""
+        storage.put(path + ".csv", b"")
+
+        assert list(iter_table(storage.get_blob(path + ".csv"), chunk_rows=20)) == []
+
+
+class TestConditionalTableWrites:
+    """Tests for optimistic concurrency on tables"""
+
+    def test_create_only_once(self, storage):
+        """Test create fails if the table was created concurrently"""
+        write_table(path, make_report(), health_report_schema, create=True)
+
+        with pytest.raises(PreconditionFailedError):
+            write_table(path, make_report(), health_report_schema, create=True)
+
+    def test_stale_previous_blob_is_rejected(self, storage):
+        """Test a write based on an outdated read fails instead of overwriting"""
+        write_table(path, make_report(), health_report_schema)
+        stale_blob = get_table_blob(path)
+        write_table(path, make_report().head(1), health_report_schema, previous_blob=stale_blob)
+
+        with pytest.raises(PreconditionFailedError):
+            write_table(path, make_report(), health_report_schema, previous_blob=stale_blob)
+        assert len(read_table(get_table_blob(path))) == 1
+
+    def test_update_table_merges_concurrent_update(self, storage):
+        """Test update_table re-applies the update on top of a concurrent write"""
+        write_table(path, make_report().head(1), health_report_schema)
+        calls = []
+
+        def add_row(df):
+            calls.append(len(df))
+            if len(calls) == 1:
+                # Another request appends a row between our read and our write
+                write_table(path, make_report(), health_report_schema)
+            return pd.concat([df, make_report().tail(1)], ignore_index=True)
+
+        update_table(path, health_report_schema, add_row)
+
+        assert calls == [1, 2]
+        assert len(read_table(get_table_blob(path))) == 3
+
+    def test_update_table_missing(self, storage):
+        """Test updating a missing table returns 404"""
+        with pytest.raises(HTTPException) as exc_info:
+            update_table(path, health_report_schema, lambda df: df)
+        assert exc_info.value.status_code == 404
+
+
+class TestMigrateTable:
+    """Tests for CSV to Parquet migration"""
+
+    def test_migrate_csv_table(self, storage):
+        """Test a CSV table is converted and the CSV removed"""
+        storage.put(path + ".csv", report_csv)
+
+        assert migrate_table(path, health_report_schema)
+
+        assert not storage.exists(path + ".csv")
+        assert len(read_table(get_table_blob(path))) == 2
+
+    def test_migrate_keep_csv(self, storage):
+        """Test --keep-csv leaves the CSV object in place"""
+        storage.put(path + ".csv", report_csv)
+
+        assert migrate_table(path, health_report_schema, keep_csv=True)
+
+        assert storage.exists(path + ".csv")
+        assert find_table_blob(path).name == path + ".parquet"
+
+    def test_migrate_skips_parquet_table(self, storage):
+        """Test already migrated and missing tables are skipped"""
+        write_table(path, make_report(), health_report_schema)
+
+        assert not migrate_table(path, health_report_schema)
+        assert not migrate_table(path + "_missing", health_report_schema)
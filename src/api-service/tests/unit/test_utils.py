@@ -19,6 +19,7 @@ def mock_bucket():
     blob.name = "example.csv"
 
     bucket = MagicMock()
+    bucket.get_blob.side_effect = lambda name: blob if name == blob.name else None
     bucket.list_blobs.return_value = [blob]
     return bucket
 
@@ -40,9 +41,9 @@ class TestGetBucket:
         utils_module._bucket = None
         
         try:
-            with patch("api.utils.utils.storage.Client") as mock_client_class:
+            with patch("api.utils.utils.get_gcs_client") as mock_get_client:
                 mock_client = MagicMock()
-                mock_client_class.return_value = mock_client
+                mock_get_client.return_value = mock_client
                 mock_bucket = MagicMock()
                 mock_client.bucket.return_value = mock_bucket
 
@@ -57,18 +58,39 @@ class TestGetBucket:
             utils_module._bucket = original_bucket
 
 
+class TestResetStorage:
+    """Tests for the reset_storage() function"""
+
+    def test_reset_storage_drops_clients(self):
+        """Test a forked worker gets its own storage backend and GCS client"""
+        import api.utils.utils as utils_module
+        from api.utils.utils import reset_storage
+
+        original = utils_module._bucket, utils_module._storage
+        utils_module._bucket, utils_module._storage = MagicMock(), MagicMock()
+        try:
+            with patch("api.utils.utils.reset_gcs_client") as mock_reset_client:
+                reset_storage()
+
+            assert utils_module._bucket is None
+            assert utils_module._storage is None
+            mock_reset_client.assert_called_once()
+        finally:
+            utils_module._bucket, utils_module._storage = original
+
+
 class TestGetBlob:
     """Tests for the get_blob() function"""
 
     def test_get_blob_found(self, mock_bucket):
         """Test get_blob() with existing blob"""
-        with patch("api.utils.utils.get_gcs_bucket", return_value=mock_bucket):
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
             blob = get_blob("example.csv")
             assert blob.name == "example.csv"
 
     def test_get_blob_not_found(self, mock_bucket):
         """Test get_blob() with non-existing blob"""
-        with patch("api.utils.utils.get_gcs_bucket", return_value=mock_bucket):
+        with patch("api.utils.utils.get_storage", return_value=mock_bucket):
             with pytest.raises(HTTPException) as e:
                 get_blob("nonexistent.csv")
                 assert e.value.status_code == 404
@@ -132,6 +132,22 @@ def setup_containers(project, namespace, k8s_provider, ksa_name, app_name):
                                     protocol="TCP",
                                 )
                             ],
+                            # Route traffic only once the food model is loaded and warmed up. Readiness is
+                            # per worker process: reliable with PRELOAD_APP=1 (gunicorn, every worker warms
+                            # up before serving), only a sample of one worker with `uvicorn --workers`
+                            readiness_probe=k8s.core.v1.ProbeArgs(
+                                http_get=k8s.core.v1.HTTPGetActionArgs(path="/api-service/ready", port=9000),
+                                period_seconds=5,
+                                failure_threshold=3,
+                            ),
+                            # Liveness does not wait for the model, so a slow download never restarts the pod,
+                            # but fails once a component failed to load, so the pod is restarted
+                            liveness_probe=k8s.core.v1.ProbeArgs(
+                                http_get=k8s.core.v1.HTTPGetActionArgs(path="/api-service/health", port=9000),
+                                initial_delay_seconds=10,
+                                period_seconds=10,
+                                failure_threshold=6,
+                            ),
                             volume_mounts=[
                                 k8s.core.v1.VolumeMountArgs(
                                     name="persistent-vol",
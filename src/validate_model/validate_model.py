@@ -1,5 +1,7 @@
+import argparse
 import csv
 import os
+import sys
 from pathlib import Path
 import torch
 from PIL import Image
@@ -101,12 +103,17 @@ def predict(image_path, processor, model, device):
     return result
 
 
-def main():
-    processor, model, device = load_model()
+def quantize_model(model):
+    """Dynamically quantize the Linear layers to INT8, as MODEL_QUANTIZATION=int8 does in the API."""
+    return torch.ao.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
 
+def evaluate(processor, model, device, verbose=True):
+    """Run the model on the test set and return (top-1 accuracy %, top-5 accuracy %, top-1 predictions)."""
     top1 = 0
     top5 = 0
     total = 0
+    top1_preds = []
 
     # Read test labels
     with open(CSV_PATH, "r") as f:
@@ -120,6 +127,7 @@ def main():
 
             pred_top1 = preds[0][0].lower()
             pred_top5 = [p[0].lower() for p in preds]
+            top1_preds.append(pred_top1)
 
             true = true_label.lower()
 
@@ -132,17 +140,71 @@ def main():
             total += 1
 
             # Print results image-by-image
-            print(f"\nImage: {img_path}")
-            print(f"True label: {true_label}")
-            print("Top-5 predictions:")
-            for label, prob in preds:
-                print(f"  {label:25s}  {prob:.4f}")
+            if verbose:
+                print(f"\nImage: {img_path}")
+                print(f"True label: {true_label}")
+                print("Top-5 predictions:")
+                for label, prob in preds:
+                    print(f"  {label:25s}  {prob:.4f}")
 
     print("\n==== FINAL RESULTS ====")
     print(f"Total images: {total}")
     print(f"Top-1 accuracy: {top1/total*100:.2f}%")
     print(f"Top-5 accuracy: {top5/total*100:.2f}%")
 
+    return top1 / total * 100, top5 / total * 100, top1_preds
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Validate the food classifier on the labeled test images.")
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="Also validate the dynamic INT8 model and compare it with fp32",
+    )
+    parser.add_argument(
+        "--max-top1-drop",
+        type=float,
+        default=1.0,
+        help="Largest acceptable top-1 accuracy loss of the INT8 model, in percentage points (default: 1.0)",
+    )
+    parser.add_argument(
+        "--max-top5-drop",
+        type=float,
+        default=1.0,
+        help="Largest acceptable top-5 accuracy loss of the INT8 model, in percentage points (default: 1.0)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    processor, model, device = load_model()
+
+    print("\n==== FP32 MODEL ====")
+    top1, top5, top1_preds = evaluate(processor, model, device, verbose=not args.quantize)
+    if not args.quantize:
+        return
+
+    # Dynamic quantization runs on CPU only
+    print("\n==== INT8 MODEL (dynamic quantization) ====")
+    quantized = quantize_model(model)
+    int8_top1, int8_top5, int8_top1_preds = evaluate(processor, quantized, "cpu", verbose=False)
+
+    top1_drop = top1 - int8_top1
+    top5_drop = top5 - int8_top5
+    agreement = sum(a == b for a, b in zip(top1_preds, int8_top1_preds)) / len(top1_preds) * 100
+
+    print("\n==== INT8 vs FP32 ====")
+    print(f"Top-1 accuracy: {int8_top1:.2f}% (delta {int8_top1 - top1:+.2f} pts, max drop {args.max_top1_drop:.2f})")
+    print(f"Top-5 accuracy: {int8_top5:.2f}% (delta {int8_top5 - top5:+.2f} pts, max drop {args.max_top5_drop:.2f})")
+    print(f"Top-1 agreement with fp32: {agreement:.2f}%")
+
+    if top1_drop > args.max_top1_drop or top5_drop > args.max_top5_drop:
+        print("❌ INT8 accuracy loss exceeds the threshold, keep MODEL_QUANTIZATION=none")
+        sys.exit(1)
+    print("✅ INT8 accuracy loss is within the threshold, MODEL_QUANTIZATION=int8 can be enabled")
+
 
 if __name__ == "__main__":
     main()